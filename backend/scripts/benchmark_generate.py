@@ -0,0 +1,170 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+import sinks
+
+# Throughput benchmark of generate_data.py: rows/sec per table, bytes written
+# and peak RSS for every mode x output format x scale factor, saved as JSON so
+# results of two versions can be compared.
+#
+#   python benchmark_generate.py --scale-factors 0.1 1 10 --output benchmark.json
+#
+# Every run happens in its own child process, so peak RSS is not inflated by
+# earlier runs and module level state of the row generators starts clean.
+# The peak is a process-wide high-water mark (ru_maxrss) of the whole run, not
+# of any one table: it never goes down, so it could not be attributed to the
+# tables generated after the largest one. Columnar worker processes are
+# reported apart, as the largest peak of any worker.
+
+SCALE_FACTORS = [0.1, 1, 10]
+MODES = ["rows", "columnar"]
+
+
+class TimedSink:
+    # Wraps a sink and attributes the time since the previous write to the
+    # table being written. Row generators are consumed inside write_table and
+    # columnar chunks are generated before write_columns, so either way that is
+    # generation plus writing.
+    def __init__(self, sink):
+        self.sink = sink
+        self.tables = {}
+        self.last = time.perf_counter()
+
+    def record(self, table_name, num_rows):
+        now = time.perf_counter()
+        table = self.tables.setdefault(table_name, {"rows": 0, "seconds": 0.0})
+        table["rows"] += num_rows
+        table["seconds"] += now - self.last
+        self.last = now
+
+    def write_table(self, table_name, columns, rows):
+        counted = CountedRows(rows)
+        self.sink.write_table(table_name, columns, counted)
+        self.record(table_name, counted.count)
+
+    def write_columns(self, table_name, columns):
+        self.sink.write_columns(table_name, columns)
+        self.record(table_name, len(next(iter(columns.values()))))
+
+
+class CountedRows:
+    def __init__(self, rows):
+        self.rows = rows
+        self.count = 0
+
+    def __iter__(self):
+        for row in self.rows:
+            self.count += 1
+            yield row
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def peak_rss_bytes(who=resource.RUSAGE_SELF):
+    # ru_maxrss is in kilobytes on Linux but in bytes on macOS; RUSAGE_CHILDREN
+    # gives the largest peak of the terminated child processes
+    peak = resource.getrusage(who).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def run_once(mode, output_format, scale_factor, workers):
+    # Body of a child process: one generation run into a temporary directory
+    import generate_data
+    with tempfile.TemporaryDirectory() as output_dir:
+        args = generate_data.parse_args(["--mode", mode, "--format", output_format, "--output-dir", output_dir,
+                                         "--scale-factor", str(scale_factor), "--workers", str(workers)])
+        started = time.perf_counter()
+        with generate_data.open_sink(args) as sink:
+            timed = TimedSink(sink)
+            generate_data.generate(timed, generate_data.scaled_sizes(scale_factor), mode, args.workers,
+                                   args.chunk_size)
+        seconds = time.perf_counter() - started
+        bytes_written = directory_size(output_dir)
+    for table in timed.tables.values():
+        table["rows_per_sec"] = table["rows"] / table["seconds"] if table["seconds"] else None
+    rows = sum(table["rows"] for table in timed.tables.values())
+    return {
+        "mode": mode,
+        "format": output_format,
+        "scale_factor": scale_factor,
+        "workers": workers,
+        "rows": rows,
+        "seconds": seconds,
+        "rows_per_sec": rows / seconds,
+        "bytes_written": bytes_written,
+        "process_peak_rss_bytes": peak_rss_bytes(),
+        "worker_peak_rss_bytes": peak_rss_bytes(resource.RUSAGE_CHILDREN) or None,
+        "tables": timed.tables,
+    }
+
+
+def run_child(mode, output_format, scale_factor, workers):
+    command = [sys.executable, os.path.abspath(__file__), "--child", mode, output_format, str(scale_factor),
+               str(workers)]
+    result = subprocess.run(command, capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    if result.returncode != 0:
+        return {"mode": mode, "format": output_format, "scale_factor": scale_factor, "workers": workers,
+                "error": result.stderr.strip().splitlines()[-1:] or [f"exit code {result.returncode}"]}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark generate_data.py throughput.")
+    parser.add_argument("--scale-factors", type=float, nargs="+", default=SCALE_FACTORS)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--formats", nargs="+", choices=list(sinks.SINKS), default=list(sinks.SINKS))
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes (columnar mode)")
+    parser.add_argument("--output", default="benchmark_generate.json")
+    parser.add_argument("--child", nargs=4, metavar=("MODE", "FORMAT", "SCALE_FACTOR", "WORKERS"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        mode, output_format, scale_factor, workers = args.child
+        print(json.dumps(run_once(mode, output_format, float(scale_factor), int(workers))))
+        return
+
+    runs = []
+    for scale_factor in args.scale_factors:
+        for mode in args.modes:
+            for output_format in args.formats:
+                run = run_child(mode, output_format, scale_factor, args.workers)
+                runs.append(run)
+                if "error" in run:
+                    print(f"sf={scale_factor:g} {mode:8} {output_format:7} failed: {run['error'][0]}")
+                else:
+                    print(f"sf={scale_factor:g} {mode:8} {output_format:7} {run['rows']:>10} rows "
+                          f"{run['rows_per_sec']:>12,.0f} rows/s {run['bytes_written']:>14,} B "
+                          f"{run['process_peak_rss_bytes'] / 2**20:>8,.1f} MiB process peak RSS")
+
+    results = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "runs": runs,
+    }
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"Benchmark results written to {args.output}.")
+
+
+if __name__ == "__main__":
+    main()
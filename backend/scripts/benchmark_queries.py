@@ -0,0 +1,283 @@
+import argparse
+import copy
+import json
+import os
+import platform
+import tempfile
+import time
+from datetime import datetime, timedelta
+import numpy as np
+import build_duckdb
+import columnar
+import generate_data
+import scenarios
+import schema
+import sinks
+from benchmark_generate import git_revision
+
+# Query latency benchmark for the five Golden Run questions. Data is generated
+# at every scale factor, loaded into PostgreSQL and into a DuckDB file, and a
+# reference query set per golden run is timed on both. p50/p95/p99 latencies
+# and query plans go to a JSON file, to compare schema, index and engine choices:
+#
+#   python benchmark_queries.py --scale-factors 1 10 100 --profile performance
+#
+# PostgreSQL is reached with the DB_* variables the backend uses (or --postgres-dsn)
+# and needs psycopg2; the setup_tables*.sql scripts are (re)run, so point it at
+# a scratch database.
+
+SCALE_FACTORS = [1, 10]
+ENGINES = ["postgres", "duckdb"]
+REPETITIONS = 20
+WARMUP = 2
+
+# Golden runs 1-4 are moved to these days before the generated end date, so
+# they fall inside the generated window at every scale factor
+GOLDEN_RUN_DAYS_BACK = [30, 29, 28, 27]
+# Golden Run 5 is the fixed historical record, see generate_data.generate_historical_data
+HISTORICAL_DAY = datetime(2023, 6, 15)
+
+# Reference queries per golden run. {day} and {next_day} are the golden run's
+# day and the day after, as timestamps; the SQL runs unchanged on both engines.
+QUERIES = {
+    "Golden Run 1": {
+        "production_volume": """
+            SELECT SUM(quantity) AS volume FROM productiondata
+            WHERE production_date = CAST(TIMESTAMP '{day}' AS DATE)""",
+        "process_flow": """
+            SELECT process_name, COUNT(*) AS runs, AVG(flow_rate) AS flow_rate FROM processdata
+            WHERE start_time >= TIMESTAMP '{day}' AND start_time < TIMESTAMP '{next_day}'
+            GROUP BY process_name""",
+        "non_conformities": """
+            SELECT description, severity, action_taken FROM nonconformityrecords
+            WHERE deviation_date >= TIMESTAMP '{day}' AND deviation_date < TIMESTAMP '{next_day}'""",
+    },
+    "Golden Run 2": {
+        "yield": """
+            SELECT
+                (SELECT SUM(quantity) FROM rawmaterialinput
+                 WHERE arrival_date >= TIMESTAMP '{day}' AND arrival_date < TIMESTAMP '{next_day}') AS input,
+                (SELECT SUM(quantity) FROM productiondata
+                 WHERE production_date = CAST(TIMESTAMP '{day}' AS DATE)) AS output""",
+        "batch_quality": """
+            SELECT p.batch_number, AVG(q.fat_content) AS fat, AVG(q.protein_content) AS protein
+            FROM productiondata p JOIN qualitydata q ON q.batch_number = p.batch_number
+            WHERE p.production_date = CAST(TIMESTAMP '{day}' AS DATE)
+            GROUP BY p.batch_number""",
+        "failed_raw_material": """
+            SELECT supplier_name, remarks FROM rawmaterialinput
+            WHERE quality_check = 'Failed' AND arrival_date >= TIMESTAMP '{day}' AND arrival_date < TIMESTAMP '{next_day}'""",
+    },
+    "Golden Run 3": {
+        "process_variation": """
+            SELECT AVG(temperature), STDDEV_SAMP(temperature), AVG(pressure), STDDEV_SAMP(pressure)
+            FROM processdata WHERE start_time >= TIMESTAMP '{day}' AND start_time < TIMESTAMP '{next_day}'""",
+        "quality_variation": """
+            SELECT STDDEV_SAMP(fat_content), STDDEV_SAMP(protein_content)
+            FROM qualitydata WHERE test_date >= TIMESTAMP '{day}' AND test_date < TIMESTAMP '{next_day}'""",
+    },
+    "Golden Run 4": {
+        "shift_logs": """
+            SELECT shift_number, operator_name, log_entry FROM shiftprocesslogs
+            WHERE shift_date = CAST(TIMESTAMP '{day}' AS DATE) ORDER BY shift_number""",
+        "bacteria_count": """
+            SELECT MAX(bacteria_count), AVG(bacteria_count) FROM qualitydata
+            WHERE test_date >= TIMESTAMP '{day}' AND test_date < TIMESTAMP '{next_day}'""",
+    },
+    "Golden Run 5": {
+        "historical_quality": """
+            SELECT batch_number, fat_content, protein_content, pH_level FROM qualitydata
+            WHERE test_date >= TIMESTAMP '{day}' AND test_date < TIMESTAMP '{next_day}'""",
+        "similar_deviations": """
+            SELECT deviation_date, description, action_taken FROM nonconformityrecords
+            WHERE description LIKE '%Temperature%' ORDER BY deviation_date""",
+        "monthly_fat_trend": """
+            SELECT date_trunc('month', test_date) AS month, AVG(fat_content), STDDEV_SAMP(fat_content)
+            FROM qualitydata GROUP BY 1 ORDER BY 1""",
+    },
+}
+
+
+def golden_run_days(end):
+    days = {f"Golden Run {number}": datetime(end.year, end.month, end.day) - timedelta(days=days_back)
+            for number, days_back in enumerate(GOLDEN_RUN_DAYS_BACK, 1)}
+    days["Golden Run 5"] = HISTORICAL_DAY
+    return days
+
+
+def relocated_scenarios(days):
+    # The Golden Run scenarios with their dates moved to days
+    scenario_set = copy.deepcopy(scenarios.GOLDEN_RUNS)
+    for scenario, day in zip(scenario_set, days.values()):
+        scenario["dates"] = [day.strftime("%Y-%m-%d")] * 2
+    return scenario_set
+
+
+def reference_queries(days):
+    for golden_run, queries in QUERIES.items():
+        day = days[golden_run]
+        for name, sql in queries.items():
+            yield golden_run, name, " ".join(sql.format(day=day, next_day=day + timedelta(days=1)).split())
+
+
+def generate_csv(output_dir, scale_factor, days, profile, workers):
+    sizes = generate_data.scaled_sizes(scale_factor)
+    with sinks.CsvSink(output_dir) as sink:
+        generate_data.generate(sink, sizes, "columnar", workers, columnar.CHUNK_SIZE, relocated_scenarios(days),
+                               profile=profile)
+    return sizes
+
+
+class DuckDbEngine:
+    name = "duckdb"
+
+    def __init__(self, path):
+        import duckdb
+        self.duckdb = duckdb
+        self.path = path
+        self.connection = None
+
+    def load(self, csv_dir, profile):
+        # Types and sort order are handled by build_duckdb; the profile only concerns PostgreSQL
+        build_duckdb.build_from_csv(csv_dir, self.path)
+        self.connection = self.duckdb.connect(self.path, read_only=True)
+
+    def execute(self, sql):
+        return self.connection.execute(sql).fetchall()
+
+    def plan(self, sql):
+        return "\n".join(row[1] for row in self.connection.execute(f"EXPLAIN {sql}").fetchall())
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+
+
+class PostgresEngine:
+    name = "postgres"
+
+    def __init__(self, dsn):
+        import psycopg2
+        self.connection = psycopg2.connect(dsn) if dsn else psycopg2.connect(
+            user=os.getenv("DB_USER"), host=os.getenv("DB_HOST"), dbname=os.getenv("DB_NAME"),
+            password=os.getenv("DB_PASSWORD"), port=os.getenv("DB_PORT"))
+        self.connection.autocommit = True
+
+    def run_script(self, file_name):
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), file_name)) as file:
+            with self.connection.cursor() as cursor:
+                cursor.execute(file.read())
+
+    def load(self, csv_dir, profile):
+        self.run_script("setup_tables.sql")
+        with self.connection.cursor() as cursor:
+            if profile == "performance":
+                self.run_script("setup_tables_performance.sql")
+                for statement in schema.partition_statements(generate_data.START_DATE, generate_data.END_DATE):
+                    cursor.execute(statement)
+            for table_name, columns in columnar.TABLE_COLUMNS.items():
+                path = os.path.join(csv_dir, sinks.CSV_FILE_NAMES.get(table_name, table_name) + ".csv")
+                with open(path) as file:
+                    cursor.copy_expert(f"COPY {table_name} ({', '.join(columns)}) FROM STDIN "
+                                       "WITH (FORMAT csv, HEADER true)", file)
+                cursor.execute(f"ANALYZE {table_name}")
+
+    def execute(self, sql):
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql)
+            return cursor.fetchall()
+
+    def plan(self, sql):
+        # Plans are collected with EXPLAIN ANALYZE after the timed runs, so caches are warm
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}")
+            return cursor.fetchone()[0]
+
+    def close(self):
+        self.connection.close()
+
+
+def open_engine(name, work_dir, dsn):
+    if name == "duckdb":
+        return DuckDbEngine(os.path.join(work_dir, "db.db"))
+    return PostgresEngine(dsn)
+
+
+def time_query(engine, sql, repetitions, warmup):
+    for _ in range(warmup):
+        engine.execute(sql)
+    latencies = []
+    for _ in range(repetitions):
+        started = time.perf_counter()
+        rows = engine.execute(sql)
+        latencies.append((time.perf_counter() - started) * 1000)
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {"rows": len(rows), "p50_ms": p50, "p95_ms": p95, "p99_ms": p99, "mean_ms": float(np.mean(latencies)),
+            "repetitions": repetitions}
+
+
+def benchmark_engine(engine_name, csv_dir, work_dir, days, args):
+    result = {"engine": engine_name}
+    try:
+        engine = open_engine(engine_name, work_dir, args.postgres_dsn)
+    except Exception as error:
+        result["error"] = f"{type(error).__name__}: {error}"
+        return result
+    try:
+        started = time.perf_counter()
+        engine.load(csv_dir, args.profile)
+        result["load_seconds"] = time.perf_counter() - started
+        result["queries"] = []
+        for golden_run, name, sql in reference_queries(days):
+            timing = time_query(engine, sql, args.repetitions, args.warmup)
+            result["queries"].append(dict(golden_run=golden_run, name=name, sql=sql, **timing, plan=engine.plan(sql)))
+            print(f"  {engine_name:8} {golden_run} {name:22} p50 {timing['p50_ms']:8.2f} ms "
+                  f"p95 {timing['p95_ms']:8.2f} ms p99 {timing['p99_ms']:8.2f} ms")
+    except Exception as error:
+        result["error"] = f"{type(error).__name__}: {error}"
+    finally:
+        engine.close()
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Golden Run queries on PostgreSQL and DuckDB.")
+    parser.add_argument("--scale-factors", type=float, nargs="+", default=SCALE_FACTORS)
+    parser.add_argument("--engines", nargs="+", choices=ENGINES, default=ENGINES)
+    parser.add_argument("--profile", choices=["default", "performance"], default="default",
+                        help="schema profile loaded into PostgreSQL, see setup_tables_performance.sql")
+    parser.add_argument("--repetitions", type=int, default=REPETITIONS)
+    parser.add_argument("--warmup", type=int, default=WARMUP)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--postgres-dsn", help="libpq connection string, defaults to the DB_* variables")
+    parser.add_argument("--output", default="benchmark_queries.json")
+    args = parser.parse_args(argv)
+
+    days = golden_run_days(generate_data.END_DATE)
+    runs = []
+    for scale_factor in args.scale_factors:
+        with tempfile.TemporaryDirectory() as work_dir:
+            csv_dir = os.path.join(work_dir, "csv")
+            sizes = generate_csv(csv_dir, scale_factor, days, args.profile, args.workers)
+            print(f"sf={scale_factor:g}: generated {sum(sizes.values())} base rows")
+            for engine_name in args.engines:
+                result = benchmark_engine(engine_name, csv_dir, work_dir, days, args)
+                if "error" in result:
+                    print(f"  {engine_name:8} failed: {result['error']}")
+                runs.append(dict(result, scale_factor=scale_factor, profile=args.profile, sizes=sizes))
+
+    results = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "golden_run_days": {golden_run: day.strftime("%Y-%m-%d") for golden_run, day in days.items()},
+        "runs": runs,
+    }
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2, default=str)
+    print(f"Benchmark results written to {args.output}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+import argparse
+import hashlib
+import io
+import os
+import re
+import time
+from dataclasses import dataclass
+import numpy as np
+import build_rollups
+import columnar
+import sinks
+
+# Checks processdata and qualitydata against the spec limits of the SOPs and
+# keeps every out-of-spec value in spec_violations (setup_compliance.sql),
+# indexed by batch, time and parameter, so "which batches were out of spec"
+# questions are index lookups instead of scans over the raw rows:
+#
+#   python build_compliance.py                     # DuckDB file built by build_duckdb.py
+#   python build_compliance.py --engine postgres   # DB_* variables, like the backend
+#   python build_compliance.py --full              # check every row again
+#
+# The free text spec_limits of sop_data ("Time: 30-35 min; Temp: 72-75°C") are
+# parsed into numeric ranges. A row is checked against the version of each
+# procedure in effect on its date (the latest one updated on or before it).
+# Runs are incremental: rows from the last checked time onwards are checked
+# again and their violations replaced in one transaction; when the SOPs change,
+# every row is.
+#
+# Only parameters whose measured column is on the scale of its spec limit are
+# checked (PARAMETERS). The generated process runs and bacteria counts are not
+# (OFF_SCALE): checked, they flag nearly every row and spec_violations would
+# copy the source tables instead of singling out bad batches. Their anomalies
+# are what the rollups' limits (build_rollups.SPEC_LIMITS) are for.
+
+SETUP_COMPLIANCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "setup_compliance.sql")
+
+COLUMNS = ["source_table", "row_id", "batch_number", "event_time", "procedure_name", "sop_id", "parameter", "value",
+           "low_limit", "high_limit", "unit", "deviation"]
+
+# Per source table: the rows to check (row_id, event_time, the scope column and
+# the measured values) and the time column the incremental filter applies to
+SOURCES = {
+    "processdata": (
+        "SELECT process_id AS row_id, start_time AS event_time, process_name AS scope, end_time, temperature "
+        "FROM processdata", "start_time"),
+    "qualitydata": (
+        "SELECT quality_id AS row_id, test_date AS event_time, batch_number, fat_content, bacteria_count "
+        "FROM qualitydata", "test_date"),
+}
+
+# spec_limits parameter name: (source table, measured column). Process run
+# durations are computed in minutes; parameters without a column here (e.g.
+# Seal Integrity) are not measured in the dataset and are skipped, like OFF_SCALE.
+PARAMETERS = {
+    "Fat Content": ("qualitydata", "fat_content"),
+}
+
+# Measured parameters that are skipped because the generated values are not on
+# the scale of the SOP limit, with the reason. Moving one into PARAMETERS (as
+# source table, column) checks it again.
+OFF_SCALE = {
+    # "Time: 30-35 min" of Pasteurization Process against the process run
+    # (end_time - start_time, drawn from 30 to 120 minutes)
+    "Time": "process runs last 30 to 120 minutes, not the 30-35 minute holding time of the SOP",
+    # "Temp: 72-75°C" against processdata.temperature (around 60°C for every process)
+    "Temp": "process temperatures are generated around 60°C for every process, below the 72-75°C of the SOP",
+    # "Bacteria Count: <50 CFU/mL" against qualitydata.bacteria_count
+    "Bacteria Count": "bacteria counts run from thousands to hundreds of thousands, "
+                      "with no known conversion to the CFU/mL of the SOP",
+}
+
+# Tables whose rows a procedure only applies to when this column matches the
+# first word of its name ("Pasteurization Process" -> process_name
+# Pasteurization), as in populateKGData.py; other tables are checked against
+# every procedure that names one of their parameters
+SCOPES = {"processdata": "scope"}
+
+# "Name: 30-35 unit", "Name: <50 unit", "Name: >=95 unit"
+NUMBER = r"\d+(?:\.\d+)?"
+LIMIT = re.compile(rf"^(?P<name>[^:]+):\s*(?:(?P<low>{NUMBER})\s*-\s*(?P<high>{NUMBER})"
+                   rf"|(?P<operator><=|>=|<|>)\s*(?P<bound>{NUMBER}))\s*(?P<unit>.*)$")
+
+
+@dataclass
+class SpecLimit:
+    parameter: str
+    low: float = None
+    high: float = None
+    # Ranges include their ends, "<50" and ">95" do not
+    low_inclusive: bool = True
+    high_inclusive: bool = True
+    unit: str = ""
+
+
+def parse_spec_limits(text):
+    # SpecLimits of a spec_limits string, ValueError on anything else
+    limits = []
+    for part in filter(None, (part.strip() for part in (text or "").split(";"))):
+        match = LIMIT.match(part)
+        if not match:
+            raise ValueError(f"cannot parse spec limit '{part}'")
+        limit = SpecLimit(match["name"].strip(), unit=match["unit"].strip())
+        if match["operator"] is None:
+            limit.low, limit.high = float(match["low"]), float(match["high"])
+        elif match["operator"].startswith("<"):
+            limit.high, limit.high_inclusive = float(match["bound"]), match["operator"] == "<="
+        else:
+            limit.low, limit.low_inclusive = float(match["bound"]), match["operator"] == ">="
+        limits.append(limit)
+    return limits
+
+
+def sop_table(connection):
+    # sop_data, or sop in DuckDB files named after the CSV exports (see sinks.CSV_FILE_NAMES)
+    candidates = ["sop_data", sinks.CSV_FILE_NAMES["sop_data"]]
+    cursor = connection.cursor()
+    cursor.execute("SELECT table_name FROM information_schema.tables WHERE table_schema = current_schema()")
+    tables = {row[0] for row in cursor.fetchall()}
+    return next((table_name for table_name in candidates if table_name in tables), candidates[0])
+
+
+def load_procedures(connection):
+    # {procedure name: (versions' last_updated days, sop ids, SpecLimits)}
+    # ordered by date, plus a hash of the SOP rows and the checked parameters
+    # (a change to either checks every row again) and the parse errors
+    cursor = connection.cursor()
+    cursor.execute(f"SELECT sop_id, procedure_name, last_updated, spec_limits FROM {sop_table(connection)} "
+                   "ORDER BY procedure_name, last_updated, sop_id")
+    rows = cursor.fetchall()
+    digest = hashlib.sha256(repr((rows, sorted(PARAMETERS.items()))).encode()).hexdigest()
+    procedures, errors = {}, []
+    for sop_id, procedure_name, last_updated, spec_limits in rows:
+        try:
+            limits = parse_spec_limits(spec_limits)
+        except ValueError as error:
+            errors.append(f"sop {sop_id}: {error}")
+            continue
+        versions = procedures.setdefault(procedure_name, ([], [], []))
+        # An SOP without a date applies from the start
+        versions[0].append(np.datetime64(last_updated, "D") if last_updated is not None else np.datetime64("1970-01-01"))
+        versions[1].append(sop_id)
+        versions[2].append(limits)
+    return procedures, digest, errors
+
+
+def measured_values(columns, column):
+    if column == "duration":
+        return (times(columns["end_time"]) - times(columns["event_time"])) / np.timedelta64(1, "m")
+    return np.ma.asarray(columns[column]).astype(np.float64).filled(np.nan)
+
+
+def times(array):
+    # NULLs arrive masked (DuckDB) or as None (PostgreSQL), both become NaT
+    return np.ma.asarray(array).astype("datetime64[s]").filled(np.datetime64("NaT"))
+
+
+def version_limits(versions, parameter):
+    # (low, high, low_inclusive, high_inclusive, unit) arrays over the versions
+    # of a procedure; NaN bounds where a version does not limit the parameter
+    limits = [next((limit for limit in limit_list if limit.parameter == parameter), SpecLimit(parameter))
+              for limit_list in versions]
+    return (np.array([np.nan if limit.low is None else limit.low for limit in limits]),
+            np.array([np.nan if limit.high is None else limit.high for limit in limits]),
+            np.array([limit.low_inclusive for limit in limits]),
+            np.array([limit.high_inclusive for limit in limits]),
+            np.array([limit.unit for limit in limits], dtype=object))
+
+
+def evaluate(source_table, columns, procedures):
+    # spec_violations columns of the rows in columns
+    event_times = times(columns["event_time"])
+    event_days = event_times.astype("datetime64[D]")
+    row_ids = np.asarray(columns["row_id"]).astype(np.int64)
+    result = {column: [] for column in COLUMNS}
+    for procedure_name, (days, sop_ids, versions) in procedures.items():
+        parameters = {limit.parameter for limits in versions for limit in limits
+                      if PARAMETERS.get(limit.parameter, (None,))[0] == source_table}
+        if not parameters:
+            continue
+        rows = np.ones(len(row_ids), dtype=bool)
+        if source_table in SCOPES:
+            rows = np.asarray(columns[SCOPES[source_table]], dtype=object) == procedure_name.split()[0]
+        # Version in effect per row; rows from before the first version use the first
+        version = np.maximum(np.searchsorted(np.array(days), event_days[rows], side="right") - 1, 0)
+        for parameter in sorted(parameters):
+            low, high, low_inclusive, high_inclusive, units = (array[version]
+                                                               for array in version_limits(versions, parameter))
+            values = measured_values(columns, PARAMETERS[parameter][1])[rows]
+            # Comparisons with NaN are false: missing values and missing bounds never violate
+            below = np.where(low_inclusive, values < low, values <= low)
+            above = np.where(high_inclusive, values > high, values >= high)
+            violated = below | above
+            if not violated.any():
+                continue
+            count = int(violated.sum())
+            result["source_table"].append(np.full(count, source_table, dtype=object))
+            result["row_id"].append(row_ids[rows][violated])
+            result["batch_number"].append(batch_numbers(columns, rows)[violated])
+            result["event_time"].append(event_times[rows][violated])
+            result["procedure_name"].append(np.full(count, procedure_name, dtype=object))
+            result["sop_id"].append(np.array(sop_ids, dtype=np.int64)[version[violated]])
+            result["parameter"].append(np.full(count, parameter, dtype=object))
+            result["value"].append(values[violated])
+            result["low_limit"].append(low[violated])
+            result["high_limit"].append(high[violated])
+            result["unit"].append(units[violated])
+            result["deviation"].append(np.where(below, low - values, values - high)[violated])
+    return {column: np.concatenate(parts) if parts else np.empty(0) for column, parts in result.items()}
+
+
+def batch_numbers(columns, rows):
+    if "batch_number" in columns:
+        return np.asarray(columns["batch_number"], dtype=object)[rows]
+    # Process runs make batch B<start date>-<process id>, see columnar.batch_keys
+    event_times = times(columns["event_time"])[rows]
+    return columnar.format_batch_numbers(columnar.yyyymmdd(event_times),
+                                         np.asarray(columns["row_id"]).astype(np.int64)[rows])
+
+
+def load_state(connection):
+    cursor = connection.cursor()
+    cursor.execute("SELECT source_table, checked_until, spec_hash FROM spec_compliance_state")
+    return {source_table: (checked_until, spec_hash) for source_table, checked_until, spec_hash in cursor.fetchall()}
+
+
+def refresh(connection, full=False):
+    # Checks the rows from each table's last checked time onwards (every row
+    # when full, new or the SOPs changed) and replaces their violations.
+    # Returns {source_table: (since, rows checked, violations written)} and the
+    # SOP parse errors.
+    cursor = connection.cursor()
+    with open(SETUP_COMPLIANCE) as file:
+        cursor.execute(file.read())
+    procedures, digest, errors = load_procedures(connection)
+    state = load_state(connection)
+    statements = io.StringIO()
+    deletes, states, summary = [], [], {}
+    for source_table, (query, time_column) in SOURCES.items():
+        checked_until, spec_hash = state.get(source_table, (None, None))
+        since = None if full or spec_hash != digest else checked_until
+        if since is not None:
+            query += f" WHERE {time_column} >= {sinks.sql_literal(since)}"
+        columns = build_rollups.fetch_columns(connection, query)
+        rows = list(build_rollups.rollup_rows(evaluate(source_table, columns, procedures), COLUMNS))
+        sinks.write_insert_sql(statements, "spec_violations", COLUMNS, rows)
+        event_times = times(columns["event_time"])
+        event_times = event_times[~np.isnat(event_times)]
+        if len(event_times):
+            checked_until = event_times.max().astype(object)
+        deletes.append(f"DELETE FROM spec_violations WHERE source_table = '{source_table}'"
+                       + (f" AND event_time >= {sinks.sql_literal(since)}" if since is not None else ""))
+        states.append(f"INSERT INTO spec_compliance_state VALUES ('{source_table}', "
+                      f"{sinks.sql_literal(checked_until)}, '{digest}')")
+        summary[source_table] = (since, len(columns["row_id"]), len(rows))
+
+    cursor.execute("BEGIN TRANSACTION")
+    try:
+        for statement in deletes:
+            cursor.execute(statement)
+        if statements.tell():
+            cursor.execute(statements.getvalue())
+        cursor.execute("DELETE FROM spec_compliance_state")
+        for statement in states:
+            cursor.execute(statement)
+        cursor.execute("COMMIT")
+    except BaseException:
+        cursor.execute("ROLLBACK")
+        raise
+    return summary, errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the measured data against the SOP spec limits.")
+    parser.add_argument("--engine", choices=["duckdb", "postgres"], default="duckdb")
+    parser.add_argument("--database", default=build_rollups.DATABASE, help="DuckDB database file")
+    parser.add_argument("--postgres-dsn", help="libpq connection string, defaults to the DB_* variables")
+    parser.add_argument("--full", action="store_true", help="check every row instead of the recent ones")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    connection = build_rollups.connect(args.engine, args.database, args.postgres_dsn)
+    try:
+        summary, errors = refresh(connection, args.full)
+    finally:
+        connection.close()
+    for error in errors:
+        print(f"Skipped {error}")
+    for parameter, reason in OFF_SCALE.items():
+        print(f"Skipped {parameter}: {reason}")
+    for source_table, (since, checked, written) in summary.items():
+        scope = "all rows" if since is None else f"rows from {since:%Y-%m-%d %H:%M:%S} onwards"
+        print(f"{source_table}: checked {checked} {scope}, {written} violations.")
+    print(f"Done in {time.perf_counter() - started:.1f}s.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import argparse
+import glob
+import os
+import time
+import duckdb
+import generate_data
+import schema
+import sinks
+
+# Builds All_CSV_data/db.db in a single DuckDB connection, either from a
+# directory of CSV exports (kg_and_csv layout by default) or straight from the
+# generator's columns without a CSV round trip:
+#
+#   python build_duckdb.py
+#   python build_duckdb.py --csv-dir ../kg_and_csv --database ../All_CSV_data/db.db
+#   python build_duckdb.py --generate --scale-factor 100
+#
+# Known tables get their column types from setup_tables.sql and are sorted on
+# their time columns; CSV files that match no table are loaded with sniffed types.
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CSV_DIR = os.path.join(BACKEND_DIR, "kg_and_csv")
+DATABASE = os.path.join(BACKEND_DIR, "All_CSV_data", "db.db")
+
+
+def csv_table_name(file_name):
+    # Schema table a CSV file holds: sop.csv holds sop_data, see sinks.CSV_FILE_NAMES
+    name = os.path.splitext(os.path.basename(file_name))[0]
+    table_names = {csv_name: table_name for table_name, csv_name in sinks.CSV_FILE_NAMES.items()}
+    return table_names.get(name, name)
+
+
+def sql_string(value):
+    return "'" + value.replace("'", "''") + "'"
+
+
+def csv_source(path, columns):
+    # read_csv with the schema's types for every known column, the rest sniffed
+    types = ", ".join(f"{sql_string(column)}: {sql_string(schema.duckdb_type(column_type))}"
+                      for column, column_type in columns)
+    return f"read_csv({sql_string(path)}, header = true, types = {{{types}}})"
+
+
+def build_from_csv(csv_dir, database):
+    paths = sorted(glob.glob(os.path.join(csv_dir, "*.csv")))
+    if not paths:
+        raise FileNotFoundError(f"No CSV files found in {csv_dir}")
+    tables = schema.dataset_schema()
+    temp_name = database + ".tmp"
+    if os.path.exists(temp_name):
+        os.remove(temp_name)
+    os.makedirs(os.path.dirname(os.path.abspath(database)), exist_ok=True)
+    with duckdb.connect(temp_name) as connection:
+        for path in paths:
+            name = os.path.splitext(os.path.basename(path))[0]
+            table_name = csv_table_name(path)
+            if table_name in tables:
+                header = connection.execute(f"SELECT * FROM read_csv({sql_string(path)}, header = true) LIMIT 0")
+                present = {column for column, *_ in header.description}
+                columns = [(column, column_type) for column, column_type in tables[table_name] if column in present]
+                order = ", ".join(f'"{column}"' for column in schema.SORT_COLUMNS[table_name] if column in present)
+                query = f"SELECT * FROM {csv_source(path, columns)}" + (f" ORDER BY {order}" if order else "")
+            else:
+                query = f"SELECT * FROM read_csv_auto({sql_string(path)})"
+            connection.execute(f'CREATE TABLE "{name}" AS {query}')
+            rows = connection.execute(f'SELECT count(*) FROM "{name}"').fetchone()[0]
+            print(f"Loaded {rows} rows into '{name}' from {path}.")
+    os.replace(temp_name, database)
+
+
+def build_from_generator(database, scale_factor, workers):
+    sizes = generate_data.scaled_sizes(scale_factor)
+    with sinks.DuckDbSink(os.path.dirname(os.path.abspath(database)), os.path.basename(database)) as sink:
+        generate_data.generate(sink, sizes, "columnar", workers)
+    print(f"Generated {sum(sizes.values())} base rows into {database}.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the DuckDB database from CSV files or generated data.")
+    parser.add_argument("--csv-dir", default=CSV_DIR)
+    parser.add_argument("--database", default=DATABASE)
+    parser.add_argument("--generate", action="store_true",
+                        help="load freshly generated columnar data instead of CSV files")
+    parser.add_argument("--scale-factor", type=float, default=1.0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    if args.generate:
+        build_from_generator(args.database, args.scale_factor, args.workers)
+    else:
+        build_from_csv(args.csv_dir, args.database)
+    print(f"Built {args.database} in {time.perf_counter() - started:.1f}s.")
+
+
+if __name__ == "__main__":
+    main()
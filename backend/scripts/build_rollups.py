@@ -0,0 +1,240 @@
+import argparse
+import io
+import os
+import time
+import numpy as np
+import sinks
+
+# Daily, weekly and monthly rollups of the measured values in processdata,
+# productiondata and qualitydata, per process or product, so aggregate questions
+# read a few hundred rows of metric_rollups (setup_rollups.sql) instead of
+# scanning the raw tables:
+#
+#   python build_rollups.py                     # DuckDB file built by build_duckdb.py
+#   python build_rollups.py --engine postgres   # DB_* variables, like the backend
+#   python build_rollups.py --full              # recompute every period
+#
+# Only the needed columns are read; counts, means, standard deviations,
+# percentiles and out-of-spec counts are computed with vectorized NumPy group-bys.
+# Runs are incremental: the periods from the last rolled up day onwards are
+# recomputed and replaced in one transaction, older periods are left alone.
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATABASE = os.path.join(BACKEND_DIR, "All_CSV_data", "db.db")
+SETUP_ROLLUPS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "setup_rollups.sql")
+
+PERIODS = ["day", "week", "month"]
+PERCENTILES = {"p05": 0.05, "p50": 0.5, "p95": 0.95}
+COLUMNS = ["period", "period_start", "source_table", "group_name", "metric", "row_count", "mean", "std_dev",
+           "min_value", "p05", "p50", "p95", "max_value", "out_of_spec"]
+
+# Per source table: the rows to aggregate (period_time, group_name and the
+# metrics), and the time column the incremental filter applies to. Quality
+# tests are grouped by the product made from their batch.
+SOURCES = {
+    "processdata": (
+        "SELECT start_time AS period_time, process_name AS group_name, temperature, pressure, flow_rate "
+        "FROM processdata", "start_time", ["temperature", "pressure", "flow_rate"]),
+    "productiondata": (
+        "SELECT production_date AS period_time, product_name AS group_name, quantity "
+        "FROM productiondata", "production_date", ["quantity"]),
+    "qualitydata": (
+        "SELECT q.test_date AS period_time, COALESCE(p.product_name, 'Unassigned') AS group_name, "
+        "q.fat_content, q.protein_content, q.bacteria_count, q.pH_level FROM qualitydata q "
+        "LEFT JOIN (SELECT batch_number, MIN(product_name) AS product_name FROM productiondata "
+        "GROUP BY batch_number) p ON p.batch_number = q.batch_number", "q.test_date",
+        ["fat_content", "protein_content", "bacteria_count", "pH_level"]),
+}
+
+# (low, high) limits of every metric, None where unbounded. fat_content and
+# bacteria_count follow the SOP limits the generators use to mark anomalies, the
+# others about two standard deviations around normal operation.
+SPEC_LIMITS = {
+    "temperature": (50.0, 70.0),
+    "pressure": (110.0, 190.0),
+    "flow_rate": (550.0, 1150.0),
+    "quantity": (1000.0, None),
+    "fat_content": (3.0, 4.0),
+    "protein_content": (2.8, 3.6),
+    "bacteria_count": (None, 100000.0),
+    "pH_level": (6.5, 6.9),
+}
+
+
+def period_starts(times, period):
+    # First day of the day, ISO week (Monday) or month each timestamp falls in
+    days = np.asarray(times).astype("datetime64[D]")
+    if period == "day":
+        return days
+    if period == "week":
+        # 1970-01-01 was a Thursday
+        return days - (days.astype(np.int64) + 3) % 7
+    if period == "month":
+        return days.astype("datetime64[M]").astype("datetime64[D]")
+    raise ValueError(f"Unknown period '{period}', expected one of {PERIODS}")
+
+
+def out_of_spec(metric, values):
+    low, high = SPEC_LIMITS.get(metric, (None, None))
+    mask = np.zeros(len(values), dtype=bool)
+    if low is not None:
+        mask |= values < low
+    if high is not None:
+        mask |= values > high
+    return mask
+
+
+def group_stats(group_ids, values, num_groups):
+    # Statistics of values per group id in [0, num_groups); every group must be
+    # non-empty. Percentiles interpolate linearly like PostgreSQL's percentile_cont.
+    counts = np.bincount(group_ids, minlength=num_groups)
+    order = np.lexsort((values, group_ids))
+    sorted_values = values[order]
+    starts = np.cumsum(counts) - counts
+    mean = np.bincount(group_ids, weights=values, minlength=num_groups) / counts
+    squares = np.bincount(group_ids, weights=(values - mean[group_ids]) ** 2, minlength=num_groups)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        std_dev = np.where(counts > 1, np.sqrt(squares / (counts - 1)), np.nan)
+    stats = {"row_count": counts, "mean": mean, "std_dev": std_dev,
+             "min_value": sorted_values[starts], "max_value": sorted_values[starts + counts - 1]}
+    for name, fraction in PERCENTILES.items():
+        # Offsets within the group, so the interpolation weight does not depend on the group's position
+        offset = fraction * (counts - 1)
+        lower = np.floor(offset).astype(np.int64)
+        upper = np.ceil(offset).astype(np.int64)
+        below = sorted_values[starts + lower]
+        stats[name] = below + (sorted_values[starts + upper] - below) * (offset - lower)
+    return stats
+
+
+def rollup(source_table, columns, metrics, periods=PERIODS, since=None):
+    # metric_rollups columns for one source table. columns holds period_time,
+    # group_name and the metrics as arrays; with since, only the periods that
+    # contain since or start after it are produced.
+    times = np.asarray(columns["period_time"]).astype("datetime64[s]")
+    names, name_codes = np.unique(np.asarray(columns["group_name"], dtype=object).astype(str), return_inverse=True)
+    result = {column: [] for column in COLUMNS}
+    for period in periods:
+        starts = period_starts(times, period)
+        in_range = np.ones(len(times), dtype=bool) if since is None else starts >= period_starts([since], period)[0]
+        for metric in metrics:
+            # NULLs arrive masked (DuckDB) or as None (PostgreSQL), both become NaN
+            values = np.ma.asarray(columns[metric]).astype(np.float64).filled(np.nan)
+            rows = in_range & ~np.isnan(values)
+            if not rows.any():
+                continue
+            # Group key: period start day and group name
+            keys = starts[rows].astype(np.int64) * len(names) + name_codes[rows]
+            group_keys, group_ids = np.unique(keys, return_inverse=True)
+            stats = group_stats(group_ids, values[rows], len(group_keys))
+            stats["out_of_spec"] = np.bincount(group_ids, weights=out_of_spec(metric, values[rows]),
+                                               minlength=len(group_keys)).astype(np.int64)
+            result["period"].append(np.full(len(group_keys), period, dtype=object))
+            result["period_start"].append((group_keys // len(names)).astype("datetime64[D]"))
+            result["source_table"].append(np.full(len(group_keys), source_table, dtype=object))
+            result["group_name"].append(names[group_keys % len(names)].astype(object))
+            result["metric"].append(np.full(len(group_keys), metric, dtype=object))
+            for name, column in stats.items():
+                result[name].append(column)
+    return {column: np.concatenate(parts) if parts else np.empty(0) for column, parts in result.items()}
+
+
+def rollup_rows(columns, names=COLUMNS):
+    # Python rows in names order, NaN (undefined std_dev) as NULL
+    values = []
+    for column in names:
+        array = columns[column]
+        if array.dtype.kind == "f":
+            array = np.where(np.isnan(array), None, array.astype(object))
+        values.append(array.astype(object).tolist())
+    return zip(*values)
+
+
+def fetch_columns(connection, query):
+    # {column: array} of a query result, on DuckDB and PostgreSQL (DB-API) connections
+    cursor = connection.cursor()
+    cursor.execute(query)
+    if hasattr(cursor, "fetchnumpy"):
+        return cursor.fetchnumpy()
+    names = [description[0].lower() for description in cursor.description]
+    rows = cursor.fetchall()
+    return {name: np.array(column, dtype=object) for name, column in zip(names, zip(*rows) if rows else [()] * len(names))}
+
+
+def last_rolled_up_day(connection):
+    cursor = connection.cursor()
+    cursor.execute("SELECT MAX(period_start) FROM metric_rollups WHERE period = 'day'")
+    return cursor.fetchone()[0]
+
+
+def refresh(connection, full=False):
+    # Recomputes the periods from the last rolled up day onwards (every period
+    # when full or empty) and replaces them. Returns (since, rows written).
+    cursor = connection.cursor()
+    with open(SETUP_ROLLUPS) as file:
+        cursor.execute(file.read())
+    since = None if full else last_rolled_up_day(connection)
+    # First day of every period to recompute; the source rows are read from the earliest
+    starts = {} if since is None else {period: period_starts([since], period)[0].astype(object) for period in PERIODS}
+    cutoff = min(starts.values(), default=None)
+    statements = io.StringIO()
+    written = 0
+    for source_table, (query, time_column, metrics) in SOURCES.items():
+        if cutoff is not None:
+            query += f" WHERE {time_column} >= {sinks.sql_literal(cutoff)}"
+        columns = fetch_columns(connection, query)
+        if "ph_level" in columns:
+            columns["pH_level"] = columns.pop("ph_level")
+        rows = list(rollup_rows(rollup(source_table, columns, metrics, since=since)))
+        sinks.write_insert_sql(statements, "metric_rollups", COLUMNS, rows)
+        written += len(rows)
+
+    cursor.execute("BEGIN TRANSACTION")
+    try:
+        if since is None:
+            cursor.execute("DELETE FROM metric_rollups")
+        for period, start in starts.items():
+            cursor.execute(f"DELETE FROM metric_rollups WHERE period = '{period}' "
+                           f"AND period_start >= {sinks.sql_literal(start)}")
+        if written:
+            cursor.execute(statements.getvalue())
+        cursor.execute("COMMIT")
+    except BaseException:
+        cursor.execute("ROLLBACK")
+        raise
+    return since, written
+
+
+def connect(engine, database, dsn):
+    if engine == "duckdb":
+        import duckdb
+        return duckdb.connect(database)
+    import psycopg2
+    connection = psycopg2.connect(dsn) if dsn else psycopg2.connect(
+        user=os.getenv("DB_USER"), host=os.getenv("DB_HOST"), dbname=os.getenv("DB_NAME"),
+        password=os.getenv("DB_PASSWORD"), port=os.getenv("DB_PORT"))
+    # Transactions are issued explicitly, the same way on both engines
+    connection.autocommit = True
+    return connection
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Refresh the metric_rollups summary table.")
+    parser.add_argument("--engine", choices=["duckdb", "postgres"], default="duckdb")
+    parser.add_argument("--database", default=DATABASE, help="DuckDB database file")
+    parser.add_argument("--postgres-dsn", help="libpq connection string, defaults to the DB_* variables")
+    parser.add_argument("--full", action="store_true", help="recompute every period instead of the recent ones")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    connection = connect(args.engine, args.database, args.postgres_dsn)
+    try:
+        since, written = refresh(connection, args.full)
+    finally:
+        connection.close()
+    scope = "all periods" if since is None else f"periods from {since:%Y-%m-%d} onwards"
+    print(f"Wrote {written} rollup rows ({scope}) in {time.perf_counter() - started:.1f}s.")
+
+
+if __name__ == "__main__":
+    main()
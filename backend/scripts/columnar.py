@@ -0,0 +1,608 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+import numpy as np
+import scenarios
+import schema
+from random_data import sop_random_data, nonconformities_random_data
+
+# Columnar counterpart to the row generators in generate_data.py.
+# Every table is built as a dict of whole NumPy columns (column name -> array)
+# instead of a list of Python rows, so large tables cost a handful of array ops
+# rather than one Python loop iteration per row.
+#
+# Columns stay compact while in memory: timestamps and dates are datetime64
+# (int64), low-cardinality strings are dictionary encoded (Dictionary) and batch
+# numbers are kept as integer keys (BatchNumbers). Sinks decode them as they write.
+
+TABLE_COLUMNS = {
+    "processdata": ["process_id", "process_name", "start_time", "end_time", "temperature", "pressure", "flow_rate"],
+    "productiondata": ["production_id", "product_name", "batch_number", "quantity", "unit", "production_date"],
+    "qualitydata": ["quality_id", "batch_number", "fat_content", "protein_content", "bacteria_count", "pH_level", "test_date"],
+    "sop_data": ["sop_id", "procedure_name", "description", "version", "last_updated", "spec_limits", "process_guidelines"],
+    "shiftprocesslogs": ["log_id", "shift_date", "shift_number", "operator_name", "log_entry"],
+    "reports": ["report_id", "report_type", "start_date", "end_date", "report_content"],
+    "nonconformityrecords": ["record_id", "deviation_date", "description", "severity", "action_taken", "resolved_date"],
+    "rawmaterialinput": ["material_id", "arrival_date", "supplier_name", "material_type", "quantity", "unit", "quality_check", "remarks"],
+}
+
+PROCESSES = np.array(["Pasteurization", "Homogenization", "Separation", "Standardization"], dtype=object)
+PRODUCTS = np.array(["Whole Milk", "Skim Milk", "2% Milk", "Heavy Cream"], dtype=object)
+OPERATORS = np.array(["John Doe", "Jane Smith", "Mike Johnson", "Sarah Brown"], dtype=object)
+SEVERITIES = np.array(["Low", "Medium", "High"], dtype=object)
+REPORT_TYPES = np.array(["Weekly", "Monthly"], dtype=object)
+SUPPLIERS = np.array([
+    "Dairy Farms Inc.",
+    "Mountain Dairy",
+    "Sunny Meadows",
+    "Hillside Dairy",
+    "Green Valley Dairy",
+    "Farm Fresh",
+    "Country Milk",
+    "Riverside Dairy",
+    "Highland Farms",
+    "Valley Dairy",
+    "Happy Cows",
+    "Sunshine Dairy"
+], dtype=object)
+MATERIAL_TYPES = np.array(["Raw Milk", "Cream", "Skim Milk", "Other"], dtype=object)
+QUALITY_CHECKS = np.array(["Passed", "Failed"], dtype=object)
+UNITS = np.array(["Liters"], dtype=object)
+REMARKS = np.array([
+    "No issues, quality is within standards.",
+    "High bacterial count detected; returned to supplier.",
+    "Quality is good, within standards.",
+    "Sample test passed, suitable for processing.",
+    "Quality matches the standards set by the company.",
+    "No anomalies, quality is consistent.",
+    "Consistent quality as previous shipments.",
+    "High quality milk, no bacteria detected.",
+    "Detected contaminants, batch returned.",
+    "Meets all quality standards, ready for processing.",
+    "Delayed delivery due to transportation issues.",
+    "Low fat content detected."
+], dtype=object)
+
+# Routine shift log entries are "<shift name> shift: <message>", so every one
+# is prebuilt once and rows just index into the table.
+SHIFT_NAMES = ["Morning", "Afternoon", "Night"]
+LOG_MESSAGES = [
+    "Routine operations performed. No significant issues reported.",
+    "Minor equipment malfunction observed. Maintenance team notified.",
+]
+LOG_ROUTINE, LOG_MINOR_ISSUE = range(len(LOG_MESSAGES))
+LOG_ENTRIES = np.array([f"{shift} shift: {message}" for shift in SHIFT_NAMES for message in LOG_MESSAGES], dtype=object)
+
+SOP_FIELDS = {key: np.array([row[key] for row in sop_random_data], dtype=object) for key in sop_random_data[0]}
+NONCONFORMITY_FIELDS = {key: np.array([row[key] for row in nonconformities_random_data], dtype=object)
+                        for key in nonconformities_random_data[0]}
+
+ROW_CHUNK_SIZE = 100_000
+
+
+def random_timestamps(rng, n, start, end):
+    # Same distribution as generate_data.random_date: a whole number of seconds in [start, end]
+    start = np.datetime64(start, "s")
+    span = int((np.datetime64(end, "s") - start) / np.timedelta64(1, "s"))
+    return start + rng.integers(0, span + 1, n).astype("timedelta64[s]")
+
+
+class Dictionary:
+    # Dictionary encoded string column: small integer codes into an object array
+    # of distinct values. Low-cardinality columns (names, units, template texts)
+    # cost one or two bytes per row instead of an 8 byte pointer, and chunks
+    # pickle between worker processes as a flat buffer. Supports the array
+    # operations the generators, scenarios and sinks use; decode() gives the
+    # plain object array.
+    def __init__(self, codes, values):
+        self.values = values
+        self.codes = np.asarray(codes).astype(code_dtype(len(values)), copy=False)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, index):
+        return Dictionary(self.codes[index], self.values)
+
+    def __setitem__(self, index, value):
+        # New values are appended to (a copy of) the dictionary
+        value = np.asarray(value, dtype=object)
+        distinct, inverse = np.unique(value.ravel(), return_inverse=True)
+        positions = {known: code for code, known in enumerate(self.values)}
+        missing = [item for item in distinct if item not in positions]
+        if missing:
+            positions.update((item, len(self.values) + offset) for offset, item in enumerate(missing))
+            self.values = np.append(self.values, np.array(missing, dtype=object))
+            self.codes = self.codes.astype(code_dtype(len(self.values)), copy=False)
+        codes = np.array([positions[item] for item in distinct], dtype=self.codes.dtype)
+        self.codes[index] = codes[inverse].reshape(value.shape)
+
+    def __eq__(self, other):
+        return (self.values == other)[self.codes]
+
+    __hash__ = None
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes
+
+    def repeat(self, repeats):
+        return Dictionary(self.codes.repeat(repeats), self.values)
+
+    def decode(self):
+        return self.values[self.codes]
+
+
+def code_dtype(num_values):
+    return np.min_scalar_type(max(num_values - 1, 0))
+
+
+def decode(array):
+    # Plain NumPy array of a column, whatever its encoding
+    return array.decode() if isinstance(array, (Dictionary, BatchNumbers)) else array
+
+
+def concatenate(parts):
+    if all(isinstance(part, BatchNumbers) for part in parts):
+        return BatchNumbers(np.concatenate([part.keys for part in parts]))
+    if not any(isinstance(part, Dictionary) for part in parts):
+        return np.concatenate([decode(part) for part in parts])
+    if all(isinstance(part, Dictionary) and part.values is parts[0].values for part in parts):
+        return Dictionary(np.concatenate([part.codes for part in parts]), parts[0].values)
+    # Chunks whose dictionaries differ (e.g. extended by a scenario) are re-encoded
+    values, codes = np.unique(np.concatenate([decode(part) for part in parts]), return_inverse=True)
+    return Dictionary(codes, values)
+
+
+def choice(rng, values, n):
+    return Dictionary(rng.integers(0, len(values), n), values)
+
+
+def concat(*parts):
+    result = parts[0]
+    for part in parts[1:]:
+        result = np.char.add(result, part)
+    return result
+
+
+def yyyymmdd(timestamps):
+    days = timestamps.astype("datetime64[D]")
+    months = days.astype("datetime64[M]")
+    years = months.astype("datetime64[Y]")
+    return ((years.astype(np.int64) + 1970) * 10000
+            + (months.astype(np.int64) % 12 + 1) * 100
+            + (days - months).astype(np.int64) + 1)
+
+
+def batch_keys(days, ids):
+    # Integer form of a batch number (B<days>-<ids>), cheap to hash, sort and compare
+    return days.astype(np.int64) * 10**10 + ids
+
+
+def format_batch_numbers(days, ids):
+    # B<YYYYMMDD>-<id, zero padded to 3 digits>
+    if len(ids) == 0:
+        return np.empty(0, dtype=object)
+    return concat("B", days.astype(str), "-", np.char.zfill(ids.astype(str), 3)).astype(object)
+
+
+class BatchNumbers:
+    # batch_number column held as batch_keys(); the strings are only formatted
+    # when a sink writes them, a few at a time
+    def __init__(self, keys):
+        self.keys = keys
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __getitem__(self, index):
+        return BatchNumbers(self.keys[index])
+
+    @property
+    def nbytes(self):
+        return self.keys.nbytes
+
+    def repeat(self, repeats):
+        return BatchNumbers(self.keys.repeat(repeats))
+
+    def decode(self):
+        return format_batch_numbers(self.keys // 10**10, self.keys % 10**10)
+
+
+# Every generator ends by handing its columns to the compiled scenarios in
+# refs["scenarios"] (see scenarios.py), which inject the Golden Run anomalies.
+
+def generate_process_columns(rng, first_id, num_entries, start, end, refs):
+    start_time = random_timestamps(rng, num_entries, start, end)
+    end_time = start_time + rng.integers(30, 121, num_entries).astype("timedelta64[m]")
+
+    # Introduce occasional outliers and variations
+    outlier = rng.random(num_entries) < 0.05
+    temperature = np.where(outlier, rng.uniform(40, 80, num_entries), rng.normal(60, 5, num_entries))
+
+    columns = {
+        "process_id": np.arange(first_id, first_id + num_entries),
+        "process_name": choice(rng, PROCESSES, num_entries),
+        "start_time": start_time,
+        "end_time": end_time,
+        "temperature": np.round(temperature, 1),
+        "pressure": np.round(rng.normal(150, 20, num_entries), 1),
+        "flow_rate": np.round(rng.normal(850, 150, num_entries), 1),
+    }
+    refs["scenarios"].apply("processdata", columns, rng, start_time)
+    return columns
+
+
+def generate_production_columns(rng, first_id, num_entries, start, end, refs):
+    # Process ids are consecutive from batch_first_id, so a random index into the
+    # process batch days is a random process batch
+    batch_index = rng.integers(0, len(refs["batch_days"]), num_entries)
+    batch_day = refs["batch_days"][batch_index]
+    keys = batch_keys(batch_day, batch_index + refs["batch_first_id"])
+
+    # Introduce occasional large batches or small batches
+    unusual = rng.random(num_entries) < 0.1
+    quantity = np.where(unusual, rng.uniform(500, 8000, num_entries), rng.uniform(1000, 6000, num_entries))
+    production_date = random_timestamps(rng, num_entries, start, end).astype("datetime64[D]")
+
+    columns = {
+        "production_id": np.arange(first_id, first_id + num_entries),
+        "product_name": choice(rng, PRODUCTS, num_entries),
+        "batch_number": BatchNumbers(keys),
+        "quantity": np.round(quantity, 2),
+        "unit": Dictionary(np.zeros(num_entries, dtype=np.uint8), UNITS),
+        "production_date": production_date,
+    }
+    refs["scenarios"].apply("productiondata", columns, rng, production_date, keys)
+    return columns
+
+
+def generate_quality_columns(rng, first_id, num_entries, start, end, refs):
+    test_date = random_timestamps(rng, num_entries, start, end)
+    batch_index = rng.integers(0, len(refs["batch_days"]), num_entries)
+    batch_day = refs["batch_days"][batch_index]
+    keys = batch_keys(batch_day, batch_index + refs["batch_first_id"])
+
+    # Introduce correlations and occasional outliers
+    fat_content = np.round(rng.normal(3.5, 0.5, num_entries), 1)
+    correlated = rng.random(num_entries) < 0.1
+    protein_content = np.where(correlated,
+                               fat_content * 0.8 + rng.normal(0, 0.1, num_entries),
+                               rng.normal(3.2, 0.2, num_entries))
+
+    # Occasional high bacteria count
+    high_bacteria = rng.random(num_entries) < 0.05
+    bacteria_count = np.where(high_bacteria,
+                              rng.uniform(100000, 500000, num_entries),
+                              rng.lognormal(9, 0.3, num_entries))
+
+    columns = {
+        "quality_id": np.arange(first_id, first_id + num_entries),
+        "batch_number": BatchNumbers(keys),
+        "fat_content": fat_content,
+        "protein_content": np.round(protein_content, 1),
+        "bacteria_count": bacteria_count.astype(np.int64),
+        "pH_level": np.round(rng.normal(6.7, 0.1, num_entries), 1),
+        "test_date": test_date,
+    }
+    refs["scenarios"].apply("qualitydata", columns, rng, test_date, keys)
+    return columns
+
+
+def generate_sop_columns(rng, first_id, num_entries, start, end, refs):
+    template = rng.integers(0, len(sop_random_data), num_entries)
+    version = concat(rng.integers(1, 4, num_entries).astype(str), ".", rng.integers(0, 10, num_entries).astype(str))
+    last_updated = random_timestamps(rng, num_entries, start, end).astype("datetime64[D]")
+
+    columns = {
+        "sop_id": np.arange(first_id, first_id + num_entries),
+        "procedure_name": Dictionary(template, SOP_FIELDS["procedure_name"]),
+        "description": Dictionary(template, SOP_FIELDS["description"]),
+        "version": version.astype(object),
+        "last_updated": last_updated,
+        "spec_limits": Dictionary(template, SOP_FIELDS["spec_limits"]),
+        "process_guidelines": Dictionary(template, SOP_FIELDS["process_guidelines"]),
+    }
+    refs["scenarios"].apply("sop_data", columns, rng, last_updated)
+    return columns
+
+
+def generate_shift_columns(rng, num_entries, start, end, refs):
+    # One row per shift; generate_shift_process_log_columns expands them into log entries
+    shift_date = random_timestamps(rng, num_entries, start, end).astype("datetime64[D]")
+    shift_number = rng.integers(1, 4, num_entries)
+
+    # Introduce occasional issues in log entries
+    message = np.where(rng.random(num_entries) < 0.1, LOG_MINOR_ISSUE, LOG_ROUTINE)
+    shifts = {
+        "shift_date": shift_date,
+        "shift_number": shift_number,
+        "operator_name": choice(rng, OPERATORS, num_entries),
+        "log_entry": Dictionary((shift_number - 1) * len(LOG_MESSAGES) + message, LOG_ENTRIES),
+    }
+    refs["scenarios"].apply("shiftprocesslogs", shifts, rng, shift_date)
+    return shifts
+
+
+def generate_shift_process_log_columns(rng, first_id, num_entries, start, end, refs):
+    shifts = generate_shift_columns(rng, num_entries, start, end, refs)
+
+    # Allow multiple entries within a shift. Log ids count entries, not shifts,
+    # so chunks number them from 0 and generate_chunks shifts them into place.
+    repeats = rng.integers(1, 4, num_entries)
+    columns = {"log_id": np.arange(repeats.sum())}
+    columns.update((column, values.repeat(repeats)) for column, values in shifts.items())
+    return columns
+
+
+def generate_report_columns(rng, first_id, num_entries, start, end, refs):
+    report_type = choice(rng, REPORT_TYPES, num_entries)
+    weekly = report_type == "Weekly"
+    start_date = random_timestamps(rng, num_entries, start, end).astype("datetime64[D]")
+    end_date = start_date + np.where(weekly, 6, 29).astype("timedelta64[D]")
+
+    output = rng.integers(30000, 40001, num_entries).astype(str)
+    change = rng.integers(-5, 6, num_entries)
+    mean_quality = np.round(rng.normal(3.5, 0.1, num_entries), 2).astype(str)
+    std_dev_quality = np.round(rng.normal(0.5, 0.05, num_entries), 2).astype(str)
+    mean_process = np.round(rng.normal(60, 5, num_entries), 2).astype(str)
+    std_dev_process = np.round(rng.normal(10, 1, num_entries), 2).astype(str)
+    raw_milk_volume = np.where(weekly,
+                               rng.integers(50000, 70001, num_entries),
+                               rng.integers(200000, 300001, num_entries)).astype(str)
+
+    metrics = concat("Mean quality: ", mean_quality, ", Std Dev: ", std_dev_quality, ". ",
+                     "Mean process: ", mean_process, ", Std Dev: ", std_dev_process, ". ",
+                     "Raw milk volume: ", raw_milk_volume, " liters.")
+    weekly_content = concat("Weekly production summary: Total output ", output, " liters. ",
+                            "Quality metrics within acceptable ranges. ", metrics)
+    monthly_content = concat("Monthly overview: Production ", np.where(change > 0, "increased", "decreased"),
+                             " by ", np.abs(change).astype(str), "% compared to last month. ",
+                             "Continuous improvement initiatives ongoing. ", metrics)
+
+    columns = {
+        "report_id": np.arange(first_id, first_id + num_entries),
+        "report_type": report_type,
+        "start_date": start_date,
+        "end_date": end_date,
+        "report_content": np.where(weekly, weekly_content, monthly_content).astype(object),
+    }
+    refs["scenarios"].apply("reports", columns, rng, start_date)
+    return columns
+
+
+def generate_nonconformity_columns(rng, first_id, num_entries, start, end, refs):
+    template = rng.integers(0, len(nonconformities_random_data), num_entries)
+    deviation_date = random_timestamps(rng, num_entries, start, end)
+
+    columns = {
+        "record_id": np.arange(first_id, first_id + num_entries),
+        "deviation_date": deviation_date,
+        "description": Dictionary(template, NONCONFORMITY_FIELDS["description"]),
+        "severity": choice(rng, SEVERITIES, num_entries),
+        "action_taken": Dictionary(template, NONCONFORMITY_FIELDS["action_taken"]),
+        "resolved_date": deviation_date + rng.integers(1, 4, num_entries).astype("timedelta64[D]"),
+    }
+    refs["scenarios"].apply("nonconformityrecords", columns, rng, deviation_date)
+    return columns
+
+
+def generate_raw_material_columns(rng, first_id, num_entries, start, end, refs):
+    arrival_date = random_timestamps(rng, num_entries, start, end)
+
+    columns = {
+        "material_id": np.arange(first_id, first_id + num_entries),
+        "arrival_date": arrival_date,
+        "supplier_name": choice(rng, SUPPLIERS, num_entries),
+        "material_type": choice(rng, MATERIAL_TYPES, num_entries),
+        "quantity": np.round(rng.normal(10000, 5000, num_entries), 2),
+        "unit": Dictionary(np.zeros(num_entries, dtype=np.uint8), UNITS),
+        "quality_check": choice(rng, QUALITY_CHECKS, num_entries),
+        "remarks": choice(rng, REMARKS, num_entries),
+    }
+    refs["scenarios"].apply("rawmaterialinput", columns, rng, arrival_date)
+    return columns
+
+
+def material_batch_keys(raw_material):
+    # Each delivery becomes batch B<arrival date>-<material id>
+    return batch_keys(yyyymmdd(raw_material["arrival_date"]), raw_material["material_id"])
+
+
+# Generation order. Tables in the first group need nothing from other tables;
+# productiondata and qualitydata pick batches from processdata and are linked
+# to scenarios through the batches made from rawmaterialinput deliveries, both
+# collected while the first group is generated and handed to the second.
+INDEPENDENT_TABLES = {
+    "rawmaterialinput": generate_raw_material_columns,
+    "processdata": generate_process_columns,
+    "sop_data": generate_sop_columns,
+    "shiftprocesslogs": generate_shift_process_log_columns,
+    "reports": generate_report_columns,
+    "nonconformityrecords": generate_nonconformity_columns,
+}
+DEPENDENT_TABLES = {
+    "productiondata": generate_production_columns,
+    "qualitydata": generate_quality_columns,
+}
+TABLE_GENERATORS = {**INDEPENDENT_TABLES, **DEPENDENT_TABLES}
+
+# Rows per generated chunk. Each chunk draws from its own RNG stream, so output
+# depends on the seed and chunk size only, never on the number of workers.
+CHUNK_SIZE = 1_000_000
+
+
+def table_sizes(num_entries, num_entries_sop, num_entries_non_conformities, num_entries_raw_material_input):
+    return {
+        "processdata": num_entries,
+        "productiondata": num_entries,
+        "qualitydata": num_entries,
+        "sop_data": num_entries_sop,
+        "shiftprocesslogs": num_entries,
+        "reports": num_entries,
+        "nonconformityrecords": num_entries_non_conformities,
+        "rawmaterialinput": num_entries_raw_material_input,
+    }
+
+
+# First id of every table in a fresh dataset; shift log ids have always started at 0
+FIRST_IDS = {table_name: 1 for table_name in TABLE_COLUMNS}
+FIRST_IDS["shiftprocesslogs"] = 0
+
+
+def chunk_rng(seed, table_name, chunk_index, run=0):
+    # Independent stream per (table, chunk), derived from the root seed without
+    # any shared state. Incremental runs (see incremental.py) add their run number.
+    table_index = list(TABLE_COLUMNS).index(table_name)
+    spawn_key = (table_index, chunk_index) if run == 0 else (table_index, chunk_index, run)
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=spawn_key))
+
+
+def month_windows(start, end):
+    # [start, end] split at month boundaries, matching the monthly partitions of
+    # setup_tables_performance.sql
+    months = schema.month_starts(start, end)
+    return [(max(start, lower), min(end, upper - timedelta(seconds=1))) for lower, upper in zip(months, months[1:])]
+
+
+def window_sizes(size, windows):
+    # size rows spread over the windows in proportion to their length
+    seconds = np.array([(window_end - window_start).total_seconds() + 1 for window_start, window_end in windows])
+    bounds = np.round(size * np.cumsum(seconds) / seconds.sum()).astype(int)
+    return np.diff(bounds, prepend=0)
+
+
+def chunk_tasks(tables, sizes, seed, start, end, chunk_size, first_ids, run, windows=None):
+    # With windows, every chunk stays inside one window, windows in order
+    windows = windows or [(start, end)]
+    for table_name in tables:
+        chunk_index = 0
+        offset = 0
+        for (window_start, window_end), window_size in zip(windows, window_sizes(sizes[table_name], windows)):
+            for window_offset in range(0, window_size, chunk_size):
+                num_rows = min(chunk_size, window_size - window_offset)
+                yield (table_name, chunk_index, first_ids[table_name] + offset, num_rows, seed,
+                       window_start, window_end, run)
+                chunk_index += 1
+                offset += num_rows
+
+
+def sort_chunk(table_name, columns, first_id):
+    # Rows in time order (schema.SORT_COLUMNS) with the ids renumbered to match
+    keys = schema.SORT_COLUMNS[table_name]
+    order = np.lexsort([columns[key] for key in reversed(keys)])
+    columns = {column: values[order] for column, values in columns.items()}
+    id_column = TABLE_COLUMNS[table_name][0]
+    # Shift log ids are numbered from 0 per chunk, see generate_shift_process_log_columns
+    columns[id_column] = np.arange(len(order)) + (0 if table_name == "shiftprocesslogs" else first_id)
+    return columns
+
+
+def generate_chunk(task, refs):
+    table_name, chunk_index, first_id, num_rows, seed, start, end, run = task
+    rng = chunk_rng(seed, table_name, chunk_index, run)
+    columns = TABLE_GENERATORS[table_name](rng, first_id, num_rows, start, end, refs)
+    if refs.get("time_ordered"):
+        columns = sort_chunk(table_name, columns, first_id)
+    return table_name, columns
+
+
+worker_refs = None
+
+
+def init_worker(refs):
+    global worker_refs
+    worker_refs = refs
+
+
+def generate_chunk_in_worker(task):
+    return generate_chunk(task, worker_refs)
+
+
+def map_chunks(tasks, workers, refs):
+    # Ordered results, with at most 2 chunks per worker in flight so memory stays
+    # bounded when the consumer (usually a sink) is slower than the generators.
+    # A worker that dies (e.g. OOM killed) raises BrokenProcessPool instead of hanging.
+    if workers <= 1:
+        for task in tasks:
+            yield generate_chunk(task, refs)
+        return
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(refs,)) as executor:
+        pending = deque()
+        for task in tasks:
+            pending.append(executor.submit(generate_chunk_in_worker, task))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def generate_chunks(seed, start, end, sizes, workers=1, chunk_size=CHUNK_SIZE, scenario_set=None,
+                    first_ids=None, run=0, time_ordered=False):
+    # Yields (table_name, columns) chunk by chunk, every table's chunks in order.
+    # Ids continue across chunks (and from first_ids, for appending to existing
+    # data); only shiftprocesslogs needs renumbering here since a shift expands
+    # into a random number of entries. time_ordered generates month by month
+    # and sorts every chunk, so rows arrive in (roughly) time order, one monthly
+    # partition at a time, with ids ascending in time.
+    first_ids = {**FIRST_IDS, **(first_ids or {})}
+    windows = month_windows(start, end) if time_ordered else None
+    compiled = scenarios.CompiledScenarios(scenarios.GOLDEN_RUNS if scenario_set is None else scenario_set)
+    batch_days = [np.empty(0, dtype=np.int32)]
+    linked_batch_keys = {}
+    log_offset = first_ids["shiftprocesslogs"]
+    tasks = chunk_tasks(INDEPENDENT_TABLES, sizes, seed, start, end, chunk_size, first_ids, run, windows)
+    for table_name, columns in map_chunks(tasks, workers, {"scenarios": compiled, "time_ordered": time_ordered}):
+        if table_name == "processdata":
+            batch_days.append(yyyymmdd(columns["start_time"]).astype(np.int32))
+        elif table_name == "rawmaterialinput":
+            linked = compiled.linked_batch_keys(scenarios.day_numbers(columns["arrival_date"]),
+                                                material_batch_keys(columns))
+            for scenario_id, keys in linked.items():
+                linked_batch_keys.setdefault(scenario_id, []).append(keys)
+        elif table_name == "shiftprocesslogs":
+            columns["log_id"] += log_offset
+            log_offset += len(columns["log_id"])
+        yield table_name, columns
+
+    compiled.link_batches({scenario_id: np.concatenate(keys) for scenario_id, keys in linked_batch_keys.items()})
+    refs = {"scenarios": compiled, "batch_days": np.concatenate(batch_days), "batch_first_id": first_ids["processdata"],
+            "time_ordered": time_ordered}
+    tasks = chunk_tasks(DEPENDENT_TABLES, sizes, seed, start, end, chunk_size, first_ids, run, windows)
+    yield from map_chunks(tasks, workers, refs)
+
+
+def generate_tables(seed, start, end, sizes, workers=1, chunk_size=CHUNK_SIZE, scenario_set=None):
+    # Whole tables in memory, for callers that need complete columns
+    chunks = {}
+    for table_name, columns in generate_chunks(seed, start, end, sizes, workers, chunk_size, scenario_set):
+        chunks.setdefault(table_name, []).append(columns)
+    return {table_name: {column: concatenate([chunk[column] for chunk in chunks[table_name]])
+                         for column in TABLE_COLUMNS[table_name]}
+            for table_name in TABLE_COLUMNS}
+
+
+def iter_rows(columns, chunk_size=ROW_CHUNK_SIZE, timestamp_separator=None):
+    # Turn columns back into plain Python rows (datetime/date/int/float/str)
+    # a chunk at a time, for writers that work row by row. With a
+    # timestamp_separator, timestamp columns come out preformatted as
+    # "YYYY-MM-DD<sep>HH:MM:SS" strings instead of datetime objects.
+    arrays = list(columns.values())
+    num_rows = len(arrays[0])
+    for offset in range(0, num_rows, chunk_size):
+        yield from zip(*(column_values(array[offset:offset + chunk_size], timestamp_separator) for array in arrays))
+
+
+def column_values(array, timestamp_separator=None):
+    if isinstance(array, Dictionary):
+        # Decoding the distinct values once keeps the strings shared between rows
+        values = array.values.tolist()
+        return [values[code] for code in array.codes.tolist()]
+    if isinstance(array, BatchNumbers):
+        return array.decode().tolist()
+    if timestamp_separator is not None and array.dtype == np.dtype("datetime64[s]"):
+        values = np.datetime_as_string(array, unit="s")
+        if timestamp_separator != "T" and len(values):
+            values = np.char.replace(values, "T", timestamp_separator)
+        return values.tolist()
+    return array.tolist()
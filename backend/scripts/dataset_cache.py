@@ -0,0 +1,101 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+# Content-addressed cache of generated datasets. An entry holds the files one
+# generate_data.py run wrote (insert.sql, copy.sql, one CSV/Parquet file per
+# table or db.db), keyed by a hash of everything the output depends on: seed,
+# table sizes, date window, scenarios, output options and the generator's code.
+# A repeated build links (or copies) the cached files into place instead of
+# generating them again.
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(SCRIPTS_DIR, ".dataset_cache")
+MANIFEST = "manifest.json"
+# Files that are updated in place after generation (DuckDB databases get the
+# rollup tables, see build_rollups.py) are always copied, never linked
+COPIED_SUFFIXES = (".db",)
+
+# Sources the generated data depends on; their content is part of every key
+CODE_FILES = [
+    "generate_data.py",
+    "columnar.py",
+    "normalized.py",
+    "scenarios.py",
+    "random_data.py",
+    "telemetry.py",
+    "schema.py",
+    "sinks.py",
+    "setup_tables.sql",
+    "setup_telemetry.sql",
+]
+
+
+def code_version():
+    digest = hashlib.sha256()
+    for file_name in CODE_FILES:
+        with open(os.path.join(SCRIPTS_DIR, file_name), "rb") as file:
+            digest.update(file_name.encode() + b"\0" + file.read() + b"\0")
+    return digest.hexdigest()
+
+
+def cache_key(inputs):
+    # inputs: JSON serializable description of the run (dates as ISO strings)
+    content = json.dumps(dict(inputs, code=code_version()), sort_keys=True, default=str)
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def place(source, target, mode):
+    # Replaces target by a hard link to (or a copy of) source. Links fall back to
+    # copies across file systems. Everything that writes these files afterwards
+    # replaces them instead of writing in place, so a linked cache entry stays
+    # intact: the sinks write to a temp file moved into place on close
+    # (Sink.publish) and so does updateCSVfiles.py.
+    temp_name = f"{target}.{os.getpid()}.tmp"
+    if mode == "link":
+        try:
+            os.link(source, temp_name)
+        except OSError:
+            shutil.copy2(source, temp_name)
+    else:
+        shutil.copy2(source, temp_name)
+    os.replace(temp_name, target)
+
+
+def fetch(key, output_dir, cache_dir=CACHE_DIR, mode="link"):
+    # Puts a cached entry's files into output_dir; False when there is none
+    entry = os.path.join(cache_dir, key)
+    try:
+        with open(os.path.join(entry, MANIFEST)) as file:
+            files = json.load(file)["files"]
+    except FileNotFoundError:
+        return False
+    os.makedirs(output_dir, exist_ok=True)
+    for file_name in files:
+        place(os.path.join(entry, file_name), os.path.join(output_dir, file_name),
+              "copy" if file_name.endswith(COPIED_SUFFIXES) else mode)
+    return True
+
+
+@contextmanager
+def build(key, inputs, cache_dir=CACHE_DIR):
+    # Yields an empty directory to generate into. When the block succeeds the
+    # directory becomes the cache entry for key, otherwise it is removed.
+    os.makedirs(cache_dir, exist_ok=True)
+    build_dir = tempfile.mkdtemp(prefix=f"{key[:16]}.", suffix=".build", dir=cache_dir)
+    try:
+        yield build_dir
+        files = sorted(os.listdir(build_dir))
+        with open(os.path.join(build_dir, MANIFEST), "w") as file:
+            json.dump({"files": files, "inputs": inputs}, file, indent=2, default=str)
+        try:
+            os.rename(build_dir, os.path.join(cache_dir, key))
+        except OSError:
+            # Another build stored the same key first, its files are identical
+            pass
+    finally:
+        if os.path.isdir(build_dir):
+            shutil.rmtree(build_dir)
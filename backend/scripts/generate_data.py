@@ -1,16 +1,59 @@
+import argparse
 import os
 import random
 from datetime import datetime, timedelta
 import numpy as np
 from random_data import sop_random_data, nonconformities_random_data
+import columnar
+import dataset_cache
+import incremental
+import normalized
+import scenarios
+import schema
+import sinks
+import telemetry
+
+# Set a fixed date range for all datasets: the 180 days up to the reference date,
+# today unless REFERENCE_DATE (YYYY-MM-DD) pins it for reproducible output
+REFERENCE_DATE = os.getenv("REFERENCE_DATE")
+
+def date_window(reference_date=None):
+    if reference_date:
+        now = datetime.strptime(reference_date, "%Y-%m-%d")
+    else:
+        now = datetime.now()
+        now = datetime(now.year, now.month, now.day)
+    return now + timedelta(days=-180), now
+
+START_DATE, END_DATE = date_window(REFERENCE_DATE)
+
+def set_reference_date(reference_date):
+    global START_DATE, END_DATE
+    START_DATE, END_DATE = date_window(reference_date)
 
-# Set a fixed date range for all datasets
-now = datetime.now()
-now = datetime(now.year, now.month, now.day)
-START_DATE = now + timedelta(days=-180)
-END_DATE = now
 FILE_NAME = "insert.sql"
 SEED = 42
+# "rows" runs the original per-row generators, "columnar" builds whole NumPy columns (see columnar.py)
+MODE = os.getenv("GENERATE_MODE", "rows")
+# Rows per INSERT statement
+INSERT_CHUNK_SIZE = int(os.getenv("INSERT_CHUNK_SIZE", sinks.INSERT_CHUNK_SIZE))
+# One of sinks.SINKS: "sql" (insert.sql), "copy" (copy.sql), "csv" or "parquet" (one file per table)
+OUTPUT_FORMAT = os.getenv("OUTPUT_FORMAT", "sql")
+OUTPUT_DIR = os.getenv("OUTPUT_DIR", ".")
+# Columnar mode only: worker processes and rows per independently seeded chunk
+WORKERS = int(os.getenv("WORKERS", os.cpu_count() or 1))
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", columnar.CHUNK_SIZE))
+# Columnar mode only: JSON list of anomaly scenarios, defaults to the Golden Runs in scenarios.py
+SCENARIO_FILE = os.getenv("SCENARIO_FILE")
+# Columnar mode only: append the days since the last run (recorded in STATE_FILE) instead of regenerating
+INCREMENTAL = os.getenv("INCREMENTAL", "0") == "1"
+STATE_FILE = os.getenv("STATE_FILE", incremental.STATE_FILE)
+# Reuse identical earlier builds from the dataset cache (see dataset_cache.py)
+CACHE = os.getenv("DATASET_CACHE", "0") == "1"
+CACHE_DIR = os.getenv("DATASET_CACHE_DIR", dataset_cache.CACHE_DIR)
+# Columnar mode only: also write per-sample sensor telemetry of every process run, every SAMPLE_INTERVAL seconds
+TELEMETRY = os.getenv("TELEMETRY", "0") == "1"
+SAMPLE_INTERVAL = int(os.getenv("SAMPLE_INTERVAL", telemetry.SAMPLE_INTERVAL))
 
 # Global lists to store batch numbers and other references
 batch_numbers = []
@@ -19,7 +62,10 @@ poor_quality_batches = []
 batches_from_poor_quality_material = []
 material_id_batch_map = {}
 
-def random_date(start=START_DATE, end=END_DATE):
+def random_date(start=None, end=None):
+    # The window is read at call time, so set_reference_date applies
+    start = START_DATE if start is None else start
+    end = END_DATE if end is None else end
     return start + timedelta(seconds=random.randint(0, int((end - start).total_seconds())))
 
 def generate_process_data(num_entries):
@@ -27,7 +73,6 @@ def generate_process_data(num_entries):
     np.random.seed(SEED)
     processes = ["Pasteurization", "Homogenization", "Separation", "Standardization"]
 
-    data = []
     for i in range(1, num_entries + 1):
         process = random.choice(processes)
         start_time = random_date()
@@ -54,15 +99,12 @@ def generate_process_data(num_entries):
         if start_time.date() == datetime(2023, 9, 17).date():
             temperature = round(np.random.normal(70, 5), 1)  # Higher than normal
 
-        data.append([i, process, start_time, end_time, temperature, pressure, flow_rate])
-
-    return data
+        yield [i, process, start_time, end_time, temperature, pressure, flow_rate]
 
 def generate_production_data(num_entries):
     random.seed(SEED)
     products = ["Whole Milk", "Skim Milk", "2% Milk", "Heavy Cream"]
 
-    data = []
     for i in range(1, num_entries + 1):
         product = random.choice(products)
         production_date = random_date().date()
@@ -79,14 +121,11 @@ def generate_production_data(num_entries):
             else:
                 quantity = round(random.uniform(1000, 6000), 2)
 
-        data.append([i, product, batch_number, quantity, "Liters", production_date])
-
-    return data
+        yield [i, product, batch_number, quantity, "Liters", production_date]
 
 def generate_quality_data(num_entries):
     random.seed(SEED)
     np.random.seed(SEED)
-    data = []
     for i in range(1, num_entries + 1):
         test_date = random_date()
         # Ensure batch number matches process data
@@ -120,13 +159,10 @@ def generate_quality_data(num_entries):
 
         pH_level = round(np.random.normal(6.7, 0.1), 1)
 
-        data.append([i, batch_number, fat_content, protein_content, bacteria_count, pH_level, test_date])
-
-    return data
+        yield [i, batch_number, fat_content, protein_content, bacteria_count, pH_level, test_date]
 
 def generate_sop_data(num_entries):
     random.seed(SEED)
-    data = []
 
     for i in range(1, num_entries + 1):
         row = random.choice(sop_random_data)
@@ -139,15 +175,12 @@ def generate_sop_data(num_entries):
         spec_limits = row["spec_limits"]
         guidelines = row["process_guidelines"]
 
-        data.append([i, procedure, description, version, last_updated, spec_limits, guidelines])
-
-    return data
+        yield [i, procedure, description, version, last_updated, spec_limits, guidelines]
 
 def generate_shift_process_logs(num_entries):
     random.seed(SEED)
     operators = ["John Doe", "Jane Smith", "Mike Johnson", "Sarah Brown"]
 
-    data = []
     id = 0
     for i in range(1, num_entries + 1):
         shift_date = random_date().date()
@@ -169,17 +202,14 @@ def generate_shift_process_logs(num_entries):
 
         # Allow multiple entries within a shift
         for _ in range(random.randint(1, 3)):
-            data.append([id, shift_date, shift_number, operator, log_entry])
+            yield [id, shift_date, shift_number, operator, log_entry]
             id += 1
 
-    return data
-
 def generate_reports(num_entries):
     random.seed(SEED)
     np.random.seed(SEED)
     report_types = ["Weekly", "Monthly"]
 
-    data = []
     for i in range(1, num_entries + 1):
         report_type = random.choice(report_types)
         if report_type == "Weekly":
@@ -209,16 +239,13 @@ def generate_reports(num_entries):
                        f"Mean process: {mean_process}, Std Dev: {std_dev_process}. "
                        f"Raw milk volume: {raw_milk_volume} liters.")
 
-        data.append([i, report_type, start, end, content])
-
-    return data
+        yield [i, report_type, start, end, content]
 
 def generate_nonconformity_records(num_entries):
     random.seed(SEED)
     np.random.seed(SEED)
     severities = ["Low", "Medium", "High"]
 
-    data = []
     for i in range(1, num_entries + 1):
         row = random.choice(nonconformities_random_data)
         deviation_date = random_date()
@@ -238,9 +265,7 @@ def generate_nonconformity_records(num_entries):
             severity = "Medium"
             action_taken = "Investigated source; sanitized equipment."
 
-        data.append([i, deviation_date, description, severity, action_taken, resolved_date])
-
-    return data
+        yield [i, deviation_date, description, severity, action_taken, resolved_date]
 
 def generate_raw_material_inputs(num_entries):
     random.seed(SEED)
@@ -276,7 +301,6 @@ def generate_raw_material_inputs(num_entries):
         "Low fat content detected."
     ]
 
-    data = []
     for i in range(1, num_entries + 1):
         arrival_date = random_date()
         supplier_name = random.choice(suppliers)
@@ -297,111 +321,277 @@ def generate_raw_material_inputs(num_entries):
         # Map material ID to batch numbers
         material_id_batch_map[i] = f"B{arrival_date.strftime('%Y%m%d')}-{i:03d}"
 
-        data.append([i, arrival_date, supplier_name, material_type, quantity, "Liters", quality_check, remark])
+        yield [i, arrival_date, supplier_name, material_type, quantity, "Liters", quality_check, remark]
 
     # Update batch_numbers for poor quality batches
     for material_id in poor_quality_batches:
         batch_number = material_id_batch_map[material_id]
         batches_from_poor_quality_material.append(batch_number)
 
-    return data
+# Tables with Golden Run 5 history rows
+HISTORICAL_TABLES = ["processdata", "nonconformityrecords", "qualitydata"]
+
+def historical_ids(sizes):
+    # The historical records keep their well-known id 9999 unless a large scale
+    # factor already generates that id, then they follow the generated rows.
+    return {table_name: max(HISTORICAL_ID, sizes[table_name] + 1) for table_name in HISTORICAL_TABLES}
 
-def generate_historical_data():
+def generate_historical_data(sink, sizes, telemetry_interval=None):
     # Golden Run 5: Historical Pattern Recognition for Quality Variations
+    historical_id = historical_ids(sizes).get
 
     # Historical Process Data
     process_data = [
         [
-            9999, "Pasteurization", datetime(2023, 6, 15, 14, 0), datetime(2023, 6, 15, 16, 0),
+            historical_id("processdata"), "Pasteurization", datetime(2023, 6, 15, 14, 0), datetime(2023, 6, 15, 16, 0),
             70.0, 160.0, 900.0
         ]
     ]
-    write_sql("processdata", ["process_id", "process_name", "start_time", "end_time", "temperature", "pressure", "flow_rate"], process_data)
+    write_table(sink, "processdata", process_data)
+    if telemetry_interval:
+        process_columns = dict(zip(columnar.TABLE_COLUMNS["processdata"], map(np.array, zip(*process_data))))
+        write_telemetry(sink, process_columns, telemetry_interval)
 
     # Historical Non-Conformity Records
     nonconformity_data = [
         [
-            9999, datetime(2023, 6, 15), "Temperature deviation causing quality issues.", "High",
-            "Adjusted temperature controls; retrained staff.", datetime(2023, 6, 16)
+            historical_id("nonconformityrecords"), datetime(2023, 6, 15), "Temperature deviation causing quality issues.",
+            "High", "Adjusted temperature controls; retrained staff.", datetime(2023, 6, 16)
         ]
     ]
-    write_sql("nonconformityrecords", ["record_id", "deviation_date", "description", "severity", "action_taken", "resolved_date"], nonconformity_data)
+    write_table(sink, "nonconformityrecords", nonconformity_data)
 
     # Historical Quality Data
     quality_data = [
         [
-            9999, "B20230615-999", 4.5, 3.5, 100000, 6.8, datetime(2023, 6, 15, 15, 0)
+            historical_id("qualitydata"), "B20230615-999", 4.5, 3.5, 100000, 6.8, datetime(2023, 6, 15, 15, 0)
         ]
     ]
-    write_sql("qualitydata", ["quality_id", "batch_number", "fat_content", "protein_content", "bacteria_count", "pH_level", "test_date"], quality_data)
+    write_table(sink, "qualitydata", quality_data)
 
     # Add to batch_numbers for consistency
     batch_numbers.append("B20230615-999")
 
-def write_sql(table_name, columns, data):
-    with open(FILE_NAME, 'a', newline='') as file:
-        value = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES \n"
-        for row in data:
-            value += "("
-            for col in row:
-                if isinstance(col, int) or isinstance(col, float):
-                    value += str(col)
-                elif isinstance(col, datetime):
-                    value += f"'{col.strftime('%Y-%m-%d %H:%M:%S')}'"
-                elif isinstance(col, timedelta):
-                    value += f"'{str(col)}'"
-                else:
-                    value += f"'{col}'"
-                value += ", "
-            value = value[:-2]
-            value += "),\n"
-        value = value[:-2] + ";"
-        file.write(value + "\n\n")
-
-# Number of entries for each table
+def write_table(sink, table_name, data):
+    # Column layout is shared with the columnar generator, see columnar.TABLE_COLUMNS
+    sink.write_table(table_name, columnar.TABLE_COLUMNS[table_name], data)
+
+def write_telemetry(sink, process_columns, interval, seed=SEED):
+    for columns in telemetry.expand(process_columns, seed, interval):
+        sink.write_columns(telemetry.TABLE, columns)
+
+# Number of entries for each table at scale factor 1
 num_entries = 500
 num_entries_sop = 20
 num_entries_non_conformities = 50
 num_entries_raw_material_input = 60
-
-# Remove existing SQL file if it exists
-if os.path.exists(FILE_NAME):
-    os.remove(FILE_NAME)
-
-# Generate and write data for each table
-write_sql("processdata",
-          ["process_id", "process_name", "start_time", "end_time", "temperature", "pressure", "flow_rate"],
-          generate_process_data(num_entries))
-
-write_sql("productiondata",
-          ["production_id", "product_name", "batch_number", "quantity", "unit", "production_date"],
-          generate_production_data(num_entries))
-
-write_sql("qualitydata",
-          ["quality_id", "batch_number", "fat_content", "protein_content", "bacteria_count", "pH_level", "test_date"],
-          generate_quality_data(num_entries))
-
-write_sql("sop_data",
-          ["sop_id", "procedure_name", "description", "version", "last_updated", "spec_limits", "process_guidelines"],
-          generate_sop_data(num_entries_sop))
-
-write_sql("shiftprocesslogs",
-          ["log_id", "shift_date", "shift_number", "operator_name", "log_entry"],
-          generate_shift_process_logs(num_entries))
-
-write_sql("reports",
-          ["report_id", "report_type", "start_date", "end_date", "report_content"],
-          generate_reports(num_entries))
-
-write_sql("nonconformityrecords",
-          ["record_id", "deviation_date", "description", "severity", "action_taken", "resolved_date"],
-          generate_nonconformity_records(num_entries_non_conformities))
-
-write_sql("rawmaterialinput",
-          ["material_id", "arrival_date", "supplier_name", "material_type", "quantity", "unit", "quality_check", "remarks"],
-          generate_raw_material_inputs(num_entries_raw_material_input))
-
-# Generate historical data for Golden Run 5
-generate_historical_data()
-
-print("Data generation complete. SQL statements written to insert.sql.")
+HISTORICAL_ID = 9999
+
+def scaled_sizes(scale_factor=1.0):
+    # TPC-style scale factor: every table grows in proportion, keeping at least one row
+    return {table_name: max(1, round(size * scale_factor))
+            for table_name, size in columnar.table_sizes(num_entries, num_entries_sop, num_entries_non_conformities,
+                                                         num_entries_raw_material_input).items()}
+
+def generate_rows(sink, sizes):
+    # Generate and write data for each table
+    write_table(sink, "processdata", generate_process_data(sizes["processdata"]))
+
+    write_table(sink, "productiondata", generate_production_data(sizes["productiondata"]))
+
+    write_table(sink, "qualitydata", generate_quality_data(sizes["qualitydata"]))
+
+    write_table(sink, "sop_data", generate_sop_data(sizes["sop_data"]))
+
+    write_table(sink, "shiftprocesslogs", generate_shift_process_logs(sizes["shiftprocesslogs"]))
+
+    write_table(sink, "reports", generate_reports(sizes["reports"]))
+
+    write_table(sink, "nonconformityrecords", generate_nonconformity_records(sizes["nonconformityrecords"]))
+
+    write_table(sink, "rawmaterialinput", generate_raw_material_inputs(sizes["rawmaterialinput"]))
+
+def generate_columns(sink, sizes, workers=1, chunk_size=columnar.CHUNK_SIZE, scenario_set=None, state_file=None,
+                     time_ordered=False, telemetry_interval=None, lookups=None):
+    # Returns (generated, state): generated is False when an incremental run
+    # (state_file set) found no new days to append, state the updated incremental
+    # state, None without state_file. The caller saves the state once the output
+    # is complete, see main().
+    # With telemetry_interval, every processdata chunk is followed by its runs' telemetry.
+    # lookups (normalized profile) continue from the ids of the previous run.
+    state = incremental.load_state(state_file) if state_file else None
+    first_run = state is None
+    if first_run:
+        start = START_DATE
+        state = incremental.new_state(SEED, START_DATE, END_DATE, sizes)
+    else:
+        delta = incremental.plan_delta(state, END_DATE)
+        if delta is None:
+            return False, None
+        start, sizes = delta
+        if lookups is not None and "lookups" in state:
+            lookups.restore(state["lookups"])
+    for table_name, columns in columnar.generate_chunks(state["seed"], start, END_DATE, sizes, workers, chunk_size,
+                                                        scenario_set, state["next_ids"], state["run"], time_ordered):
+        incremental.record_chunk(state, table_name, columns)
+        sink.write_columns(table_name, columns)
+        if telemetry_interval and table_name == "processdata":
+            write_telemetry(sink, columns, telemetry_interval, state["seed"])
+    if not state_file:
+        return True, None
+    if first_run:
+        # generate() follows a first run with the history rows, see generate_historical_data
+        incremental.reserve_ids(state, historical_ids(sizes))
+    if lookups is not None:
+        state["lookups"] = lookups.state()
+    incremental.record_run(state, END_DATE, sizes)
+    return True, state
+
+def generate(sink, sizes, mode="rows", workers=1, chunk_size=columnar.CHUNK_SIZE, scenario_set=None, state_file=None,
+             profile="default", telemetry_interval=None):
+    # Writes the whole dataset to sink; with state_file only the days since the
+    # last run are appended (columnar mode). Returns (generated, state) like
+    # generate_columns: generated is False when there was nothing to append, and
+    # state (with state_file) is to be saved only after the sink closed cleanly.
+    # The "performance" profile targets setup_tables_performance.sql: SQL outputs
+    # start with the monthly partitions of the generated range (the other formats
+    # get none, their rows land in the DEFAULT partitions), and columnar mode
+    # writes rows month by month in time order. The "normalized" profile targets
+    # setup_tables_normalized.sql: lookup rows and keyed rows (see normalized.py).
+    # telemetry_interval adds the processtelemetry table (columnar mode, see telemetry.py).
+    if telemetry_interval and mode != "columnar":
+        raise ValueError("Telemetry is only generated in columnar mode")
+    appending = state_file is not None and incremental.load_state(state_file) is not None
+    lookups = None
+    if profile == "performance":
+        for statement in schema.partition_statements(START_DATE, END_DATE):
+            sink.write_sql(statement)
+    elif profile == "normalized":
+        lookups = normalized.Lookups()
+        sink = normalized.NormalizedSink(sink, lookups)
+    state = None
+    if mode == "columnar":
+        generated, state = generate_columns(sink, sizes, workers, chunk_size, scenario_set, state_file,
+                                            time_ordered=profile == "performance",
+                                            telemetry_interval=telemetry_interval, lookups=lookups)
+        if not generated:
+            return False, None
+    elif mode == "rows":
+        generate_rows(sink, sizes)
+    else:
+        raise ValueError(f"Unknown mode '{mode}', expected 'rows' or 'columnar'")
+
+    # Generate historical data for Golden Run 5, appended runs already have it
+    if not appending:
+        generate_historical_data(sink, sizes, telemetry_interval)
+    return True, state
+
+def parse_args(argv=None):
+    # Every option defaults to its environment variable, so existing invocations keep working
+    parser = argparse.ArgumentParser(description="Generate the dairy production dataset.")
+    parser.add_argument("--scale-factor", type=float, default=float(os.getenv("SCALE_FACTOR", "1")),
+                        help="size of every table relative to the default dataset (500 processes at 1)")
+    parser.add_argument("--mode", choices=["rows", "columnar"], default=MODE)
+    parser.add_argument("--format", dest="output_format", choices=list(sinks.SINKS), default=OUTPUT_FORMAT)
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    parser.add_argument("--insert-chunk-size", type=int, default=INSERT_CHUNK_SIZE,
+                        help="rows per INSERT statement (sql format)")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="worker processes (columnar mode)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE,
+                        help="rows per independently seeded chunk (columnar mode)")
+    parser.add_argument("--scenario-file", default=SCENARIO_FILE,
+                        help="JSON list of anomaly scenarios (columnar mode), defaults to the Golden Runs")
+    parser.add_argument("--incremental", action="store_true", default=INCREMENTAL,
+                        help="append the days since the last run recorded in --state-file (columnar mode)")
+    parser.add_argument("--state-file", default=STATE_FILE)
+    parser.add_argument("--profile", choices=["default", "performance", "normalized"],
+                        default=os.getenv("SCHEMA_PROFILE", "default"),
+                        help="'performance' matches setup_tables_performance.sql (monthly partitions in the sql and "
+                             "copy formats only, time ordered rows), 'normalized' setup_tables_normalized.sql (lookup tables, sql and copy formats)")
+    parser.add_argument("--telemetry", action="store_true", default=TELEMETRY,
+                        help="also write per-sample sensor telemetry of every process run (columnar mode)")
+    parser.add_argument("--sample-interval", type=int, default=SAMPLE_INTERVAL,
+                        help="seconds between telemetry samples")
+    parser.add_argument("--reference-date", default=REFERENCE_DATE, metavar="YYYY-MM-DD",
+                        help="last day of the generated window, defaults to today")
+    parser.add_argument("--cache", action="store_true", default=CACHE,
+                        help="reuse the output of an identical earlier build from --cache-dir")
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--cache-mode", choices=["link", "copy"], default=os.getenv("DATASET_CACHE_MODE", "link"),
+                        help="hard link cached files into --output-dir (copies across file systems) or copy them")
+    args = parser.parse_args(argv)
+    if args.scale_factor <= 0:
+        parser.error("--scale-factor must be positive")
+    if args.incremental and args.mode != "columnar":
+        parser.error("--incremental requires --mode columnar")
+    if args.telemetry and args.mode != "columnar":
+        parser.error("--telemetry requires --mode columnar")
+    if args.profile == "normalized" and args.output_format not in ("sql", "copy"):
+        parser.error("--profile normalized requires --format sql or copy")
+    if args.sample_interval <= 0:
+        parser.error("--sample-interval must be positive")
+    if args.reference_date:
+        try:
+            datetime.strptime(args.reference_date, "%Y-%m-%d")
+        except ValueError:
+            parser.error("--reference-date must be YYYY-MM-DD")
+    if args.cache and args.incremental:
+        parser.error("--cache cannot be combined with --incremental")
+    return args
+
+def open_sink(args, output_dir=None):
+    # Opening the sink replaces any output left over from a previous run
+    output_dir = args.output_dir if output_dir is None else output_dir
+    if args.output_format == "sql":
+        return sinks.SqlSink(output_dir, FILE_NAME, args.insert_chunk_size)
+    return sinks.open_sink(args.output_format, output_dir)
+
+def cache_inputs(args, sizes, scenario_set):
+    # Everything the output files depend on, apart from the generator code
+    # (dataset_cache adds that). Worker counts do not change the output.
+    return {
+        "seed": SEED,
+        "sizes": sizes,
+        "start": START_DATE.isoformat(),
+        "end": END_DATE.isoformat(),
+        "scenarios": scenario_set,
+        "mode": args.mode,
+        "format": args.output_format,
+        "insert_chunk_size": args.insert_chunk_size,
+        "chunk_size": args.chunk_size,
+        "profile": args.profile,
+        "sample_interval": args.sample_interval if args.telemetry else None,
+    }
+
+def main(argv=None):
+    args = parse_args(argv)
+    set_reference_date(args.reference_date)
+    sizes = scaled_sizes(args.scale_factor)
+    scenario_set = scenarios.load_scenarios(args.scenario_file)
+    options = (args.mode, args.workers, args.chunk_size, scenario_set, args.state_file if args.incremental else None,
+               args.profile, args.sample_interval if args.telemetry else None)
+    if args.cache:
+        inputs = cache_inputs(args, sizes, scenario_set)
+        key = dataset_cache.cache_key(inputs)
+        if dataset_cache.fetch(key, args.output_dir, args.cache_dir, args.cache_mode):
+            print(f"Reused cached dataset {key[:16]}. {args.output_format} output written to {args.output_dir}.")
+            return
+        with dataset_cache.build(key, inputs, args.cache_dir) as build_dir:
+            with open_sink(args, build_dir) as sink:
+                generated, state = generate(sink, sizes, *options)
+        dataset_cache.fetch(key, args.output_dir, args.cache_dir, args.cache_mode)
+    else:
+        with open_sink(args) as sink:
+            generated, state = generate(sink, sizes, *options)
+    # Saved only now that the output is complete and in place: a run that fails
+    # after generating leaves the previous state, so a retry generates the same days
+    if state is not None:
+        incremental.save_state(state, args.state_file)
+    if generated:
+        print(f"Data generation complete. {args.output_format} output written to {args.output_dir}.")
+    else:
+        print(f"No new days since the last run in {args.state_file}, nothing to append.")
+
+# The guard keeps worker processes started by the columnar mode from re-running the pipeline
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import json
+import os
+from datetime import datetime, timedelta
+import columnar
+
+# State of an incrementally grown columnar dataset, so later runs append only
+# the days since the previous run instead of regenerating everything.
+#
+# The state file records the seed, the run counter (each run draws from its own
+# RNG streams, see columnar.chunk_rng), the covered time window, the daily rate
+# of every table, how much of every table has been generated so far, and the
+# next primary key of every table. Delta sizes are derived from the rates and
+# the total window, so a dataset grown day by day ends up the same size as one
+# generated in a single run.
+
+STATE_FILE = "generate_state.json"
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+
+def load_state(path=STATE_FILE):
+    # None when there is no previous run to continue from
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        state = json.load(file)
+    state["start"] = datetime.strptime(state["start"], TIMESTAMP_FORMAT)
+    state["end"] = datetime.strptime(state["end"], TIMESTAMP_FORMAT)
+    return state
+
+
+def save_state(state, path=STATE_FILE):
+    # Written to a temporary file first so an interrupted run never leaves a
+    # truncated state file behind
+    data = dict(state, start=state["start"].strftime(TIMESTAMP_FORMAT), end=state["end"].strftime(TIMESTAMP_FORMAT))
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as file:
+        json.dump(data, file, indent=2)
+    os.replace(temp_path, path)
+
+
+def new_state(seed, start, end, sizes):
+    days = (end - start) / timedelta(days=1)
+    return {
+        "seed": seed,
+        "run": 0,
+        "start": start,
+        "end": end,
+        "daily_rates": {table_name: size / days for table_name, size in sizes.items()},
+        "generated": {table_name: 0 for table_name in sizes},
+        "next_ids": dict(columnar.FIRST_IDS),
+    }
+
+
+def plan_delta(state, end):
+    # Time window and table sizes of the next run up to end, None when there
+    # are no new days to generate. Shift log sizes count shifts, not log entries.
+    if end <= state["end"]:
+        return None
+    days = (end - state["start"]) / timedelta(days=1)
+    sizes = {table_name: max(round(rate * days) - state["generated"][table_name], 0)
+             for table_name, rate in state["daily_rates"].items()}
+    return state["end"] + timedelta(seconds=1), sizes
+
+
+def record_chunk(state, table_name, columns):
+    # Advance the next id of a table past a chunk about to be written; ids
+    # below it were written before, by this or an earlier run
+    ids = columns[columnar.TABLE_COLUMNS[table_name][0]]
+    if len(ids):
+        if int(ids.min()) < state["next_ids"][table_name]:
+            raise ValueError(f"{table_name} ids from {int(ids.min())} overlap ids already written "
+                             f"(next free id {state['next_ids'][table_name]})")
+        state["next_ids"][table_name] = int(ids.max()) + 1
+
+
+def reserve_ids(state, ids):
+    # ids: {table: id} of rows written outside the generated chunks (the Golden
+    # Run 5 history), which later runs must not hand out again
+    for table_name, row_id in ids.items():
+        state["next_ids"][table_name] = max(state["next_ids"][table_name], row_id + 1)
+
+
+def record_run(state, end, sizes):
+    state["run"] += 1
+    state["end"] = end
+    for table_name, size in sizes.items():
+        state["generated"][table_name] += size
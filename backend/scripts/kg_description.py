@@ -0,0 +1,191 @@
+import hashlib
+import json
+import os
+from dataclasses import asdict, dataclass, field
+
+# Typed model of a knowledge graph description file (baseline-kg-description.txt):
+#
+#   Entity: ProcessData
+#   Attributes:
+#   - process_id (int, Primary Key)
+#   - process_name (varchar)
+#
+#   Relationship: ProcessData PRODUCES ProductionData
+#   Description: Each process recorded in ProcessData results in ...
+#
+# The file is parsed line by line in a single pass. Every problem is reported
+# with its line number. Parsed schemas are cached as JSON keyed by the file's
+# content hash, so loading an unchanged description is a single json.load.
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".schema_cache")
+# Bumped whenever the model changes, so stale cache files are not read back
+CACHE_VERSION = 1
+
+
+@dataclass
+class Attribute:
+    name: str
+    data_type: str
+    # Everything after the type inside the parentheses, e.g. ["Primary Key"]
+    modifiers: list = field(default_factory=list)
+    line: int = 0
+
+    @property
+    def primary_key(self):
+        return "Primary Key" in self.modifiers
+
+    @property
+    def declaration(self):
+        # The text between the parentheses, as written in the file
+        return ", ".join([self.data_type, *self.modifiers])
+
+
+@dataclass
+class Entity:
+    name: str
+    attributes: list = field(default_factory=list)
+    line: int = 0
+
+    @property
+    def primary_key(self):
+        return next((attr.name for attr in self.attributes if attr.primary_key), None)
+
+
+@dataclass
+class Relationship:
+    from_entity: str
+    rel_type: str
+    to_entity: str
+    description: str = ""
+    line: int = 0
+
+
+@dataclass
+class Schema:
+    entities: list = field(default_factory=list)
+    relationships: list = field(default_factory=list)
+    content_hash: str = ""
+
+    def entity(self, name):
+        return next((entity for entity in self.entities if entity.name == name), None)
+
+    def to_dict(self):
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            entities=[Entity(entity["name"], [Attribute(**attr) for attr in entity["attributes"]], entity["line"])
+                      for entity in data["entities"]],
+            relationships=[Relationship(**rel) for rel in data["relationships"]],
+            content_hash=data["content_hash"],
+        )
+
+
+class DescriptionError(ValueError):
+    def __init__(self, path, line, message):
+        super().__init__(f"{path}:{line}: {message}")
+        self.path = path
+        self.line = line
+
+
+def parse_attribute(text, path, line):
+    # "- name (type, modifier, ...)"
+    body = text[1:].strip()
+    name, _, rest = body.partition("(")
+    name = name.strip()
+    if not rest.endswith(")") or not name.isidentifier() or " " in name:
+        raise DescriptionError(path, line, f"expected '- name (type)', got '{text}'")
+    parts = [part.strip() for part in rest[:-1].split(",")]
+    if not parts[0]:
+        raise DescriptionError(path, line, f"attribute '{name}' has no type")
+    return Attribute(name, parts[0], parts[1:], line)
+
+
+def parse(content, path="<description>"):
+    schema = Schema(content_hash=content_hash(content))
+    names = set()
+    entity = None
+    relationship = None
+    expect_attributes = False
+    for line, text in enumerate(content.splitlines(), 1):
+        text = text.strip()
+        if not text:
+            # A blank line ends the attribute list of an entity
+            if expect_attributes:
+                raise DescriptionError(path, line, f"entity '{entity.name}' has no 'Attributes:' line")
+            entity = None
+            continue
+        keyword, colon, value = text.partition(":")
+        value = value.strip()
+        if text.startswith("-"):
+            if entity is None or expect_attributes:
+                raise DescriptionError(path, line, "attribute outside of an entity's attribute list")
+            entity.attributes.append(parse_attribute(text, path, line))
+        elif relationship is not None and keyword != "Description":
+            raise DescriptionError(path, relationship.line, f"relationship '{relationship.from_entity} "
+                                                            f"{relationship.rel_type} {relationship.to_entity}' "
+                                                            "has no 'Description:' line")
+        elif colon and keyword == "Entity":
+            if not value.isidentifier():
+                raise DescriptionError(path, line, f"invalid entity name '{value}'")
+            if value in names:
+                raise DescriptionError(path, line, f"duplicate entity '{value}'")
+            names.add(value)
+            entity = Entity(value, line=line)
+            schema.entities.append(entity)
+            expect_attributes = True
+        elif colon and keyword == "Attributes" and expect_attributes and not value:
+            expect_attributes = False
+        elif colon and keyword == "Relationship":
+            words = value.split()
+            if len(words) != 3:
+                raise DescriptionError(path, line, f"expected 'Relationship: From TYPE To', got '{text}'")
+            relationship = Relationship(*words, line=line)
+            entity = None
+        elif colon and keyword == "Description" and relationship is not None:
+            relationship.description = value
+            schema.relationships.append(relationship)
+            relationship = None
+        else:
+            raise DescriptionError(path, line, f"unexpected line '{text}'")
+    if relationship is not None:
+        raise DescriptionError(path, relationship.line, "relationship has no 'Description:' line")
+    if expect_attributes:
+        raise DescriptionError(path, entity.line, f"entity '{entity.name}' has no 'Attributes:' line")
+
+    for rel in schema.relationships:
+        for name in (rel.from_entity, rel.to_entity):
+            if name not in names:
+                raise DescriptionError(path, rel.line, f"relationship refers to unknown entity '{name}'")
+    return schema
+
+
+def content_hash(content):
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def cache_path(path, digest, cache_dir=CACHE_DIR):
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(cache_dir, f"{name}.{digest[:16]}.json")
+
+
+def load(path, cache_dir=CACHE_DIR):
+    # Parsed schema of a description file, from the cache when the content is unchanged
+    with open(path, "r", encoding="utf-8") as file:
+        content = file.read()
+    digest = content_hash(content)
+    cached = cache_path(path, digest, cache_dir) if cache_dir else None
+    if cached and os.path.exists(cached):
+        with open(cached) as file:
+            data = json.load(file)
+        if data.get("version") == CACHE_VERSION and data.get("content_hash") == digest:
+            return Schema.from_dict(data)
+    schema = parse(content, path)
+    if cached:
+        os.makedirs(cache_dir, exist_ok=True)
+        temp_path = cached + ".tmp"
+        with open(temp_path, "w") as file:
+            json.dump(dict(schema.to_dict(), version=CACHE_VERSION), file)
+        os.replace(temp_path, cached)
+    return schema
@@ -0,0 +1,228 @@
+import numpy as np
+import columnar
+import scenarios
+
+# Random-access library API over the generated tables: any row or row range of
+# any table, generated on demand without the rows before it, e.g.
+#
+#   dataset = LazyDataset(start, end, sizes)         # sizes as generate_data.scaled_sizes()
+#   dataset["qualitydata"][123456]                   # one row, as a tuple
+#   dataset["qualitydata"].columns(10**6, 2 * 10**6) # a row range, as columnar columns
+#   for row in dataset["processdata"]: ...           # every row, lazily
+#
+# The columnar generators do the work, handed a RowRNG instead of a chunk's
+# np.random.Generator. Draw k of row r comes from the Philox counter block
+# (r, k) of the table's key, so a row's values depend on the seed, the table
+# and its index only: slices of any size and order give the same rows, and
+# shards (see shard()) can be generated on different machines without any
+# coordination. Importing the module reads no environment and writes nothing.
+#
+# The values follow the distributions of columnar.py but are not the same rows
+# as a chunked generate_data.py run, whose draws depend on the chunk layout.
+# Two differences make row access O(1):
+#   - every shift has exactly ENTRIES_PER_SHIFT shift log entries (the chunked
+#     generators draw 1 to 3), so entry i belongs to shift i // ENTRIES_PER_SHIFT
+#   - no time_ordered sorting and no Golden Run 5 history rows (HISTORICAL_ID)
+
+SEED = 42
+# Spawn key stream of the table keys, next to telemetry.STREAM
+STREAM = len(columnar.TABLE_COLUMNS) + 1
+# Philox4x64 turns one counter into 4 uint64 words, one per row
+ROWS_PER_BLOCK = 4
+# Third counter word: 0 for the generators' draws, 1 for scenario overrides
+OVERRIDE_SPACE = 1
+ENTRIES_PER_SHIFT = 2
+# productiondata and qualitydata look up the start days of the process batches
+# they pick, computed for BATCH_BLOCK processes at a time and kept
+BATCH_BLOCK = 4096
+
+
+def table_key(seed, table_name):
+    table_index = list(columnar.TABLE_COLUMNS).index(table_name)
+    return np.random.SeedSequence(seed, spawn_key=(STREAM, table_index)).generate_state(2, np.uint64)
+
+
+def row_uniforms(key, draw, start, stop, space=0):
+    # Uniform [0, 1) draw for rows start..stop-1, 53 bits each like Generator.random
+    first_block, skip = divmod(start, ROWS_PER_BLOCK)
+    bit_generator = np.random.Philox(key=key, counter=[first_block, draw, space, 0])
+    words = bit_generator.random_raw(stop - start + skip)[skip:]
+    return (words >> np.uint64(11)) * (1.0 / 2**53)
+
+
+class RowRNG:
+    # Stands in for the np.random.Generator of the columnar generators, for the
+    # rows start..stop-1 of one table. Every call is the next draw of all rows
+    # (the generators always draw for every row, in a fixed order), so call k
+    # reads counter blocks (row, k) whatever the rows around it.
+    def __init__(self, seed, table_name, start, stop):
+        self.key = table_key(seed, table_name)
+        self.table_name = table_name
+        self.start = start
+        self.stop = stop
+        self.draws = 0
+
+    def next_uniforms(self, size):
+        if size != self.stop - self.start:
+            raise ValueError(f"RowRNG draws for all {self.stop - self.start} rows at once, not {size}")
+        values = row_uniforms(self.key, self.draws, self.start, self.stop)
+        self.draws += 1
+        return values
+
+    def random(self, size):
+        return self.next_uniforms(size)
+
+    def integers(self, low, high, size):
+        return low + np.floor(self.next_uniforms(size) * (high - low)).astype(np.int64)
+
+    def uniform(self, low, high, size):
+        return low + (high - low) * self.next_uniforms(size)
+
+    def normal(self, loc, scale, size):
+        return loc + scale * box_muller(self.next_uniforms(size), self.next_uniforms(size))
+
+    def lognormal(self, mean, sigma, size):
+        return np.exp(self.normal(mean, sigma, size))
+
+    def row_values(self, column, kind, args, rows):
+        # Scenario override draws (see scenarios.override_columns) of the rows at
+        # positions rows, two per column in their own counter space
+        draw = 2 * columnar.TABLE_COLUMNS[self.table_name].index(column)
+        first = row_uniforms(self.key, draw, self.start, self.stop, OVERRIDE_SPACE)[rows]
+        if kind == "uniform":
+            return args[0] + (args[1] - args[0]) * first
+        second = row_uniforms(self.key, draw + 1, self.start, self.stop, OVERRIDE_SPACE)[rows]
+        return args[0] + args[1] * box_muller(first, second)
+
+
+def box_muller(first, second):
+    # Standard normal values from two uniform [0, 1) draws
+    return np.sqrt(-2 * np.log1p(-first)) * np.cos(2 * np.pi * second)
+
+
+class BatchDays:
+    # Start days (YYYYMMDD) of the process batches, indexable like the
+    # batch_days array of columnar.generate_chunks, but computed a block of
+    # processes at a time for the indexes asked for
+    def __init__(self, processes):
+        self.processes = processes
+        self.blocks = {}
+
+    def __len__(self):
+        return len(self.processes)
+
+    def block(self, block):
+        if block not in self.blocks:
+            start = block * BATCH_BLOCK
+            columns = self.processes.columns(start, min(start + BATCH_BLOCK, len(self.processes)))
+            self.blocks[block] = columnar.yyyymmdd(columns["start_time"]).astype(np.int32)
+        return self.blocks[block]
+
+    def __getitem__(self, index):
+        blocks, inverse = np.unique(np.asarray(index) // BATCH_BLOCK, return_inverse=True)
+        days = np.concatenate([self.block(block) for block in blocks.tolist()] or [np.empty(0, dtype=np.int32)])
+        # Every block but the last is full, so a block's days start at its rank * BATCH_BLOCK
+        return days[inverse.reshape(-1) * BATCH_BLOCK + np.asarray(index) % BATCH_BLOCK]
+
+
+class LazyTable:
+    def __init__(self, dataset, table_name):
+        self.dataset = dataset
+        self.table_name = table_name
+        self.size = dataset.sizes[table_name]
+        if table_name == "shiftprocesslogs":
+            self.size *= ENTRIES_PER_SHIFT
+
+    def __len__(self):
+        return self.size
+
+    def columns(self, start=0, stop=None):
+        # Columnar columns (as columnar.generate_chunks yields them, ready for
+        # any sink's write_columns) of rows start..stop-1, clamped like a slice
+        start, stop, _ = slice(start, stop).indices(self.size)
+        stop = max(start, stop)
+        if self.table_name == "shiftprocesslogs":
+            return self.shift_log_columns(start, stop)
+        dataset = self.dataset
+        first_id = columnar.FIRST_IDS[self.table_name]
+        rng = RowRNG(dataset.seed, self.table_name, start, stop)
+        return columnar.TABLE_GENERATORS[self.table_name](rng, first_id + start, stop - start, dataset.start,
+                                                          dataset.end, dataset.refs(self.table_name))
+
+    def shift_log_columns(self, start, stop):
+        first_shift = start // ENTRIES_PER_SHIFT
+        last_shift = -(-stop // ENTRIES_PER_SHIFT)
+        rng = RowRNG(self.dataset.seed, self.table_name, first_shift, last_shift)
+        shifts = columnar.generate_shift_columns(rng, last_shift - first_shift, self.dataset.start,
+                                                 self.dataset.end, self.dataset.refs(self.table_name))
+        offset = start - first_shift * ENTRIES_PER_SHIFT
+        columns = {"log_id": np.arange(start, stop) + columnar.FIRST_IDS[self.table_name]}
+        columns.update((column, values.repeat(ENTRIES_PER_SHIFT)[offset:offset + stop - start])
+                       for column, values in shifts.items())
+        return columns
+
+    def rows(self, start=0, stop=None, timestamp_separator=None):
+        # Plain Python rows (see columnar.iter_rows) of rows start..stop-1
+        return list(columnar.iter_rows(self.columns(start, stop), timestamp_separator=timestamp_separator))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            positions = range(*index.indices(self.size))
+            if not positions:
+                return []
+            first = min(positions)
+            rows = self.rows(first, max(positions) + 1)
+            return [rows[position - first] for position in positions]
+        position = index + self.size if index < 0 else index
+        if not 0 <= position < self.size:
+            raise IndexError(f"{self.table_name} row {index} out of range")
+        return self.rows(position, position + 1)[0]
+
+    def iter_columns(self, start=0, stop=None, chunk_size=columnar.ROW_CHUNK_SIZE):
+        start, stop, _ = slice(start, stop).indices(self.size)
+        for offset in range(start, stop, chunk_size):
+            yield self.columns(offset, min(offset + chunk_size, stop))
+
+    def __iter__(self):
+        for columns in self.iter_columns():
+            yield from columnar.iter_rows(columns)
+
+    def shard(self, shard, shards):
+        # Row range of shard number shard (0 based) out of shards equal parts
+        return shard * self.size // shards, (shard + 1) * self.size // shards
+
+
+class LazyDataset:
+    # All tables of one dataset: seed, date window [start, end] (datetimes),
+    # table sizes and scenarios, as for columnar.generate_chunks
+    def __init__(self, start, end, sizes, seed=SEED, scenario_set=None):
+        self.start = start
+        self.end = end
+        self.sizes = sizes
+        self.seed = seed
+        self.scenarios = scenarios.CompiledScenarios(scenarios.GOLDEN_RUNS if scenario_set is None else scenario_set)
+        self.tables = {table_name: LazyTable(self, table_name) for table_name in columnar.TABLE_COLUMNS}
+        self.batch_days = BatchDays(self.tables["processdata"])
+        self.linked = False
+
+    def __getitem__(self, table_name):
+        return self.tables[table_name]
+
+    def __iter__(self):
+        return iter(self.tables)
+
+    def link_batches(self):
+        # The batch scoped scenarios need every raw material delivery; rawmaterialinput
+        # is the smallest table, so it is generated whole, once
+        if not self.linked:
+            raw_material = self.tables["rawmaterialinput"].columns()
+            self.scenarios.link_batches(self.scenarios.linked_batch_keys(
+                scenarios.day_numbers(raw_material["arrival_date"]), columnar.material_batch_keys(raw_material)))
+            self.linked = True
+
+    def refs(self, table_name):
+        if table_name not in columnar.DEPENDENT_TABLES:
+            return {"scenarios": self.scenarios}
+        self.link_batches()
+        return {"scenarios": self.scenarios, "batch_days": self.batch_days,
+                "batch_first_id": columnar.FIRST_IDS["processdata"]}
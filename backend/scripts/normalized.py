@@ -0,0 +1,168 @@
+from itertools import islice
+import numpy as np
+import columnar
+import sinks
+
+# Normalized output profile (setup_tables_normalized.sql): low-cardinality text
+# columns are written as SMALLINT keys into lookup tables in the normalized
+# schema, and views under the original table names join the names back.
+#
+# NormalizedSink wraps the sql or copy sink. Every lookup value gets an id the
+# first time it is seen, and its lookup row is written ahead of the first rows
+# that refer to it. The known values of every column come first, so they have
+# the same ids in every dataset; incremental runs keep the ids in their state.
+
+SCHEMA = "normalized"
+
+# Lookup table of every encoded (table, column); units are shared
+LOOKUPS = {
+    ("processdata", "process_name"): "process_names",
+    ("productiondata", "product_name"): "product_names",
+    ("productiondata", "unit"): "units",
+    ("rawmaterialinput", "supplier_name"): "suppliers",
+    ("rawmaterialinput", "material_type"): "material_types",
+    ("rawmaterialinput", "unit"): "units",
+    ("rawmaterialinput", "quality_check"): "quality_checks",
+    ("shiftprocesslogs", "operator_name"): "operators",
+    ("shiftprocesslogs", "log_entry"): "log_entries",
+    ("nonconformityrecords", "severity"): "severities",
+    ("reports", "report_type"): "report_types",
+}
+
+VOCABULARIES = {
+    "process_names": columnar.PROCESSES,
+    "product_names": columnar.PRODUCTS,
+    "units": columnar.UNITS,
+    "suppliers": columnar.SUPPLIERS,
+    "material_types": columnar.MATERIAL_TYPES,
+    "quality_checks": columnar.QUALITY_CHECKS,
+    "operators": columnar.OPERATORS,
+    "log_entries": columnar.LOG_ENTRIES,
+    "severities": columnar.SEVERITIES,
+    "report_types": columnar.REPORT_TYPES,
+}
+
+# Largest SMALLINT
+MAX_ID = 32767
+ROW_CHUNK_SIZE = 10000
+
+
+def key_column(column):
+    return f"{column}_id"
+
+
+class Lookups:
+    # Values of every lookup table, id = position + 1, and how many of them
+    # have been written
+    def __init__(self):
+        self.values = {lookup: [] for lookup in VOCABULARIES}
+        self.ids = {lookup: {} for lookup in VOCABULARIES}
+        self.written = dict.fromkeys(VOCABULARIES, 0)
+        for lookup, values in VOCABULARIES.items():
+            for value in values.tolist():
+                self.add(lookup, value)
+
+    def add(self, lookup, value):
+        values = self.values[lookup]
+        if len(values) == MAX_ID:
+            raise ValueError(f"Lookup table {lookup} has no SMALLINT id left for '{value}'")
+        values.append(value)
+        self.ids[lookup][value] = len(values)
+        return len(values)
+
+    def id(self, lookup, value):
+        if value is None:
+            return None
+        return self.ids[lookup].get(value) or self.add(lookup, value)
+
+    def encode(self, lookup, array):
+        # int16 ids of a columnar column, without touching the rows one by one.
+        # NULLs (None, e.g. set by a scenario override) stay None, in an object
+        # array the sinks write as NULL.
+        if isinstance(array, columnar.Dictionary):
+            distinct, codes = array.values, array.codes
+        else:
+            values = np.asarray(array, dtype=object)
+            missing = np.equal(values, None)
+            distinct, inverse = np.unique(values[~missing], return_inverse=True)
+            codes = np.full(len(values), len(distinct))
+            codes[~missing] = inverse.reshape(-1)
+            if missing.any():
+                distinct = np.append(distinct, None)
+        ids = [self.id(lookup, value) for value in distinct.tolist()]
+        if None in ids:
+            return np.array(ids, dtype=object)[codes]
+        return np.array(ids, dtype=np.int16)[codes]
+
+    def pending(self):
+        # (lookup, rows) of the values not written yet
+        for lookup, values in self.values.items():
+            if self.written[lookup] < len(values):
+                yield lookup, [(position + 1, value) for position, value in
+                               enumerate(values[self.written[lookup]:], self.written[lookup])]
+                self.written[lookup] = len(values)
+
+    def restore(self, state):
+        # Values an earlier run wrote (state()), with their ids; known values
+        # that are new since then are still pending
+        for lookup, values in state.items():
+            self.values[lookup] = list(values)
+            self.ids[lookup] = {value: position + 1 for position, value in enumerate(values)}
+            self.written[lookup] = len(values)
+        for lookup, values in VOCABULARIES.items():
+            for value in values.tolist():
+                self.id(lookup, value)
+
+    def state(self):
+        return {lookup: list(values) for lookup, values in self.values.items()}
+
+
+class NormalizedSink(sinks.Sink):
+    # Writes tables with lookup columns to the normalized schema, keyed, and
+    # passes every other table through to sink unchanged
+    def __init__(self, sink, lookups=None):
+        self.sink = sink
+        self.output_dir = sink.output_dir
+        self.lookups = lookups or Lookups()
+
+    def lookup_columns(self, table_name, columns):
+        return {column: LOOKUPS[table_name, column] for column in columns if (table_name, column) in LOOKUPS}
+
+    def write_lookups(self):
+        for lookup, rows in self.lookups.pending():
+            self.sink.write_table(f"{SCHEMA}.{lookup}", ["id", "name"], rows)
+
+    def write_table(self, table_name, columns, rows):
+        encoded = self.lookup_columns(table_name, columns)
+        if not encoded:
+            self.sink.write_table(table_name, columns, rows)
+            return
+        positions = [(position, encoded[column]) for position, column in enumerate(columns) if column in encoded]
+        names = [key_column(column) if column in encoded else column for column in columns]
+        rows = iter(rows)
+        while True:
+            chunk = [list(row) for row in islice(rows, ROW_CHUNK_SIZE)]
+            if not chunk:
+                break
+            for row in chunk:
+                for position, lookup in positions:
+                    row[position] = self.lookups.id(lookup, row[position])
+            self.write_lookups()
+            self.sink.write_table(f"{SCHEMA}.{table_name}", names, chunk)
+
+    def write_columns(self, table_name, columns):
+        encoded = self.lookup_columns(table_name, columns)
+        if not encoded:
+            self.sink.write_columns(table_name, columns)
+            return
+        columns = {key_column(column) if column in encoded else column:
+                   self.lookups.encode(encoded[column], values) if column in encoded else values
+                   for column, values in columns.items()}
+        self.write_lookups()
+        self.sink.write_columns(f"{SCHEMA}.{table_name}", columns)
+
+    def write_sql(self, statement):
+        self.sink.write_sql(statement)
+
+    def close(self, discard=False):
+        self.sink.close(discard)
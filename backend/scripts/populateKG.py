@@ -1,7 +1,10 @@
 from neo4j import GraphDatabase
+import argparse
 import re
 import os
 from dotenv import load_dotenv
+import kg_description
+import schema_snapshot
 
 load_dotenv()
 
@@ -15,77 +18,244 @@ neo4j_database = os.getenv("NEO4J_SOL1DATABASE")
 # Define the path to your description file
 description_file = 'baseline-kg-description.txt'
 
-# Read the file
-with open(description_file, 'r') as file:
-    content = file.read()
-
-# Define regex patterns to capture Entities and Relationships
-entity_pattern = r'Entity:\s*(\w+)\s*Attributes:\s*((?:-\s*\w+\s*\([^)]+\)\s*\n?)+)'
-relationship_pattern = r'Relationship:\s*(\w+)\s+(\w+)\s+(\w+)\s*Description:\s*(.+)'
-
-# Extract Entities
-entities = re.findall(entity_pattern, content, re.MULTILINE)
-
-# Extract Relationships
-relationships = re.findall(relationship_pattern, content, re.MULTILINE)
-
-# Debugging: Print the number of entities and relationships found
-print(f"Found {len(entities)} entities:")
-for entity in entities:
-    print(f"Entity: {entity[0]}")
-    print(f"Attributes:\n{entity[1]}")
-    print("----")
-
-print(f"\nFound {len(relationships)} relationships:")
-for rel in relationships:
-    print(f"Relationship Type: {rel[1]}, From: {rel[0]}, To: {rel[2]}, Description: {rel[3]}")
-    print("----")
-
-driver = GraphDatabase.driver(neo4j_uri, auth=(neo4j_user, neo4j_password), database=neo4j_database)
-
-def create_entity(tx, entity_name, attributes):
-    # Parse attributes into a list of dictionaries
-    attrs = []
-    for attr_line in attributes.strip().split('\n'):
-        match = re.match(r'-\s*(\w+)\s*\(([^)]+)\)', attr_line.strip())
-        if match:
-            attr_name, attr_type = match.groups()
-            attrs.append({'name': attr_name, 'data_type': attr_type})
-    
-    # Create the Entity node
-    tx.run("""
-        MERGE (e:Entity { name: $entity_name })
-        """, entity_name=entity_name)
-    
-    # Create Attribute nodes and relationships
-    for attr in attrs:
-        tx.run("""
-            MERGE (a:Attribute { name: $attr_name, data_type: $attr_type })
-            MERGE (e:Entity { name: $entity_name })
-            MERGE (e)-[:HAS_ATTRIBUTE]->(a)
-            """, entity_name=entity_name, attr_name=attr['name'], attr_type=attr['data_type'])
+def read_description(path=description_file):
+    # Typed schema model, see kg_description.py
+    return kg_description.load(path)
+
+# Rows per UNWIND statement
+BATCH_SIZE = 10000
+
+# Backing indexes for the MERGE lookups below; without them every MERGE scans the label
+CONSTRAINTS = [
+    "CREATE CONSTRAINT entity_name IF NOT EXISTS FOR (e:Entity) REQUIRE e.name IS UNIQUE",
+    "CREATE CONSTRAINT attribute_name_type IF NOT EXISTS FOR (a:Attribute) REQUIRE (a.name, a.data_type) IS UNIQUE",
+]
 
-def create_relationship(tx, rel_type, from_entity, to_entity, description):
+def relationship_type(rel_type):
     # Ensure relationship type is uppercase and underscores
-    rel_type_clean = re.sub(r'\s+', '_', rel_type.upper())
-    # Create Relationship between Entities with description
+    return re.sub(r'\s+', '_', rel_type.upper())
+
+def batches(rows, size=BATCH_SIZE):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+def create_entities(tx, rows):
+    tx.run("""
+        UNWIND $rows AS row
+        MERGE (e:Entity { name: row.name })
+        """, rows=rows)
+
+def create_attributes(tx, rows):
+    # Attribute nodes are shared by every entity with the same name and type
+    tx.run("""
+        UNWIND $rows AS row
+        MATCH (e:Entity { name: row.entity_name })
+        MERGE (a:Attribute { name: row.name, data_type: row.data_type })
+        MERGE (e)-[:HAS_ATTRIBUTE]->(a)
+        """, rows=rows)
+
+def create_relationships(tx, rel_type, rows):
+    # Relationship types cannot be parameters, so there is one statement per type
     tx.run(f"""
-        MATCH (a:Entity {{ name: $from_entity }}), (b:Entity {{ name: $to_entity }})
-        MERGE (a)-[:{rel_type_clean} {{ description: $description }}]->(b)
-        """, from_entity=from_entity, to_entity=to_entity, description=description)
-
-with driver.session() as session:
-    # Create Entities and Attributes
-    for entity in entities:
-        name, attrs = entity
-        print(f"Creating Entity: {name}")
-        session.execute_write(create_entity, name, attrs)
-    
-    # Create Relationships
-    for rel in relationships:
-        from_entity, rel_type, to_entity, description = rel
-        print(f"Creating Relationship: {from_entity} {rel_type} {to_entity}")
-        session.execute_write(create_relationship, rel_type, from_entity, to_entity, description)
-
-driver.close()
-print("Knowledge Graph population complete.")
+        UNWIND $rows AS row
+        MATCH (a:Entity {{ name: row.from_entity }}), (b:Entity {{ name: row.to_entity }})
+        MERGE (a)-[:{rel_type} {{ description: row.description }}]->(b)
+        """, rows=rows)
+
+def graph_rows(schema):
+    # Parameter rows of the described graph: entities, attributes and relationships by type
+    entity_rows = [{'name': entity.name} for entity in schema.entities]
+    attribute_rows = [{'name': attr.name, 'data_type': attr.declaration, 'entity_name': entity.name}
+                      for entity in schema.entities for attr in entity.attributes]
+    relationship_rows = {}
+    for rel in schema.relationships:
+        relationship_rows.setdefault(relationship_type(rel.rel_type), []).append(
+            {'from_entity': rel.from_entity, 'to_entity': rel.to_entity, 'description': rel.description})
+    return entity_rows, attribute_rows, relationship_rows
+
+def write_graph(tx, entity_rows, attribute_rows, relationship_rows):
+    for rows in batches(entity_rows):
+        create_entities(tx, rows)
+    for rows in batches(attribute_rows):
+        create_attributes(tx, rows)
+    for rel_type, rel_rows in relationship_rows.items():
+        for rows in batches(rel_rows):
+            create_relationships(tx, rel_type, rows)
+
+def populate(tx, schema):
+    # The whole graph in one transaction, a few UNWIND statements in total
+    write_graph(tx, *graph_rows(schema))
+
+def read_graph(tx):
+    # The schema graph currently stored, as the same rows graph_rows() produces
+    entity_rows, attribute_rows = [], []
+    for record in tx.run("""
+        MATCH (e:Entity)
+        OPTIONAL MATCH (e)-[:HAS_ATTRIBUTE]->(a:Attribute)
+        RETURN e.name AS name, collect({ name: a.name, data_type: a.data_type }) AS attributes
+        """):
+        entity_rows.append({'name': record['name']})
+        attribute_rows.extend(dict(attr, entity_name=record['name'])
+                              for attr in record['attributes'] if attr['name'] is not None)
+    relationship_rows = {}
+    for record in tx.run("""
+        MATCH (a:Entity)-[r]->(b:Entity)
+        RETURN a.name AS from_entity, type(r) AS rel_type, b.name AS to_entity, r.description AS description
+        """):
+        relationship_rows.setdefault(record['rel_type'], []).append(
+            {'from_entity': record['from_entity'], 'to_entity': record['to_entity'],
+             'description': record['description']})
+    return entity_rows, attribute_rows, relationship_rows
+
+def row_difference(rows, other):
+    # rows that are not in other, each row once
+    other = {tuple(sorted(row.items())) for row in other}
+    seen = set()
+    difference = []
+    for row in rows:
+        key = tuple(sorted(row.items()))
+        if key not in other and key not in seen:
+            seen.add(key)
+            difference.append(row)
+    return difference
+
+def diff_graph(current, desired):
+    # Creates and deletes that turn the current rows into the desired ones. A
+    # relationship is identified by its endpoints, type and description, so an
+    # edited description replaces the relationship.
+    current_entities, current_attributes, current_relationships = current
+    desired_entities, desired_attributes, desired_relationships = desired
+    rel_types = set(current_relationships) | set(desired_relationships)
+    return {
+        'create_entities': row_difference(desired_entities, current_entities),
+        'delete_entities': row_difference(current_entities, desired_entities),
+        'create_attributes': row_difference(desired_attributes, current_attributes),
+        'delete_attributes': row_difference(current_attributes, desired_attributes),
+        'create_relationships': {rel_type: rows for rel_type in rel_types
+                                 if (rows := row_difference(desired_relationships.get(rel_type, []),
+                                                            current_relationships.get(rel_type, [])))},
+        'delete_relationships': {rel_type: rows for rel_type in rel_types
+                                 if (rows := row_difference(current_relationships.get(rel_type, []),
+                                                            desired_relationships.get(rel_type, [])))},
+    }
+
+def apply_diff(tx, diff):
+    for rel_type, rel_rows in diff['delete_relationships'].items():
+        for rows in batches(rel_rows):
+            tx.run(f"""
+                UNWIND $rows AS row
+                MATCH (:Entity {{ name: row.from_entity }})-[r:{rel_type}]->(:Entity {{ name: row.to_entity }})
+                WHERE r.description = row.description OR (r.description IS NULL AND row.description IS NULL)
+                DELETE r
+                """, rows=rows)
+    for rows in batches(diff['delete_attributes']):
+        tx.run("""
+            UNWIND $rows AS row
+            MATCH (:Entity { name: row.entity_name })-[h:HAS_ATTRIBUTE]->(:Attribute { name: row.name, data_type: row.data_type })
+            DELETE h
+            """, rows=rows)
+    for rows in batches(diff['delete_entities']):
+        tx.run("""
+            UNWIND $rows AS row
+            MATCH (e:Entity { name: row.name })
+            DETACH DELETE e
+            """, rows=rows)
+    # Attribute nodes are shared, drop the ones no entity has any more
+    tx.run("""
+        MATCH (a:Attribute)
+        WHERE NOT (a)<-[:HAS_ATTRIBUTE]-()
+        DELETE a
+        """)
+    write_graph(tx, diff['create_entities'], diff['create_attributes'], diff['create_relationships'])
+
+def change_count(rows):
+    # Rows of one kind of change, relationship changes are grouped by type
+    return len(rows) if isinstance(rows, list) else sum(map(len, rows.values()))
+
+def diff_size(diff):
+    return sum(map(change_count, diff.values()))
+
+def sync(tx, schema):
+    # Reads the stored graph, then applies only the difference to the description
+    # file, all in one transaction. Returns the applied diff.
+    diff = diff_graph(read_graph(tx), graph_rows(schema))
+    if diff_size(diff):
+        apply_diff(tx, diff)
+    return diff
+
+def write_snapshot(schema, args):
+    stats = None
+    if not args.no_stats:
+        # Only snapshots with statistics need the database drivers (and numpy)
+        import build_rollups
+        connection = build_rollups.connect(args.engine, args.database or build_rollups.DATABASE, args.postgres_dsn)
+        try:
+            stats = schema_snapshot.database_stats(connection, schema)
+        finally:
+            connection.close()
+    data = schema_snapshot.snapshot(schema, stats)
+    paths = schema_snapshot.write(data, args.snapshot)
+    print(f"Schema snapshot {data['version']} written to {', '.join(paths)}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Populate the schema knowledge graph from the description file.")
+    parser.add_argument("--description", default=description_file)
+    parser.add_argument("--sync", action="store_true",
+                        help="apply only the changes since the last run, including removals")
+    parser.add_argument("--verbose", action="store_true", help="print every parsed entity and relationship")
+    parser.add_argument("--snapshot", nargs="?", const=schema_snapshot.SNAPSHOT_DIR, metavar="DIR",
+                        help="also write the schema snapshot the retrievers load at startup "
+                             f"(default directory {schema_snapshot.SNAPSHOT_DIR})")
+    parser.add_argument("--snapshot-only", action="store_true", help="write the snapshot without touching the graph")
+    parser.add_argument("--engine", choices=["postgres", "duckdb"], default="postgres",
+                        help="database the snapshot's table statistics are read from")
+    parser.add_argument("--database", help="DuckDB database file, defaults to build_rollups.DATABASE")
+    parser.add_argument("--postgres-dsn", help="libpq connection string, defaults to the DB_* variables")
+    parser.add_argument("--no-stats", action="store_true", help="snapshot the description only, without a database")
+    args = parser.parse_args(argv)
+    if args.snapshot_only and args.snapshot is None:
+        args.snapshot = schema_snapshot.SNAPSHOT_DIR
+
+    try:
+        schema = read_description(args.description)
+    except kg_description.DescriptionError as error:
+        raise SystemExit(f"Invalid description: {error}")
+
+    print(f"Found {len(schema.entities)} entities and {len(schema.relationships)} relationships")
+    if args.verbose:
+        for entity in schema.entities:
+            print(f"Entity: {entity.name}")
+            for attr in entity.attributes:
+                print(f"- {attr.name} ({attr.declaration})")
+            print("----")
+        for rel in schema.relationships:
+            print(f"Relationship Type: {rel.rel_type}, From: {rel.from_entity}, To: {rel.to_entity}, "
+                  f"Description: {rel.description}")
+            print("----")
+
+    if args.snapshot is not None:
+        write_snapshot(schema, args)
+    if args.snapshot_only:
+        return
+
+    driver = GraphDatabase.driver(neo4j_uri, auth=(neo4j_user, neo4j_password), database=neo4j_database)
+    with driver.session() as session:
+        # Schema changes cannot share a transaction with writes
+        for constraint in CONSTRAINTS:
+            session.run(constraint).consume()
+
+        if args.sync:
+            diff = session.execute_write(sync, schema)
+            for change, rows in diff.items():
+                if change_count(rows):
+                    print(f"{change.replace('_', ' ').capitalize()}: {change_count(rows)}")
+            if not diff_size(diff):
+                print("Knowledge Graph already up to date.")
+        else:
+            session.execute_write(populate, schema)
+
+    driver.close()
+    print("Knowledge Graph population complete.")
+
+if __name__ == "__main__":
+    main()
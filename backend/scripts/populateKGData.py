@@ -0,0 +1,208 @@
+from neo4j import GraphDatabase
+import argparse
+import csv
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from dotenv import load_dotenv
+import populateKG
+import sinks
+
+# Instance level knowledge graph: one node per CSV row (kg_and_csv layout, or
+# the csv output of generate_data.py) labelled with its entity from
+# baseline-kg-description.txt, plus edges for the relationships declared there.
+#
+# Rows are streamed in chunks and written with UNWIND from several concurrent
+# sessions; nodes of every entity first, then the edges, which are matched on
+# batch numbers and dates through the indexes created up front.
+
+load_dotenv()
+
+neo4j_user = os.getenv("NEO4J_USERNAME")
+neo4j_password = os.getenv("NEO4J_PASSWORD")
+neo4j_uri = os.getenv("NEO4J_URI")
+neo4j_database = os.getenv("NEO4J_SOL2DATABASE", "sol2")
+
+CSV_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "kg_and_csv")
+CHUNK_SIZE = 10000
+SESSIONS = 4
+# Most rows of a report period linked to each report, see LIMITED_LINKS
+REPORT_LINKS = 100
+
+# Cypher conversion of CSV strings per description data type; anything else stays a string
+CONVERSIONS = {
+    "int": "toInteger",
+    "decimal": "toFloat",
+    "date": "datetime",
+    "timestamp": "datetime",
+}
+
+
+def day_range(source, target):
+    # target falls on the same day as source
+    return (f"{target} >= datetime.truncate('day', {source}) "
+            f"AND {target} < datetime.truncate('day', {source}) + duration('P1D')")
+
+
+def period(target):
+    # target falls inside the report period a.start_date .. a.end_date
+    return f"{target} >= a.start_date AND {target} < a.end_date + duration('P1D')"
+
+
+# Production batches are numbered B<process start date>-<process id, zero padded to 3>
+PROCESS_BATCH_NUMBER = ("'B' + replace(toString(date(a.start_time)), '-', '') + '-' + "
+                        "CASE WHEN a.process_id < 100 THEN right('00' + toString(a.process_id), 3) "
+                        "ELSE toString(a.process_id) END")
+
+# How the rows behind a declared relationship (from, type, to) are matched:
+# the indexed property of the target entity and the condition on a (from) and b (to)
+LINK_RULES = {
+    ("ShiftProcessLogs", "LINKS_TO", "ProcessData"): ("start_time", day_range("a.shift_date", "b.start_time")),
+    ("RawMaterialInput", "LINKS_TO", "ProcessData"): ("start_time", day_range("a.arrival_date", "b.start_time")),
+    ("ProcessData", "PRODUCES", "ProductionData"): ("batch_number", f"b.batch_number = {PROCESS_BATCH_NUMBER}"),
+    ("ProductionData", "LINKS_TO", "QualityData"): ("batch_number", "b.batch_number = a.batch_number"),
+    ("ProductionData", "AFFECTS", "NonConformityRecords"):
+        ("deviation_date", day_range("a.production_date", "b.deviation_date")),
+    ("Reports", "SUMMARIZES", "NonConformityRecords"): ("deviation_date", period("b.deviation_date")),
+    ("sop_data", "GUIDES", "ProcessData"): ("process_name", "b.process_name = split(a.procedure_name, ' ')[0]"),
+    ("Reports", "INCLUDES", "QualityData"): ("test_date", period("b.test_date")),
+}
+
+# Rules whose matches grow with the table sizes rather than staying per batch
+# or day: every report period (7 or 30 days) holds a share of all the rows, so
+# linking each report to all of them is a reports x rows cross product. These
+# link the first rows of the period in the order of the indexed key instead,
+# at most --report-links per report.
+LIMITED_LINKS = {
+    ("Reports", "SUMMARIZES", "NonConformityRecords"),
+    ("Reports", "INCLUDES", "QualityData"),
+}
+
+
+class Entity:
+    def __init__(self, entity, csv_dir):
+        self.name = entity.name
+        self.types = {attr.name: attr.data_type for attr in entity.attributes}
+        self.primary_key = entity.primary_key
+        self.path = os.path.join(csv_dir, sinks.CSV_FILE_NAMES.get(self.name.lower(), self.name.lower()) + ".csv")
+
+    def value(self, column, expression):
+        conversion = CONVERSIONS.get(self.types.get(column))
+        return f"{conversion}({expression})" if conversion else expression
+
+    def node_query(self, columns):
+        assignments = ", ".join(f"n.`{column}` = {self.value(column, f'row.`{column}`')}"
+                                for column in columns if column != self.primary_key)
+        key = self.value(self.primary_key, f"row.`{self.primary_key}`")
+        return (f"UNWIND $rows AS row MERGE (n:`{self.name}` {{ `{self.primary_key}`: {key} }}) "
+                + (f"SET {assignments}" if assignments else ""))
+
+    def rows(self, chunk_size):
+        # Chunks of CSV rows, empty fields as null
+        with open(self.path, newline="") as file:
+            reader = csv.DictReader(file)
+            while True:
+                chunk = [{column: value if value != "" else None for column, value in row.items()}
+                         for row in islice(reader, chunk_size)]
+                if not chunk:
+                    return
+                yield reader.fieldnames, chunk
+
+
+def edge_query(source, rel_type, target, key, condition, limit=None):
+    match = f"MATCH (b:`{target.name}`) WHERE {condition} "
+    if limit is not None:
+        # Per a, the first limit matches along the index on key
+        match = f"CALL {{ WITH a {match}RETURN b ORDER BY b.`{key}` LIMIT {int(limit)} }} "
+    return (f"UNWIND $ids AS id "
+            f"MATCH (a:`{source.name}` {{ `{source.primary_key}`: id }}) "
+            f"{match}"
+            f"MERGE (a)-[:{rel_type}]->(b)")
+
+
+def run_query(tx, query, **parameters):
+    tx.run(query, **parameters).consume()
+
+
+def run_chunks(driver, tasks, sessions):
+    # Each (query, parameters) task in its own session and write transaction;
+    # a bounded number in flight keeps memory flat for large files
+    def run(task):
+        query, parameters = task
+        with driver.session() as session:
+            session.execute_write(run_query, query, **parameters)
+        return len(next(iter(parameters.values())))
+
+    written = 0
+    with ThreadPoolExecutor(sessions) as executor:
+        pending = deque()
+        for task in tasks:
+            pending.append(executor.submit(run, task))
+            if len(pending) >= 2 * sessions:
+                written += pending.popleft().result()
+        while pending:
+            written += pending.popleft().result()
+    return written
+
+
+def node_tasks(entity, chunk_size):
+    for columns, rows in entity.rows(chunk_size):
+        yield entity.node_query(columns), {"rows": rows}
+
+
+def edge_tasks(source, rel_type, target, rule, limit, chunk_size):
+    query = edge_query(source, rel_type, target, *rule, limit=limit)
+    for _, rows in source.rows(chunk_size):
+        yield query, {"ids": [int(row[source.primary_key]) for row in rows]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load the CSV datasets into the knowledge graph.")
+    parser.add_argument("--csv-dir", default=CSV_DIR)
+    parser.add_argument("--description", default=populateKG.description_file)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--sessions", type=int, default=SESSIONS)
+    parser.add_argument("--report-links", type=int, default=REPORT_LINKS,
+                        help="most rows of its period linked to each report")
+    args = parser.parse_args(argv)
+
+    schema = populateKG.read_description(args.description)
+    entities = {entity.name: Entity(entity, args.csv_dir) for entity in schema.entities if entity.primary_key}
+    entities = {name: entity for name, entity in entities.items() if os.path.exists(entity.path)}
+
+    driver = GraphDatabase.driver(neo4j_uri, auth=(neo4j_user, neo4j_password), database=neo4j_database)
+    with driver.session() as session:
+        # Unique ids for the node MERGEs and indexes for the edge matches
+        for entity in entities.values():
+            session.run(f"CREATE CONSTRAINT `{entity.name}_{entity.primary_key}` IF NOT EXISTS "
+                        f"FOR (n:`{entity.name}`) REQUIRE n.`{entity.primary_key}` IS UNIQUE").consume()
+        for (_, _, target), (key, _) in LINK_RULES.items():
+            if target in entities:
+                session.run(f"CREATE INDEX `{target}_{key}` IF NOT EXISTS "
+                            f"FOR (n:`{target}`) ON (n.`{key}`)").consume()
+        session.run("CALL db.awaitIndexes()").consume()
+
+    for entity in entities.values():
+        written = run_chunks(driver, node_tasks(entity, args.chunk_size), args.sessions)
+        print(f"Loaded {written} {entity.name} nodes from {entity.path}")
+
+    for rel in schema.relationships:
+        from_entity, to_entity = rel.from_entity, rel.to_entity
+        rel_type = populateKG.relationship_type(rel.rel_type)
+        rule = LINK_RULES.get((from_entity, rel_type, to_entity))
+        if rule is None or from_entity not in entities or to_entity not in entities:
+            print(f"Skipping {from_entity} {rel_type} {to_entity}: no matching rule or data")
+            continue
+        source, target = entities[from_entity], entities[to_entity]
+        limit = args.report_links if (from_entity, rel_type, to_entity) in LIMITED_LINKS else None
+        run_chunks(driver, edge_tasks(source, rel_type, target, rule, limit, args.chunk_size), args.sessions)
+        print(f"Linked {from_entity} {rel_type} {to_entity}"
+              + (f", at most {limit} per {from_entity} row" if limit is not None else ""))
+
+    driver.close()
+    print("Knowledge Graph data load complete.")
+
+
+if __name__ == "__main__":
+    main()
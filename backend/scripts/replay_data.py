@@ -0,0 +1,203 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+import numpy as np
+import columnar
+import generate_data
+import schema
+
+# Replays generated plant traffic into PostgreSQL as a stream of inserts, in
+# timestamp order, to measure read/write contention while the chat backend
+# queries the same tables:
+#
+#   python replay_data.py --speed 3600 --duration 300   # one plant hour per second, for 5 minutes
+#   python replay_data.py --speed 0                     # as fast as possible
+#
+# Rows come from the columnar generator at --scale-factor. A producer releases
+# them on a virtual clock running --speed times real time and hands batches of
+# at most --batch-size rows per table to --connections workers, which insert
+# them over a pooled async connection set (psycopg 3 and psycopg_pool). Inserts
+# that cannot keep up show as schedule lag. Throughput, insert latency and lag
+# are printed and, with --output, written as JSON.
+#
+# Rows keep their generated ids, so replay into an empty schema: --setup runs
+# setup_tables.sql first.
+
+# Replayed tables, ordered on their first schema.SORT_COLUMNS column
+TABLES = ["processdata", "qualitydata", "shiftprocesslogs", "nonconformityrecords"]
+SPEED = 1.0
+BATCH_SIZE = 500
+CONNECTIONS = 4
+
+
+def replay_events(tables):
+    # (times, table positions, row positions) of all rows, in timestamp order;
+    # rows with the same timestamp keep their table and row order
+    times, table_positions, rows = [], [], []
+    for position, (table_name, columns) in enumerate(tables.items()):
+        table_times = columns[schema.SORT_COLUMNS[table_name][0]].astype("datetime64[s]").astype(np.int64)
+        times.append(table_times)
+        table_positions.append(np.full(len(table_times), position))
+        rows.append(np.arange(len(table_times)))
+    times, table_positions, rows = map(np.concatenate, (times, table_positions, rows))
+    order = np.lexsort((rows, table_positions, times))
+    return times[order], table_positions[order], rows[order]
+
+
+def insert_statement(table_name):
+    columns = columnar.TABLE_COLUMNS[table_name]
+    return f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+
+
+class Stats:
+    def __init__(self, table_names):
+        self.rows = dict.fromkeys(table_names, 0)
+        self.latencies = {table_name: [] for table_name in table_names}
+        self.lags = []
+
+    def record(self, table_name, num_rows, latency, lag):
+        self.rows[table_name] += num_rows
+        self.latencies[table_name].append(latency)
+        self.lags.append(lag)
+
+    def summary(self, elapsed):
+        def percentiles(values):
+            if not values:
+                return {}
+            p50, p95, p99 = np.percentile(np.array(values) * 1000, [50, 95, 99])
+            return {"p50_ms": p50, "p95_ms": p95, "p99_ms": p99, "max_ms": max(values) * 1000}
+
+        total = sum(self.rows.values())
+        return {
+            "rows": total,
+            "elapsed_seconds": elapsed,
+            "rows_per_second": total / elapsed if elapsed else 0.0,
+            "batches": len(self.lags),
+            "tables": {table_name: dict(rows=self.rows[table_name], batches=len(latencies),
+                                        insert_latency=percentiles(latencies))
+                       for table_name, latencies in self.latencies.items()},
+            "schedule_lag": percentiles(self.lags),
+        }
+
+
+async def produce(queue, tables, events, speed, batch_size, deadline):
+    # Releases the rows that are due on the virtual clock, a batch per table
+    times, table_positions, rows = events
+    table_names = list(tables)
+    started = time.perf_counter()
+    index = 0
+    while index < len(times) and time.perf_counter() < deadline:
+        if speed:
+            due = started + (times[index] - times[0]) / speed
+            await asyncio.sleep(max(due - time.perf_counter(), 0))
+            now = times[0] + (time.perf_counter() - started) * speed
+            end = max(int(np.searchsorted(times, now, side="right")), index + 1)
+        else:
+            end = len(times)
+        end = min(end, index + batch_size)
+        for position in np.unique(table_positions[index:end]):
+            table_name = table_names[position]
+            selected = rows[index:end][table_positions[index:end] == position]
+            columns = {column: values[selected] for column, values in tables[table_name].items()}
+            due = started + (times[index] - times[0]) / speed if speed else time.perf_counter()
+            await queue.put((table_name, list(columnar.iter_rows(columns)), due))
+        index = end
+
+
+async def consume(queue, pool, stats):
+    while True:
+        batch = await queue.get()
+        if batch is None:
+            return
+        table_name, rows, due = batch
+        started = time.perf_counter()
+        async with pool.connection() as connection:
+            async with connection.cursor() as cursor:
+                await cursor.executemany(insert_statement(table_name), rows)
+        stats.record(table_name, len(rows), time.perf_counter() - started, max(started - due, 0.0))
+
+
+async def replay(conninfo, tables, speed=SPEED, batch_size=BATCH_SIZE, connections=CONNECTIONS, duration=None,
+                 setup=False):
+    from psycopg_pool import AsyncConnectionPool
+    events = replay_events(tables)
+    stats = Stats(tables)
+    async with AsyncConnectionPool(conninfo, min_size=connections, max_size=connections, open=False) as pool:
+        if setup:
+            with open(schema.SETUP_TABLES) as file:
+                async with pool.connection() as connection:
+                    await connection.execute(file.read())
+        # A bounded queue keeps the producer at most a few batches ahead of the inserts
+        queue = asyncio.Queue(maxsize=2 * connections)
+        started = time.perf_counter()
+        deadline = started + duration if duration else float("inf")
+
+        async def feed():
+            await produce(queue, tables, events, speed, batch_size, deadline)
+            for _ in range(connections):
+                await queue.put(None)
+
+        # A failing insert cancels the rest instead of leaving the producer blocked on a full queue
+        tasks = [asyncio.create_task(feed())] + [asyncio.create_task(consume(queue, pool, stats))
+                                                 for _ in range(connections)]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+    return stats.summary(time.perf_counter() - started)
+
+
+def conninfo_from_env():
+    # The DB_* variables the backend connects with
+    from psycopg.conninfo import make_conninfo
+    settings = {"user": os.getenv("DB_USER"), "host": os.getenv("DB_HOST"), "dbname": os.getenv("DB_NAME"),
+                "password": os.getenv("DB_PASSWORD"), "port": os.getenv("DB_PORT")}
+    return make_conninfo(**{key: value for key, value in settings.items() if value})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay generated plant traffic into PostgreSQL.")
+    parser.add_argument("--scale-factor", type=float, default=1.0)
+    parser.add_argument("--tables", nargs="+", choices=list(columnar.TABLE_COLUMNS), default=TABLES)
+    parser.add_argument("--speed", type=float, default=SPEED,
+                        help="virtual seconds per wall clock second, 0 replays as fast as possible")
+    parser.add_argument("--duration", type=float, help="stop after this many seconds")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="most rows per insert batch")
+    parser.add_argument("--connections", type=int, default=CONNECTIONS)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="generator worker processes")
+    parser.add_argument("--postgres-dsn", help="libpq connection string, defaults to the DB_* variables")
+    parser.add_argument("--setup", action="store_true", help="recreate the tables with setup_tables.sql first")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args(argv)
+    if args.speed < 0:
+        parser.error("--speed must not be negative")
+
+    generated = columnar.generate_tables(generate_data.SEED, generate_data.START_DATE, generate_data.END_DATE,
+                                         generate_data.scaled_sizes(args.scale_factor), args.workers)
+    tables = {table_name: generated[table_name] for table_name in args.tables}
+    print(f"Replaying {sum(len(columns[columnar.TABLE_COLUMNS[table_name][0]]) for table_name, columns in tables.items())} "
+          f"rows at {'full speed' if not args.speed else f'{args.speed:g}x'} over {args.connections} connections.")
+    summary = asyncio.run(replay(args.postgres_dsn or conninfo_from_env(), tables, args.speed, args.batch_size,
+                                 args.connections, args.duration, args.setup))
+
+    print(f"Inserted {summary['rows']} rows in {summary['elapsed_seconds']:.1f}s "
+          f"({summary['rows_per_second']:.0f} rows/s, {summary['batches']} batches).")
+    for table_name, table in summary["tables"].items():
+        latency = table["insert_latency"]
+        if latency:
+            print(f"  {table_name:22} {table['rows']:8} rows  insert p50 {latency['p50_ms']:7.2f} ms "
+                  f"p95 {latency['p95_ms']:7.2f} ms p99 {latency['p99_ms']:7.2f} ms")
+    if summary["schedule_lag"]:
+        print(f"  schedule lag p95 {summary['schedule_lag']['p95_ms']:.1f} ms, max {summary['schedule_lag']['max_ms']:.1f} ms")
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(dict(summary, scale_factor=args.scale_factor, speed=args.speed, batch_size=args.batch_size,
+                           connections=args.connections), file, indent=2)
+        print(f"Results written to {args.output}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+import json
+import numpy as np
+
+# Declarative anomaly scenarios for the columnar generator.
+#
+# A scenario covers an inclusive date window and overrides columns of the rows
+# that fall into it, per table. Scenarios with "batch_overrides" additionally
+# link the batches made from the raw material delivered in the window, and
+# override productiondata/qualitydata rows for those batches regardless of date.
+#
+# Override values are either constants or [kind, *args]:
+#   ["normal", mean, std]    fresh draws from a normal distribution
+#   ["uniform", low, high]   fresh draws from a uniform distribution
+#   ["shift_log", message]   "<Morning|Afternoon|Night> shift: <message>" by shift_number
+#
+# Date scoped overrides are applied first, batch scoped ones last, each group in
+# declaration order, so a later scenario wins where several touch the same row.
+
+GOLDEN_RUNS = [
+    {
+        "name": "Golden Run 1: Capacity Utilization and Downtime Analysis",
+        "dates": ["2023-09-15", "2023-09-15"],
+        "overrides": {
+            "processdata": {"flow_rate": ["normal", 500, 50]},
+            "shiftprocesslogs": {"log_entry": ["shift_log", "Equipment malfunction observed; production halted for 2 hours."]},
+            "nonconformityrecords": {
+                "description": "Equipment failure leading to reduced capacity.",
+                "severity": "High",
+                "action_taken": "Maintenance performed; resumed normal operations.",
+            },
+            "rawmaterialinput": {"quality_check": "Failed", "remarks": "Delayed delivery due to transportation issues."},
+        },
+    },
+    {
+        "name": "Golden Run 2: Yield Analysis Based on Input and Output",
+        "dates": ["2023-09-16", "2023-09-16"],
+        "overrides": {
+            "rawmaterialinput": {"quality_check": "Failed", "remarks": "Low fat content detected."},
+        },
+        "batch_overrides": {
+            "productiondata": {"quantity": ["uniform", 500, 1000]},
+            "qualitydata": {"fat_content": ["normal", 2.0, 0.2], "protein_content": ["normal", 2.5, 0.2]},
+        },
+    },
+    {
+        "name": "Golden Run 3: Process Stability and Quality Specifications",
+        "dates": ["2023-09-17", "2023-09-17"],
+        "overrides": {
+            "processdata": {"temperature": ["normal", 70, 5]},
+            "qualitydata": {"fat_content": ["normal", 4.5, 0.5], "protein_content": ["normal", 3.2, 0.2]},
+        },
+    },
+    {
+        "name": "Golden Run 4: Shift Log Insights and Non-Conformities",
+        "dates": ["2023-09-18", "2023-09-18"],
+        "overrides": {
+            "qualitydata": {"bacteria_count": ["uniform", 200000, 500000]},
+            "shiftprocesslogs": {"log_entry": ["shift_log", "Unusual odor detected during processing; possible contamination."]},
+            "nonconformityrecords": {
+                "description": "Potential contamination detected.",
+                "severity": "Medium",
+                "action_taken": "Investigated source; sanitized equipment.",
+            },
+        },
+    },
+]
+
+SHIFT_NAMES = ["Morning", "Afternoon", "Night"]
+
+# Decimal places generated values are rounded to, matching the generators
+DECIMALS = {
+    "temperature": 1,
+    "pressure": 1,
+    "flow_rate": 1,
+    "fat_content": 1,
+    "protein_content": 1,
+    "pH_level": 1,
+    "quantity": 2,
+}
+
+
+def load_scenarios(path=None):
+    if path is None:
+        return GOLDEN_RUNS
+    with open(path) as file:
+        return json.load(file)
+
+
+def day_numbers(dates):
+    # Days since the epoch, the key of the date index
+    return np.asarray(dates).astype("datetime64[D]").astype(np.int64)
+
+
+class Index:
+    # Hash-style lookup from int64 keys (days or batch keys) to the scenarios
+    # that cover them: sorted unique keys plus a CSR list of scenario ids per key.
+    def __init__(self, keys, scenario_ids):
+        keys = np.asarray(keys, dtype=np.int64)
+        scenario_ids = np.asarray(scenario_ids, dtype=np.int64)
+        order = np.lexsort((scenario_ids, keys))
+        keys, scenario_ids = keys[order], scenario_ids[order]
+        self.keys, starts = np.unique(keys, return_index=True)
+        self.offsets = np.append(starts, len(keys))
+        self.scenario_ids = scenario_ids
+
+    def __len__(self):
+        return len(self.keys)
+
+    def lookup(self, values):
+        # {scenario id: row positions of values covered by it}
+        if len(self.keys) == 0 or len(values) == 0:
+            return {}
+        position = np.minimum(np.searchsorted(self.keys, values), len(self.keys) - 1)
+        rows = np.flatnonzero(self.keys[position] == values)
+        if len(rows) == 0:
+            return {}
+        # Group the matched rows by key, then pair every distinct key with the
+        # scenarios covering it, so the work is per distinct key, not per row
+        rows = rows[np.argsort(position[rows], kind="stable")]
+        keys, group_starts, group_sizes = np.unique(position[rows], return_index=True, return_counts=True)
+        pair_counts = self.offsets[keys + 1] - self.offsets[keys]
+        pair_groups = np.repeat(np.arange(len(keys)), pair_counts)
+        pair_scenarios = self.scenario_ids[ranges(self.offsets[keys], pair_counts)]
+        order = np.argsort(pair_scenarios, kind="stable")
+        pair_scenarios, pair_groups = pair_scenarios[order], pair_groups[order]
+        scenario_ids, firsts = np.unique(pair_scenarios, return_index=True)
+        return {int(scenario_id): rows[ranges(group_starts[groups], group_sizes[groups])]
+                for scenario_id, groups in zip(scenario_ids, np.split(pair_groups, firsts[1:]))}
+
+
+def ranges(starts, lengths):
+    # Concatenation of arange(start, start + length) for every start/length pair
+    offsets = np.cumsum(lengths) - lengths
+    return np.arange(lengths.sum()) + np.repeat(starts - offsets, lengths)
+
+
+class CompiledScenarios:
+    def __init__(self, scenarios):
+        self.scenarios = scenarios
+        self.date_index = {}
+        self.linking = []
+        date_keys = {}
+        for scenario_id, scenario in enumerate(scenarios):
+            first, last = day_numbers(scenario["dates"])
+            days = np.arange(first, last + 1)
+            for table_name in scenario.get("overrides", {}):
+                keys, ids = date_keys.setdefault(table_name, ([], []))
+                keys.append(days)
+                ids.append(np.full(len(days), scenario_id))
+            if scenario.get("batch_overrides"):
+                self.linking.append((scenario_id, first, last))
+        for table_name, (keys, ids) in date_keys.items():
+            self.date_index[table_name] = Index(np.concatenate(keys), np.concatenate(ids))
+        self.batch_index = {}
+
+    def link_batches(self, linked_batch_keys):
+        # linked_batch_keys: {scenario id: batch keys}, see linked_batch_keys()
+        keys, ids = {}, {}
+        for scenario_id, batch_keys in linked_batch_keys.items():
+            for table_name in self.scenarios[scenario_id]["batch_overrides"]:
+                keys.setdefault(table_name, []).append(batch_keys)
+                ids.setdefault(table_name, []).append(np.full(len(batch_keys), scenario_id))
+        self.batch_index = {table_name: Index(np.concatenate(keys[table_name]), np.concatenate(ids[table_name]))
+                            for table_name in keys}
+
+    def linked_batch_keys(self, arrival_days, batch_keys):
+        # Batches made from raw material delivered inside a linking scenario's window
+        return {scenario_id: batch_keys[(arrival_days >= first) & (arrival_days <= last)]
+                for scenario_id, first, last in self.linking}
+
+    def apply(self, table_name, columns, rng, dates, batch_keys=None):
+        # Masked in-place updates of columns; dates (and batch_keys) are per row
+        if table_name in self.date_index:
+            for scenario_id, rows in self.date_index[table_name].lookup(day_numbers(dates)).items():
+                override_columns(columns, self.scenarios[scenario_id]["overrides"][table_name], rows, rng)
+        if batch_keys is not None and table_name in self.batch_index:
+            for scenario_id, rows in self.batch_index[table_name].lookup(batch_keys).items():
+                override_columns(columns, self.scenarios[scenario_id]["batch_overrides"][table_name], rows, rng)
+
+
+def override_columns(columns, overrides, rows, rng):
+    for column, value in overrides.items():
+        target = columns[column]
+        if not isinstance(value, (list, tuple)):
+            target[rows] = value
+            continue
+        kind, *args = value
+        if kind == "shift_log":
+            entries = np.array([f"{shift} shift: {args[0]}" for shift in SHIFT_NAMES], dtype=object)
+            target[rows] = entries[columns["shift_number"][rows] - 1]
+            continue
+        if kind not in ("normal", "uniform"):
+            raise ValueError(f"Unknown override kind '{kind}' for column '{column}'")
+        if hasattr(rng, "row_values"):
+            # Per-row draws (lazy_tables.RowRNG): a row's value does not depend on
+            # which other rows are overridden with it
+            values = rng.row_values(column, kind, args, rows)
+        elif kind == "normal":
+            values = rng.normal(args[0], args[1], len(rows))
+        else:
+            values = rng.uniform(args[0], args[1], len(rows))
+        if np.issubdtype(target.dtype, np.integer):
+            target[rows] = values.astype(target.dtype)
+        else:
+            target[rows] = np.round(values, DECIMALS.get(column, 2))
@@ -0,0 +1,79 @@
+import os
+import re
+from datetime import datetime
+
+# Column types of the dataset, read from setup_tables.sql so loaders outside
+# PostgreSQL (DuckDB, Parquet, ...) use the same types instead of sniffing them.
+
+SETUP_TABLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "setup_tables.sql")
+# Optional tables the generator can write on request
+SETUP_TELEMETRY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "setup_telemetry.sql")
+
+# Time columns every table is sorted on when loaded into a columnar store, so
+# range scans over dates only touch a few row groups
+SORT_COLUMNS = {
+    "processdata": ["start_time"],
+    "productiondata": ["production_date"],
+    "qualitydata": ["test_date"],
+    "sop_data": ["last_updated"],
+    "shiftprocesslogs": ["shift_date", "shift_number"],
+    "reports": ["start_date"],
+    "nonconformityrecords": ["deviation_date"],
+    "rawmaterialinput": ["arrival_date"],
+    "processtelemetry": ["sample_time", "process_id"],
+}
+
+# Tables setup_tables_performance.sql partitions by month, and their partition column
+PARTITION_COLUMNS = {
+    "processdata": "start_time",
+    "qualitydata": "test_date",
+    "shiftprocesslogs": "shift_date",
+}
+
+# PostgreSQL types without a DuckDB equivalent
+DUCKDB_TYPES = {
+    "SERIAL": "INTEGER",
+}
+
+CREATE_TABLE = re.compile(r"CREATE TABLE (\w+) \((.*?)\);", re.DOTALL)
+COLUMN = re.compile(r"\s*(\w+)\s+([A-Z]+(?:\(\d+(?:,\d+)?\))?)")
+
+
+def load_schema(path=SETUP_TABLES):
+    # {table: [(column, type), ...]} in declaration order, constraints dropped
+    with open(path) as file:
+        sql = file.read()
+    tables = {}
+    for table_name, body in CREATE_TABLE.findall(sql):
+        tables[table_name] = [match.groups() for match in map(COLUMN.match, body.splitlines()) if match]
+    return tables
+
+
+def dataset_schema():
+    # Every table the generator can write, the optional ones included
+    return {**load_schema(), **load_schema(SETUP_TELEMETRY)}
+
+
+def duckdb_type(column_type):
+    return DUCKDB_TYPES.get(column_type, column_type)
+
+
+def month_starts(start, end):
+    # First day of every month overlapping [start, end], plus the first day after it
+    month = datetime(start.year, start.month, 1)
+    months = [month]
+    while month <= end:
+        month = datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+        months.append(month)
+    return months
+
+
+def partition_statements(start, end):
+    # Monthly partitions of the PARTITION_COLUMNS tables covering [start, end],
+    # through create_month_partition of setup_tables_performance.sql: rows of the
+    # month already in the DEFAULT partition (loaded without these statements)
+    # are moved into the new partition instead of failing the CREATE
+    months = month_starts(start, end)
+    return [f"SELECT create_month_partition('{table_name}', '{column}', "
+            f"'{lower:%Y-%m-%d}', '{upper:%Y-%m-%d}');"
+            for table_name, column in PARTITION_COLUMNS.items() for lower, upper in zip(months, months[1:])]
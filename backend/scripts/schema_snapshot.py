@@ -0,0 +1,191 @@
+import hashlib
+import json
+import os
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+# Versioned snapshot of the schema the retrievers prompt with, written by
+# populateKG.py --snapshot: the entities, attributes and relationships of the
+# description file plus per-table row counts and column statistics read from
+# the database. It is stored twice:
+#
+#   schema_snapshot.json   the full model, for programs
+#   schema_snapshot.txt    prompt-ready text, for the SQL generation prompt
+#
+# so the serving layer loads it once at startup instead of introspecting the
+# database on every question. The version is a hash of everything but the
+# generation time, so it only changes when the description or the data do.
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SNAPSHOT_DIR = os.path.join(BACKEND_DIR, "schema_snapshot")
+JSON_FILE = "schema_snapshot.json"
+TEXT_FILE = "schema_snapshot.txt"
+# Bumped whenever the snapshot layout changes
+FORMAT_VERSION = 1
+
+# Columns with at most this many distinct values, none longer than
+# MAX_VALUE_LENGTH, list them with their counts
+TOP_VALUES = 10
+MAX_VALUE_LENGTH = 40
+
+# information_schema data types (PostgreSQL and DuckDB spellings) with a
+# meaningful range; numeric ones also get a mean
+NUMERIC_TYPES = ("smallint", "integer", "bigint", "numeric", "decimal", "real", "double", "float", "hugeint")
+TIME_TYPES = ("date", "timestamp", "time")
+
+
+def quote(identifier):
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def json_value(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def column_kind(data_type):
+    data_type = data_type.lower()
+    if data_type.startswith(NUMERIC_TYPES):
+        return "numeric"
+    if data_type.startswith(TIME_TYPES):
+        return "time"
+    return "text"
+
+
+def table_columns(connection):
+    # {table: [(column, data type), ...]} of the current schema, in column order
+    cursor = connection.cursor()
+    cursor.execute("SELECT table_name, column_name, data_type FROM information_schema.columns "
+                   "WHERE table_schema = current_schema() ORDER BY table_name, ordinal_position")
+    tables = {}
+    for table_name, column_name, data_type in cursor.fetchall():
+        tables.setdefault(table_name, []).append((column_name, data_type))
+    return tables
+
+
+def table_stats(connection, table_name, columns, top_values=TOP_VALUES):
+    # Row count and per-column statistics of one table, from a single scan plus
+    # one small group-by per low-cardinality column
+    selects = ["COUNT(*)"]
+    for column_name, data_type in columns:
+        column = quote(column_name)
+        selects += [f"COUNT({column})", f"COUNT(DISTINCT {column})"]
+        kind = column_kind(data_type)
+        if kind != "text":
+            selects += [f"MIN({column})", f"MAX({column})"]
+        if kind == "numeric":
+            selects.append(f"AVG({column})")
+    cursor = connection.cursor()
+    cursor.execute(f"SELECT {', '.join(selects)} FROM {quote(table_name)}")
+    values = iter(cursor.fetchone())
+    row_count = next(values)
+    stats = {}
+    for column_name, data_type in columns:
+        kind = column_kind(data_type)
+        column = {"data_type": data_type, "nulls": row_count - next(values), "distinct": next(values)}
+        if kind != "text":
+            column["min"], column["max"] = json_value(next(values)), json_value(next(values))
+        if kind == "numeric":
+            column["mean"] = json_value(next(values))
+        if 0 < column["distinct"] <= top_values:
+            cursor.execute(f"SELECT {quote(column_name)}, COUNT(*) FROM {quote(table_name)} "
+                           f"WHERE {quote(column_name)} IS NOT NULL GROUP BY 1 ORDER BY 2 DESC, 1")
+            counts = [[json_value(value), count] for value, count in cursor.fetchall()]
+            if all(len(str(value)) <= MAX_VALUE_LENGTH for value, _ in counts):
+                column["values"] = counts
+        stats[column_name] = column
+    return {"row_count": row_count, "columns": stats}
+
+
+def entity_table(entity_name, tables):
+    # PostgreSQL folds the unquoted names in setup_tables.sql to lower case; DuckDB
+    # files built from the CSV outputs name some tables after their files (sop)
+    table_name = entity_name.lower()
+    if table_name not in tables:
+        import sinks
+        table_name = sinks.CSV_FILE_NAMES.get(table_name, table_name)
+    return table_name if table_name in tables else None
+
+
+def database_stats(connection, schema):
+    # Statistics of the table behind every described entity, None for entities without one
+    tables = table_columns(connection)
+    stats = {}
+    for entity in schema.entities:
+        table_name = entity_table(entity.name, tables)
+        stats[entity.name] = (dict(table=table_name, **table_stats(connection, table_name, tables[table_name]))
+                              if table_name else None)
+    return stats
+
+
+def snapshot(schema, stats=None):
+    # stats: database_stats() result, or None for a description-only snapshot
+    content = {
+        "format_version": FORMAT_VERSION,
+        "description_hash": schema.content_hash,
+        "entities": [{
+            "name": entity.name,
+            "table": stats[entity.name]["table"] if stats and stats.get(entity.name) else entity.name.lower(),
+            "primary_key": entity.primary_key,
+            "attributes": [{"name": attr.name, "declaration": attr.declaration} for attr in entity.attributes],
+            "stats": stats.get(entity.name) if stats is not None else None,
+        } for entity in schema.entities],
+        "relationships": [{"from": rel.from_entity, "type": rel.rel_type, "to": rel.to_entity,
+                           "description": rel.description} for rel in schema.relationships],
+    }
+    version = hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()[:16]
+    return dict(content, version=version, generated_at=datetime.now(timezone.utc).isoformat(timespec="seconds"))
+
+
+def describe_column(declaration, column):
+    # "(int, Primary Key): 1200 distinct, 1 to 1200" and the like
+    parts = []
+    if column["nulls"]:
+        parts.append(f"{column['nulls']} null")
+    parts.append(f"{column['distinct']} distinct")
+    if "values" in column:
+        parts.append("values " + ", ".join(f"{value} ({count})" for value, count in column["values"]))
+    elif column.get("min") is not None:
+        parts.append(f"{column['min']} to {column['max']}")
+    if column.get("mean") is not None:
+        parts.append(f"mean {column['mean']:.4g}")
+    return f"{declaration}: {', '.join(parts)}"
+
+
+def snapshot_text(data):
+    lines = [f"Schema snapshot {data['version']} (generated {data['generated_at']})", ""]
+    for entity in data["entities"]:
+        stats = entity["stats"]
+        if stats is None:
+            lines.append(f"Table {entity['table']} (entity {entity['name']})")
+        else:
+            lines.append(f"Table {entity['table']} (entity {entity['name']}), {stats['row_count']} rows")
+        columns = stats["columns"] if stats else {}
+        for attr in entity["attributes"]:
+            # Described attributes first, then the columns the description leaves out
+            column = columns.get(attr["name"]) or columns.get(attr["name"].lower())
+            lines.append(f"  - {attr['name']} " + (describe_column(f"({attr['declaration']})", column)
+                                                    if column else f"({attr['declaration']})"))
+        described = {attr["name"].lower() for attr in entity["attributes"]}
+        for column_name, column in columns.items():
+            if column_name.lower() not in described:
+                lines.append(f"  - {column_name} " + describe_column(f"({column['data_type']})", column))
+        lines.append("")
+    lines.append("Relationships")
+    for rel in data["relationships"]:
+        lines.append(f"  - {rel['from']} {rel['type']} {rel['to']}: {rel['description']}")
+    return "\n".join(lines) + "\n"
+
+
+def write(data, output_dir=SNAPSHOT_DIR):
+    # Both files, each replaced atomically so a starting server never reads half a snapshot
+    os.makedirs(output_dir, exist_ok=True)
+    for file_name, content in ((JSON_FILE, json.dumps(data, indent=2)), (TEXT_FILE, snapshot_text(data))):
+        path = os.path.join(output_dir, file_name)
+        with open(path + ".tmp", "w", encoding="utf-8") as file:
+            file.write(content)
+        os.replace(path + ".tmp", path)
+    return [os.path.join(output_dir, file_name) for file_name in (JSON_FILE, TEXT_FILE)]
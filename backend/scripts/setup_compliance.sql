@@ -0,0 +1,35 @@
+-- setup_compliance.sql
+
+-- Tables maintained by build_compliance.py, runs unchanged on PostgreSQL and DuckDB:
+--   psql -f setup_compliance.sql
+--
+-- One row per measured value outside the spec limits of the SOP version in
+-- effect when it was recorded, with the limits it broke and by how much.
+-- Process runs carry the batch they made (B<start date>-<process id>).
+
+CREATE TABLE IF NOT EXISTS spec_violations (
+    source_table VARCHAR(50) NOT NULL,
+    row_id INTEGER NOT NULL,
+    batch_number VARCHAR(50),
+    event_time TIMESTAMP,
+    procedure_name VARCHAR(255) NOT NULL,
+    sop_id INTEGER NOT NULL,
+    parameter VARCHAR(50) NOT NULL,
+    value DOUBLE PRECISION NOT NULL,
+    low_limit DOUBLE PRECISION,
+    high_limit DOUBLE PRECISION,
+    unit VARCHAR(20),
+    deviation DOUBLE PRECISION NOT NULL,
+    PRIMARY KEY (source_table, row_id, procedure_name, parameter)
+);
+
+CREATE INDEX IF NOT EXISTS spec_violations_batch_number_idx ON spec_violations (batch_number);
+CREATE INDEX IF NOT EXISTS spec_violations_event_time_idx ON spec_violations (event_time);
+CREATE INDEX IF NOT EXISTS spec_violations_parameter_event_time_idx ON spec_violations (parameter, event_time);
+
+-- How far every source table has been checked, and against which SOPs
+CREATE TABLE IF NOT EXISTS spec_compliance_state (
+    source_table VARCHAR(50) PRIMARY KEY,
+    checked_until TIMESTAMP,
+    spec_hash VARCHAR(64) NOT NULL
+);
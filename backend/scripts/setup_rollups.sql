@@ -0,0 +1,26 @@
+-- setup_rollups.sql
+
+-- Summary table maintained by build_rollups.py, runs unchanged on PostgreSQL and DuckDB:
+--   psql -f setup_rollups.sql
+--
+-- One row per period (day, week or month), source table, group (process or
+-- product name) and metric, with the statistics aggregate questions need.
+-- build_rollups.py refreshes only the periods that received new rows.
+
+CREATE TABLE IF NOT EXISTS metric_rollups (
+    period VARCHAR(10) NOT NULL,
+    period_start DATE NOT NULL,
+    source_table VARCHAR(50) NOT NULL,
+    group_name VARCHAR(255) NOT NULL,
+    metric VARCHAR(50) NOT NULL,
+    row_count INTEGER NOT NULL,
+    mean DOUBLE PRECISION,
+    std_dev DOUBLE PRECISION,
+    min_value DOUBLE PRECISION,
+    p05 DOUBLE PRECISION,
+    p50 DOUBLE PRECISION,
+    p95 DOUBLE PRECISION,
+    max_value DOUBLE PRECISION,
+    out_of_spec INTEGER NOT NULL,
+    PRIMARY KEY (period, period_start, source_table, group_name, metric)
+);
@@ -0,0 +1,177 @@
+-- setup_tables_normalized.sql
+
+-- Optional normalized profile, run after setup_tables.sql:
+--   psql -f setup_tables.sql -f setup_tables_normalized.sql
+--
+-- Low-cardinality text columns (process, product, operator and supplier names,
+-- units, severities, log entry templates, ...) move into lookup tables in the
+-- normalized schema, and the rows keep SMALLINT keys into them. Views under the
+-- original table names join the names back, so queries see the columns of
+-- setup_tables.sql unchanged. generate_data.py --profile normalized writes the
+-- lookup rows and the keyed rows (see normalized.py).
+--
+-- The views LEFT JOIN on the lookup primary keys, which lets PostgreSQL drop
+-- the join of every lookup column a query does not read. Writes go to the
+-- normalized tables; qualitydata and sop_data are left as they are.
+
+DROP SCHEMA IF EXISTS normalized CASCADE;
+CREATE SCHEMA normalized;
+
+-- The views take over these names
+DROP TABLE IF EXISTS reports CASCADE;
+DROP TABLE IF EXISTS nonconformityrecords CASCADE;
+DROP TABLE IF EXISTS shiftprocesslogs CASCADE;
+DROP TABLE IF EXISTS rawmaterialinput CASCADE;
+DROP TABLE IF EXISTS productiondata CASCADE;
+DROP TABLE IF EXISTS processdata CASCADE;
+
+-- Lookup tables
+CREATE TABLE normalized.process_names (
+    id SMALLINT PRIMARY KEY,
+    name VARCHAR(255) NOT NULL UNIQUE
+);
+
+CREATE TABLE normalized.product_names (
+    id SMALLINT PRIMARY KEY,
+    name VARCHAR(255) NOT NULL UNIQUE
+);
+
+CREATE TABLE normalized.units (
+    id SMALLINT PRIMARY KEY,
+    name VARCHAR(50) NOT NULL UNIQUE
+);
+
+CREATE TABLE normalized.suppliers (
+    id SMALLINT PRIMARY KEY,
+    name VARCHAR(255) NOT NULL UNIQUE
+);
+
+CREATE TABLE normalized.material_types (
+    id SMALLINT PRIMARY KEY,
+    name VARCHAR(100) NOT NULL UNIQUE
+);
+
+CREATE TABLE normalized.quality_checks (
+    id SMALLINT PRIMARY KEY,
+    name VARCHAR(50) NOT NULL UNIQUE
+);
+
+CREATE TABLE normalized.operators (
+    id SMALLINT PRIMARY KEY,
+    name VARCHAR(255) NOT NULL UNIQUE
+);
+
+CREATE TABLE normalized.log_entries (
+    id SMALLINT PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE normalized.severities (
+    id SMALLINT PRIMARY KEY,
+    name VARCHAR(50) NOT NULL UNIQUE
+);
+
+CREATE TABLE normalized.report_types (
+    id SMALLINT PRIMARY KEY,
+    name VARCHAR(50) NOT NULL UNIQUE
+);
+
+-- Create processdata table
+CREATE TABLE normalized.processdata (
+    process_id SERIAL PRIMARY KEY,
+    process_name_id SMALLINT NOT NULL REFERENCES normalized.process_names (id),
+    start_time TIMESTAMP NOT NULL,
+    end_time TIMESTAMP NOT NULL,
+    temperature DECIMAL(5,2),
+    pressure DECIMAL(5,2),
+    flow_rate DECIMAL(7,2)
+);
+
+-- Create productiondata table
+CREATE TABLE normalized.productiondata (
+    production_id SERIAL PRIMARY KEY,
+    product_name_id SMALLINT NOT NULL REFERENCES normalized.product_names (id),
+    batch_number VARCHAR(50) NOT NULL,
+    quantity DECIMAL(10,2),
+    unit_id SMALLINT REFERENCES normalized.units (id),
+    production_date DATE
+);
+
+-- Create rawmaterialinput table
+CREATE TABLE normalized.rawmaterialinput (
+    material_id SERIAL PRIMARY KEY,
+    arrival_date TIMESTAMP,
+    supplier_name_id SMALLINT REFERENCES normalized.suppliers (id),
+    material_type_id SMALLINT REFERENCES normalized.material_types (id),
+    quantity DECIMAL(10,2),
+    unit_id SMALLINT REFERENCES normalized.units (id),
+    quality_check_id SMALLINT REFERENCES normalized.quality_checks (id),
+    remarks TEXT
+);
+
+-- Create reports table
+CREATE TABLE normalized.reports (
+    report_id SERIAL PRIMARY KEY,
+    report_type_id SMALLINT REFERENCES normalized.report_types (id),
+    start_date DATE,
+    end_date DATE,
+    report_content TEXT
+);
+
+-- Create shiftprocesslogs table
+CREATE TABLE normalized.shiftprocesslogs (
+    log_id SERIAL PRIMARY KEY,
+    shift_date DATE,
+    shift_number INTEGER,
+    operator_name_id SMALLINT REFERENCES normalized.operators (id),
+    log_entry_id SMALLINT REFERENCES normalized.log_entries (id)
+);
+
+-- Create nonconformityrecords table
+CREATE TABLE normalized.nonconformityrecords (
+    record_id SERIAL PRIMARY KEY,
+    deviation_date TIMESTAMP,
+    description TEXT,
+    severity_id SMALLINT REFERENCES normalized.severities (id),
+    action_taken TEXT,
+    resolved_date TIMESTAMP
+);
+
+-- Compatibility views, in the column order of setup_tables.sql
+CREATE VIEW processdata AS
+SELECT p.process_id, process_names.name AS process_name, p.start_time, p.end_time,
+       p.temperature, p.pressure, p.flow_rate
+FROM normalized.processdata p
+LEFT JOIN normalized.process_names ON process_names.id = p.process_name_id;
+
+CREATE VIEW productiondata AS
+SELECT p.production_id, product_names.name AS product_name, p.batch_number, p.quantity,
+       units.name AS unit, p.production_date
+FROM normalized.productiondata p
+LEFT JOIN normalized.product_names ON product_names.id = p.product_name_id
+LEFT JOIN normalized.units ON units.id = p.unit_id;
+
+CREATE VIEW rawmaterialinput AS
+SELECT r.material_id, r.arrival_date, suppliers.name AS supplier_name, material_types.name AS material_type,
+       r.quantity, units.name AS unit, quality_checks.name AS quality_check, r.remarks
+FROM normalized.rawmaterialinput r
+LEFT JOIN normalized.suppliers ON suppliers.id = r.supplier_name_id
+LEFT JOIN normalized.material_types ON material_types.id = r.material_type_id
+LEFT JOIN normalized.units ON units.id = r.unit_id
+LEFT JOIN normalized.quality_checks ON quality_checks.id = r.quality_check_id;
+
+CREATE VIEW reports AS
+SELECT r.report_id, report_types.name AS report_type, r.start_date, r.end_date, r.report_content
+FROM normalized.reports r
+LEFT JOIN normalized.report_types ON report_types.id = r.report_type_id;
+
+CREATE VIEW shiftprocesslogs AS
+SELECT s.log_id, s.shift_date, s.shift_number, operators.name AS operator_name, log_entries.name AS log_entry
+FROM normalized.shiftprocesslogs s
+LEFT JOIN normalized.operators ON operators.id = s.operator_name_id
+LEFT JOIN normalized.log_entries ON log_entries.id = s.log_entry_id;
+
+CREATE VIEW nonconformityrecords AS
+SELECT n.record_id, n.deviation_date, n.description, severities.name AS severity, n.action_taken, n.resolved_date
+FROM normalized.nonconformityrecords n
+LEFT JOIN normalized.severities ON severities.id = n.severity_id;
@@ -0,0 +1,106 @@
+-- setup_tables_performance.sql
+
+-- Optional performance profile, run after setup_tables.sql:
+--   psql -f setup_tables.sql -f setup_tables_performance.sql
+--
+-- Adds the indexes the golden-run questions filter and join on, BRIN indexes on
+-- the append-only time columns, and recreates processdata, qualitydata and
+-- shiftprocesslogs partitioned by month. Only the DEFAULT partitions are created
+-- here; generate_data.py --profile performance emits one partition per month of
+-- the generated data ahead of the rows (see schema.partition_statements), in
+-- the sql and copy formats only. Rows loaded any other way (the csv and parquet
+-- formats, import_csv_to_postgres.sh, replay_data.py) land in the DEFAULT
+-- partitions until create_month_partition below moves them out.
+
+-- Partitioned tables need the partition column in their primary key
+DROP TABLE IF EXISTS processdata CASCADE;
+DROP TABLE IF EXISTS qualitydata CASCADE;
+DROP TABLE IF EXISTS shiftprocesslogs CASCADE;
+
+-- Create processdata table, partitioned by start_time
+CREATE TABLE processdata (
+    process_id SERIAL,
+    process_name VARCHAR(255) NOT NULL,
+    start_time TIMESTAMP NOT NULL,
+    end_time TIMESTAMP NOT NULL,
+    temperature DECIMAL(5,2),
+    pressure DECIMAL(5,2),
+    flow_rate DECIMAL(7,2),
+    PRIMARY KEY (process_id, start_time)
+) PARTITION BY RANGE (start_time);
+
+-- Create qualitydata table, partitioned by test_date
+CREATE TABLE qualitydata (
+    quality_id INTEGER,
+    batch_number VARCHAR(50) NOT NULL,
+    fat_content DECIMAL(4,2),
+    protein_content DECIMAL(4,2),
+    bacteria_count INTEGER,
+    pH_level DECIMAL(3,2),
+    test_date TIMESTAMP NOT NULL,
+    PRIMARY KEY (quality_id, test_date)
+) PARTITION BY RANGE (test_date);
+
+-- Create shiftprocesslogs table, partitioned by shift_date
+CREATE TABLE shiftprocesslogs (
+    log_id SERIAL,
+    shift_date DATE NOT NULL,
+    shift_number INTEGER,
+    operator_name VARCHAR(255),
+    log_entry TEXT,
+    PRIMARY KEY (log_id, shift_date)
+) PARTITION BY RANGE (shift_date);
+
+-- Rows outside the generated months (e.g. the historical Golden Run 5 records)
+CREATE TABLE processdata_default PARTITION OF processdata DEFAULT;
+CREATE TABLE qualitydata_default PARTITION OF qualitydata DEFAULT;
+CREATE TABLE shiftprocesslogs_default PARTITION OF shiftprocesslogs DEFAULT;
+
+-- Creates the month partition <table>_YYYY_MM for [lower_bound, upper_bound) unless it exists.
+-- PostgreSQL refuses a new partition while the DEFAULT partition holds rows of
+-- its range, so DEFAULT is detached, the partition created, the range's rows
+-- moved over from DEFAULT and DEFAULT attached again, in one transaction.
+CREATE OR REPLACE FUNCTION create_month_partition(table_name TEXT, partition_column TEXT, lower_bound DATE, upper_bound DATE)
+RETURNS VOID AS $$
+DECLARE
+    partition_name TEXT := table_name || '_' || to_char(lower_bound, 'YYYY_MM');
+    default_name TEXT := table_name || '_default';
+BEGIN
+    IF to_regclass(partition_name) IS NOT NULL THEN
+        RETURN;
+    END IF;
+    IF to_regclass(default_name) IS NULL THEN
+        EXECUTE format('CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                       partition_name, table_name, lower_bound, upper_bound);
+        RETURN;
+    END IF;
+    EXECUTE format('ALTER TABLE %I DETACH PARTITION %I', table_name, default_name);
+    EXECUTE format('CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                   partition_name, table_name, lower_bound, upper_bound);
+    EXECUTE format('WITH moved AS (DELETE FROM %I WHERE %I >= %L AND %I < %L RETURNING *) '
+                   'INSERT INTO %I SELECT * FROM moved',
+                   default_name, partition_column, lower_bound, partition_column, upper_bound, partition_name);
+    EXECUTE format('ALTER TABLE %I ATTACH PARTITION %I DEFAULT', table_name, default_name);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Batch joins: productiondata <-> qualitydata and raw material batches
+CREATE INDEX productiondata_batch_number_idx ON productiondata (batch_number);
+CREATE INDEX qualitydata_batch_number_test_date_idx ON qualitydata (batch_number, test_date);
+
+-- Filters by category within a period
+CREATE INDEX processdata_process_name_start_time_idx ON processdata (process_name, start_time);
+CREATE INDEX productiondata_product_name_production_date_idx ON productiondata (product_name, production_date);
+CREATE INDEX shiftprocesslogs_shift_date_shift_number_idx ON shiftprocesslogs (shift_date, shift_number);
+CREATE INDEX nonconformityrecords_severity_deviation_date_idx ON nonconformityrecords (severity, deviation_date);
+CREATE INDEX rawmaterialinput_quality_check_arrival_date_idx ON rawmaterialinput (quality_check, arrival_date);
+CREATE INDEX reports_report_type_start_date_idx ON reports (report_type, start_date);
+
+-- BRIN indexes on the append-only time columns; tiny, and effective because
+-- the performance profile writes rows in time order
+CREATE INDEX processdata_start_time_brin ON processdata USING BRIN (start_time);
+CREATE INDEX qualitydata_test_date_brin ON qualitydata USING BRIN (test_date);
+CREATE INDEX shiftprocesslogs_shift_date_brin ON shiftprocesslogs USING BRIN (shift_date);
+CREATE INDEX nonconformityrecords_deviation_date_brin ON nonconformityrecords USING BRIN (deviation_date);
+CREATE INDEX rawmaterialinput_arrival_date_brin ON rawmaterialinput USING BRIN (arrival_date);
+CREATE INDEX productiondata_production_date_brin ON productiondata USING BRIN (production_date);
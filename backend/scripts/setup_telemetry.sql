@@ -0,0 +1,20 @@
+-- setup_telemetry.sql
+
+-- Optional per-sample sensor telemetry of the process runs, run after setup_tables.sql:
+--   psql -f setup_tables.sql -f setup_telemetry.sql
+--
+-- Filled by generate_data.py --mode columnar --telemetry (see telemetry.py).
+-- For bulk loads, create the index after the data is in.
+
+DROP TABLE IF EXISTS processtelemetry CASCADE;
+
+-- Create processtelemetry table, one row per process run and sample time
+CREATE TABLE processtelemetry (
+    process_id INTEGER NOT NULL,
+    sample_time TIMESTAMP NOT NULL,
+    temperature DECIMAL(5,2),
+    pressure DECIMAL(5,2),
+    flow_rate DECIMAL(7,2)
+);
+
+CREATE INDEX processtelemetry_process_id_sample_time_idx ON processtelemetry (process_id, sample_time);
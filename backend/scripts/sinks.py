@@ -0,0 +1,326 @@
+import csv
+import math
+import numbers
+import os
+from datetime import date, datetime, timedelta
+from itertools import islice
+import columnar
+import schema
+
+# Writers for generated tables. Rows are consumed from any iterable (usually a
+# generator) a chunk at a time, so memory stays flat regardless of table size.
+
+INSERT_CHUNK_SIZE = 1000
+PARQUET_ROW_GROUP_SIZE = 1_000_000
+
+# kg_and_csv names the SOP export sop.csv, import_csv_to_postgres.sh maps it back to sop_data
+CSV_FILE_NAMES = {"sop_data": "sop"}
+
+
+def sql_literal(value):
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, numbers.Integral):
+        return str(int(value))
+    if isinstance(value, numbers.Real):
+        value = float(value)
+        if math.isnan(value) or math.isinf(value):
+            return f"'{value}'"
+        return repr(value)
+    if isinstance(value, datetime):
+        return f"'{value.strftime('%Y-%m-%d %H:%M:%S')}'"
+    if isinstance(value, date):
+        return f"'{value.isoformat()}'"
+    if isinstance(value, timedelta):
+        return f"'{value}'"
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def write_insert_sql(file, table_name, columns, rows, chunk_size=INSERT_CHUNK_SIZE):
+    # One multi-row INSERT per chunk of rows
+    header = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES \n"
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        values = ",\n".join("(" + ", ".join(sql_literal(col) for col in row) + ")" for row in chunk)
+        file.write(header + values + ";\n\n")
+
+
+def text_value(value, timestamp_separator=" "):
+    # Unquoted text form of a value, shared by the COPY and CSV writers
+    if isinstance(value, datetime):
+        return value.strftime(f"%Y-%m-%d{timestamp_separator}%H:%M:%S")
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, numbers.Integral):
+        return str(int(value))
+    if isinstance(value, numbers.Real):
+        return repr(float(value))
+    return str(value)
+
+
+def arrow_array(pa, array):
+    # Encoded columns (see columnar.Dictionary) are written as plain strings
+    if isinstance(array, columnar.Dictionary):
+        return pa.DictionaryArray.from_arrays(array.codes, pa.array(array.values, pa.string())).dictionary_decode()
+    return pa.array(columnar.decode(array))
+
+
+def copy_text_value(value):
+    if value is None:
+        return "\\N"
+    return (text_value(value)
+            .replace("\\", "\\\\")
+            .replace("\t", "\\t")
+            .replace("\n", "\\n")
+            .replace("\r", "\\r"))
+
+
+class Sink:
+    # Common interface of the output formats. Row generators go through
+    # write_table, columnar tables through write_columns. A table may be written
+    # more than once (e.g. the historical Golden Run 5 rows); later writes append.
+    timestamp_separator = " "
+
+    def __init__(self, output_dir="."):
+        self.output_dir = output_dir
+        self.temp_files = []
+        os.makedirs(output_dir, exist_ok=True)
+
+    def path(self, file_name):
+        return os.path.join(self.output_dir, file_name)
+
+    def temp_path(self, file_name):
+        # Output files are written under a temp name and moved into place by
+        # publish(), so an existing file (possibly a hard link into the dataset
+        # cache, see dataset_cache.py) is replaced, never rewritten in place
+        path = self.path(file_name)
+        self.temp_files.append(path)
+        return path + ".tmp"
+
+    def open_file(self, file_name):
+        return open(self.temp_path(file_name), "w", newline="")
+
+    def publish(self, discard=False):
+        # Moves the temp files into place, or removes them when discard
+        for path in self.temp_files:
+            if discard:
+                os.remove(path + ".tmp")
+            else:
+                os.replace(path + ".tmp", path)
+
+    def write_table(self, table_name, columns, rows):
+        raise NotImplementedError
+
+    def write_columns(self, table_name, columns):
+        self.write_table(table_name, list(columns),
+                         columnar.iter_rows(columns, timestamp_separator=self.timestamp_separator))
+
+    def write_sql(self, statement):
+        # DDL to run ahead of the data (e.g. partitions); only SQL outputs carry it
+        pass
+
+    def close(self, discard=False):
+        # discard: generation failed, leave the previous output files as they were
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        self.close(discard=exc_type is not None)
+
+
+class SqlSink(Sink):
+    # insert.sql: chunked multi-row INSERT statements
+    def __init__(self, output_dir=".", file_name="insert.sql", chunk_size=INSERT_CHUNK_SIZE):
+        super().__init__(output_dir)
+        self.chunk_size = chunk_size
+        self.file = self.open_file(file_name)
+
+    def write_table(self, table_name, columns, rows):
+        write_insert_sql(self.file, table_name, columns, rows, self.chunk_size)
+
+    def write_sql(self, statement):
+        self.file.write(statement + "\n\n")
+
+    def close(self, discard=False):
+        self.file.close()
+        self.publish(discard)
+
+
+class CopySink(Sink):
+    # copy.sql: PostgreSQL COPY ... FROM stdin blocks in text format, load with psql -f copy.sql
+    def __init__(self, output_dir=".", file_name="copy.sql"):
+        super().__init__(output_dir)
+        self.file = self.open_file(file_name)
+
+    def write_table(self, table_name, columns, rows):
+        self.file.write(f"COPY {table_name} ({', '.join(columns)}) FROM stdin;\n")
+        for row in rows:
+            self.file.write("\t".join(copy_text_value(col) for col in row) + "\n")
+        self.file.write("\\.\n\n")
+
+    def write_sql(self, statement):
+        self.file.write(statement + "\n\n")
+
+    def close(self, discard=False):
+        self.file.close()
+        self.publish(discard)
+
+
+class CsvSink(Sink):
+    # One <table>.csv per table with a header row, laid out like kg_and_csv/*.csv
+    timestamp_separator = "T"
+
+    def __init__(self, output_dir="."):
+        super().__init__(output_dir)
+        self.files = {}
+
+    def write_table(self, table_name, columns, rows):
+        if table_name not in self.files:
+            file = self.open_file(CSV_FILE_NAMES.get(table_name, table_name) + ".csv")
+            self.files[table_name] = (file, csv.writer(file, lineterminator="\n"))
+            self.files[table_name][1].writerow(columns)
+        writer = self.files[table_name][1]
+        writer.writerows([text_value(col, self.timestamp_separator) if col is not None else "" for col in row]
+                         for row in rows)
+
+    def close(self, discard=False):
+        for file, _ in self.files.values():
+            file.close()
+        self.publish(discard)
+
+
+class ParquetSink(Sink):
+    # One <table>.parquet per table, named like the CSV files (sop.parquet for
+    # sop_data); columnar tables are written straight from their arrays
+    def __init__(self, output_dir=".", row_group_size=PARQUET_ROW_GROUP_SIZE):
+        super().__init__(output_dir)
+        import pyarrow
+        import pyarrow.parquet
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.row_group_size = row_group_size
+        self.writers = {}
+
+    def write_batch(self, table_name, arrays, columns):
+        if table_name in self.writers:
+            schema = self.writers[table_name].schema
+            arrays = [array.cast(field.type) for array, field in zip(arrays, schema)]
+        batch = self.pa.Table.from_arrays(arrays, names=columns)
+        if table_name not in self.writers:
+            path = self.temp_path(CSV_FILE_NAMES.get(table_name, table_name) + ".parquet")
+            self.writers[table_name] = self.pq.ParquetWriter(path, batch.schema)
+        self.writers[table_name].write_table(batch)
+
+    def write_table(self, table_name, columns, rows):
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, self.row_group_size))
+            if not chunk:
+                break
+            self.write_batch(table_name, [self.pa.array(list(values)) for values in zip(*chunk)], columns)
+
+    def write_columns(self, table_name, columns):
+        num_rows = len(next(iter(columns.values())))
+        for offset in range(0, num_rows, self.row_group_size):
+            arrays = [arrow_array(self.pa, array[offset:offset + self.row_group_size])
+                      for array in columns.values()]
+            self.write_batch(table_name, arrays, list(columns))
+
+    def close(self, discard=False):
+        for writer in self.writers.values():
+            writer.close()
+        self.publish(discard)
+
+
+class DuckDbSink(Sink):
+    # db.db: one DuckDB database, typed per setup_tables.sql and sorted on the
+    # time columns (schema.SORT_COLUMNS). Tables are named like the CSV files
+    # (sop for sop_data), matching databases built from kg_and_csv. Rows go
+    # through Arrow into unsorted staging tables, sorted copies are made on close.
+    def __init__(self, output_dir=".", file_name="db.db", row_group_size=PARQUET_ROW_GROUP_SIZE):
+        super().__init__(output_dir)
+        import duckdb
+        import pyarrow
+        self.pa = pyarrow
+        self.row_group_size = row_group_size
+        self.schema = schema.dataset_schema()
+        # Rows are staged in a scratch database and the sorted tables built next
+        # to the target, which is moved into place on close, so readers never
+        # see a half built database and the result carries no staging leftovers
+        self.file_name = self.path(file_name)
+        self.temp_name = self.file_name + ".tmp"
+        self.staging_name = self.file_name + ".staging"
+        for name in (self.temp_name, self.staging_name):
+            if os.path.exists(name):
+                os.remove(name)
+        self.connection = duckdb.connect(self.staging_name)
+        self.staged = []
+
+    def staging_table(self, table_name):
+        staging = f"staging_{table_name}"
+        if table_name not in self.staged:
+            columns = ", ".join(f'"{column}" {schema.duckdb_type(column_type)}'
+                                for column, column_type in self.schema[table_name])
+            self.connection.execute(f"CREATE TABLE {staging} ({columns})")
+            self.staged.append(table_name)
+        return staging
+
+    def insert(self, table_name, batch):
+        staging = self.staging_table(table_name)
+        self.connection.register("batch", batch)
+        self.connection.execute(f"INSERT INTO {staging} BY NAME SELECT * FROM batch")
+        self.connection.unregister("batch")
+
+    def write_table(self, table_name, columns, rows):
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, self.row_group_size))
+            if not chunk:
+                break
+            arrays = [self.pa.array(list(values)) for values in zip(*chunk)]
+            self.insert(table_name, self.pa.Table.from_arrays(arrays, names=columns))
+
+    def write_columns(self, table_name, columns):
+        self.insert(table_name, self.pa.Table.from_arrays([arrow_array(self.pa, array) for array in columns.values()],
+                                                         names=list(columns)))
+
+    def close(self, discard=False):
+        if discard:
+            self.connection.close()
+            for name in (self.temp_name, self.staging_name):
+                if os.path.exists(name):
+                    os.remove(name)
+            return
+        self.connection.execute(f"ATTACH '{self.temp_name}' AS target")
+        for table_name in self.staged:
+            order = ", ".join(f'"{column}"' for column in schema.SORT_COLUMNS[table_name])
+            self.connection.execute(f'CREATE TABLE target."{CSV_FILE_NAMES.get(table_name, table_name)}" AS '
+                                    f"SELECT * FROM staging_{table_name} ORDER BY {order}")
+        self.connection.execute("DETACH target")
+        self.connection.close()
+        os.remove(self.staging_name)
+        os.replace(self.temp_name, self.file_name)
+
+
+SINKS = {
+    "sql": SqlSink,
+    "copy": CopySink,
+    "csv": CsvSink,
+    "parquet": ParquetSink,
+    "duckdb": DuckDbSink,
+}
+
+
+def open_sink(output_format, output_dir=".", **options):
+    if output_format not in SINKS:
+        raise ValueError(f"Unknown output format '{output_format}', expected one of: {', '.join(SINKS)}")
+    return SINKS[output_format](output_dir, **options)
@@ -0,0 +1,86 @@
+import numpy as np
+import columnar
+import scenarios
+
+# Sensor telemetry for process runs: every processdata run is expanded into a
+# time series of temperature, pressure and flow_rate samples, one every
+# SAMPLE_INTERVAL seconds from start_time up to end_time (setup_telemetry.sql).
+#
+# Samples are the run's recorded value plus AR(1) noise, i.e. sensor readings
+# that drift smoothly instead of jumping independently every second. Outlier
+# runs and Golden Run anomalies are already in the recorded values, so they show
+# up as sustained excursions over exactly those runs' time spans.
+#
+# Runs are expanded a batch at a time, each batch about CHUNK_ROWS samples, so a
+# series is never held in memory beyond the batch being written.
+
+TABLE = "processtelemetry"
+COLUMNS = ["process_id", "sample_time", "temperature", "pressure", "flow_rate"]
+METRICS = ["temperature", "pressure", "flow_rate"]
+SAMPLE_INTERVAL = 1
+CHUNK_ROWS = 1_000_000
+
+# Sensor noise per metric: stationary standard deviation and correlation time in seconds
+NOISE = {
+    "temperature": (0.5, 30.0),
+    "pressure": (2.0, 10.0),
+    "flow_rate": (15.0, 5.0),
+}
+
+# Spawn key namespace of the telemetry streams, after the table streams of columnar.chunk_rng
+STREAM = len(columnar.TABLE_COLUMNS)
+
+
+def telemetry_rng(seed, first_process_id, batch_index):
+    # Independent stream per batch of runs, keyed by the batch's first process
+    # id so the series do not depend on how processdata was chunked into workers
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(STREAM, first_process_id, batch_index)))
+
+
+def sample_counts(start_time, end_time, interval):
+    # Samples per run: start_time, start_time + interval, ... before end_time
+    seconds = ((end_time - start_time) / np.timedelta64(1, "s")).astype(np.int64)
+    return np.maximum(-(-seconds // interval), 1)
+
+
+def run_batches(counts, chunk_rows):
+    # Consecutive slices of runs with about chunk_rows samples each
+    bounds = np.searchsorted(np.cumsum(counts), np.arange(chunk_rows, counts.sum(), chunk_rows), side="left") + 1
+    bounds = np.unique(np.concatenate(([0], bounds, [len(counts)])))
+    return [slice(lower, upper) for lower, upper in zip(bounds, bounds[1:])]
+
+
+def ar1_noise(rng, counts, interval):
+    # (samples, metrics) AR(1) noise, run after run, every run starting from the
+    # stationary distribution. The recursion steps through time once, vectorized
+    # over all runs and metrics of the batch.
+    std = np.array([NOISE[metric][0] for metric in METRICS])
+    phi = np.exp(-interval / np.array([NOISE[metric][1] for metric in METRICS]))
+    noise = rng.normal(0, 1, (counts.max(), len(counts), len(METRICS)))
+    noise[0] *= std
+    noise[1:] *= std * np.sqrt(1 - phi ** 2)
+    for step in range(1, len(noise)):
+        noise[step] += phi * noise[step - 1]
+    # Drop the padding past the end of shorter runs, in run-major order
+    return noise.transpose(1, 0, 2)[np.arange(len(noise)) < counts[:, None]]
+
+
+def expand(process_columns, seed, interval=SAMPLE_INTERVAL, chunk_rows=CHUNK_ROWS):
+    # Yields telemetry columns for the runs in process_columns, batch by batch
+    counts = sample_counts(process_columns["start_time"], process_columns["end_time"], interval)
+    process_ids = process_columns["process_id"]
+    for batch_index, runs in enumerate(run_batches(counts, chunk_rows)):
+        rng = telemetry_rng(seed, int(process_ids[runs][0]), batch_index)
+        run_counts = counts[runs]
+        run_starts = np.cumsum(run_counts) - run_counts
+        steps = np.arange(run_counts.sum()) - np.repeat(run_starts, run_counts)
+        noise = ar1_noise(rng, run_counts, interval)
+        columns = {
+            "process_id": np.repeat(process_ids[runs], run_counts),
+            "sample_time": (np.repeat(process_columns["start_time"][runs].astype("datetime64[s]"), run_counts)
+                            + (steps * interval).astype("timedelta64[s]")),
+        }
+        for index, metric in enumerate(METRICS):
+            values = np.repeat(process_columns[metric][runs].astype(np.float64), run_counts) + noise[:, index]
+            columns[metric] = np.round(values, scenarios.DECIMALS[metric])
+        yield columns
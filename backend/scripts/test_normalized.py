@@ -0,0 +1,36 @@
+import numpy as np
+import columnar
+import normalized
+import sinks
+
+# python -m pytest test_normalized.py
+
+
+def test_encode_keeps_nulls():
+    lookups = normalized.Lookups()
+    ids = lookups.encode("suppliers", np.array(["Farm Fresh", None, "New Supplier"], dtype=object))
+    assert ids.tolist() == [lookups.id("suppliers", "Farm Fresh"), None, lookups.id("suppliers", "New Supplier")]
+
+
+def test_encode_dictionary_with_null_override():
+    lookups = normalized.Lookups()
+    column = columnar.Dictionary(np.array([0, 1, 2]), columnar.SEVERITIES)
+    column[np.array([1])] = None
+    assert lookups.encode("severities", column).tolist() == [1, None, 3]
+
+
+def test_encode_without_nulls_is_int16():
+    ids = normalized.Lookups().encode("units", np.array(["Liters", "Liters"], dtype=object))
+    assert ids.dtype == np.int16 and ids.tolist() == [1, 1]
+
+
+def test_null_lookup_values_are_written_as_null(tmp_path):
+    with normalized.NormalizedSink(sinks.SqlSink(tmp_path)) as sink:
+        sink.write_columns("nonconformityrecords", {
+            "record_id": np.array([1, 2]),
+            "severity": np.array(["High", None], dtype=object),
+        })
+        sink.write_table("nonconformityrecords", ["record_id", "severity"], [(3, None)])
+    text = (tmp_path / "insert.sql").read_text()
+    assert "INSERT INTO normalized.nonconformityrecords (record_id, severity_id) VALUES" in text
+    assert "(2, NULL)" in text and "(3, NULL)" in text
@@ -0,0 +1,366 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import time
+from collections import Counter
+import numpy as np
+import build_compliance
+import build_rollups
+
+# BM25 full-text index over the free text columns, so keyword questions are a
+# few array lookups instead of LIKE scans over the tables:
+#
+#   python text_index.py                     # DuckDB file built by build_duckdb.py
+#   python text_index.py --engine postgres   # DB_* variables, like the backend
+#   python text_index.py --search "equipment malfunction"
+#
+#   index = text_index.TextIndex()
+#   index.search("high bacteria count", limit=20)   # [(table, row id, score), ...]
+#
+# Most texts repeat (the SOP and nonconformity templates of random_data.py, the
+# shift log entries), so every distinct text of a column is indexed once as a
+# document that lists the ids of its rows. BM25 statistics are over documents,
+# with the average length per column.
+#
+# Everything lives in one file of flat arrays (see write()) that TextIndex maps
+# read-only: sorted terms, CSR postings with precomputed BM25 weights, and the
+# row ids of every document. Runs are incremental: only rows with ids above the
+# last indexed ones are read, and the arrays are merged and rewritten.
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+INDEX_FILE = os.path.join(BACKEND_DIR, "text_index", "text_index.bin")
+
+# Indexed table: (id column, text columns)
+SOURCES = {
+    "sop_data": ("sop_id", ["description", "process_guidelines"]),
+    "shiftprocesslogs": ("log_id", ["log_entry"]),
+    "reports": ("report_id", ["report_content"]),
+    "nonconformityrecords": ("record_id", ["description", "action_taken"]),
+}
+FIELDS = [(table_name, column) for table_name, (_, columns) in SOURCES.items() for column in columns]
+
+K1 = 1.2
+B = 0.75
+# Words and numbers ("3.5" stays one term), lower-cased and cut to MAX_TERM_LENGTH
+TOKEN = re.compile(r"\d+(?:\.\d+)?|[^\W\d_]+")
+MAX_TERM_LENGTH = 32
+
+MAGIC = b"BM25IDX\n"
+# Bumped whenever the file layout changes
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+# A different configuration rebuilds the index instead of extending it
+CONFIG = hashlib.sha256(json.dumps([FORMAT_VERSION, SOURCES, K1, B, TOKEN.pattern, MAX_TERM_LENGTH]).encode()).hexdigest()
+
+ARRAYS = {
+    "terms": "S1",             # sorted vocabulary, utf-8
+    "term_offsets": np.int64,  # postings of term t: term_offsets[t]:term_offsets[t + 1]
+    "posting_docs": np.int32,
+    "posting_counts": np.uint16,
+    "posting_weights": np.float32,
+    "doc_fields": np.uint8,    # index into FIELDS
+    "doc_lengths": np.uint32,
+    "doc_hashes": np.uint64,
+    "row_offsets": np.int64,   # rows of document d: row_ids[row_offsets[d]:row_offsets[d + 1]], ascending
+    "row_ids": np.int64,
+}
+
+
+def tokenize(text):
+    return [term[:MAX_TERM_LENGTH] for term in TOKEN.findall(text.lower())] if text else []
+
+
+def text_hash(field, text):
+    digest = hashlib.blake2b(f"{field}\0{text}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def offsets(counts):
+    return np.concatenate([[0], np.cumsum(counts, dtype=np.int64)])
+
+
+def empty_arrays():
+    arrays = {name: np.empty(0, dtype=dtype) for name, dtype in ARRAYS.items()}
+    arrays["term_offsets"] = arrays["row_offsets"] = np.zeros(1, dtype=np.int64)
+    return arrays
+
+
+def bm25_weights(arrays):
+    # Per posting: idf(term) * tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / average length of the field))
+    num_docs = len(arrays["doc_lengths"])
+    doc_frequency = np.diff(arrays["term_offsets"])
+    idf = np.log1p((num_docs - doc_frequency + 0.5) / (doc_frequency + 0.5))
+    lengths = arrays["doc_lengths"].astype(np.float64)
+    field_lengths = np.bincount(arrays["doc_fields"], weights=lengths, minlength=len(FIELDS))
+    field_docs = np.bincount(arrays["doc_fields"], minlength=len(FIELDS))
+    average = np.maximum(field_lengths / np.maximum(field_docs, 1), 1)
+    docs = arrays["posting_docs"]
+    counts = arrays["posting_counts"].astype(np.float64)
+    norms = K1 * (1 - B + B * lengths[docs] / average[arrays["doc_fields"][docs]])
+    return (np.repeat(idf, doc_frequency) * counts * (K1 + 1) / (counts + norms)).astype(np.float32)
+
+
+def merge(arrays, batches):
+    # arrays extended by the rows of batches: (field index, row ids, texts).
+    # Texts already indexed only gain rows; new ones become documents.
+    docs = {doc_hash: doc for doc, doc_hash in enumerate(arrays["doc_hashes"].tolist())}
+    num_old_docs = len(docs)
+    new_fields, new_lengths, new_hashes, new_terms = [], [], [], []
+    row_docs, row_ids = [], []
+    for field, ids, texts in batches:
+        seen = {}
+        for row_id, text in zip(ids.tolist(), texts.tolist()):
+            if text is None:
+                continue
+            doc = seen.get(text)
+            if doc is None:
+                doc_hash = text_hash(FIELDS[field], text)
+                doc = docs.get(doc_hash)
+                if doc is None:
+                    doc = docs[doc_hash] = len(docs)
+                    terms = tokenize(text)
+                    new_fields.append(field)
+                    new_lengths.append(len(terms))
+                    new_hashes.append(doc_hash)
+                    new_terms.append(Counter(terms))
+                seen[text] = doc
+            row_docs.append(doc)
+            row_ids.append(row_id)
+
+    # Vocabulary, with the old term ids mapped into it
+    posting_terms = [term.encode() for counts in new_terms for term in counts]
+    old_terms = arrays["terms"]
+    terms = np.union1d(old_terms, np.array(posting_terms, dtype=bytes)) if posting_terms else np.asarray(old_terms)
+    terms = terms.astype(f"S{max(terms.dtype.itemsize, 1)}")
+    old_term_ids = np.searchsorted(terms, old_terms)
+
+    posting_terms = np.concatenate([np.repeat(old_term_ids, np.diff(arrays["term_offsets"])),
+                                    np.searchsorted(terms, np.array(posting_terms, dtype=terms.dtype))])
+    posting_docs = np.concatenate([arrays["posting_docs"],
+                                   np.repeat(np.arange(num_old_docs, len(docs), dtype=np.int32),
+                                             [len(counts) for counts in new_terms])])
+    posting_counts = np.concatenate([arrays["posting_counts"], np.minimum(
+        [count for counts in new_terms for count in counts.values()], np.iinfo(np.uint16).max).astype(np.uint16)])
+    order = np.lexsort((posting_docs, posting_terms))
+
+    row_docs = np.concatenate([np.repeat(np.arange(num_old_docs), np.diff(arrays["row_offsets"])),
+                               np.array(row_docs, dtype=np.int64)])
+    row_ids = np.concatenate([arrays["row_ids"], np.array(row_ids, dtype=np.int64)])
+    row_order = np.lexsort((row_ids, row_docs))
+
+    merged = {
+        "terms": terms,
+        "term_offsets": offsets(np.bincount(posting_terms, minlength=len(terms))),
+        "posting_docs": posting_docs[order].astype(np.int32),
+        "posting_counts": posting_counts[order],
+        "doc_fields": np.concatenate([arrays["doc_fields"], np.array(new_fields, dtype=np.uint8)]),
+        "doc_lengths": np.concatenate([arrays["doc_lengths"], np.array(new_lengths, dtype=np.uint32)]),
+        "doc_hashes": np.concatenate([arrays["doc_hashes"], np.array(new_hashes, dtype=np.uint64)]),
+        "row_offsets": offsets(np.bincount(row_docs, minlength=len(docs))),
+        "row_ids": row_ids[row_order],
+    }
+    merged["posting_weights"] = bm25_weights(merged)
+    return merged
+
+
+def aligned(position):
+    return -(-position // ALIGNMENT) * ALIGNMENT
+
+
+def write(path, header, arrays):
+    # MAGIC, header length (uint64), JSON header, then every array at an
+    # ALIGNMENT aligned offset from the end of the header; replaced atomically
+    # so open TextIndex instances keep reading the old file
+    layout, position = {}, 0
+    for name, array in arrays.items():
+        layout[name] = [array.dtype.str, len(array), position]
+        position = aligned(position + array.nbytes)
+    content = json.dumps(dict(header, arrays=layout)).encode()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path + ".tmp", "wb") as file:
+        file.write(MAGIC + len(content).to_bytes(8, "little") + content)
+        start = aligned(file.tell())
+        for name, array in arrays.items():
+            file.seek(start + layout[name][2])
+            file.write(np.ascontiguousarray(array).tobytes())
+        file.truncate(start + position)
+    os.replace(path + ".tmp", path)
+
+
+def read(path):
+    # (header, arrays) of an index file, the arrays mapped read-only
+    buffer = np.memmap(path, dtype=np.uint8, mode="r")
+    if bytes(buffer[:len(MAGIC)]) != MAGIC:
+        raise ValueError(f"{path} is not a text index")
+    length = int.from_bytes(bytes(buffer[len(MAGIC):len(MAGIC) + 8]), "little")
+    header_end = len(MAGIC) + 8 + length
+    header = json.loads(bytes(buffer[len(MAGIC) + 8:header_end]))
+    start = aligned(header_end)
+    arrays = {}
+    for name, (dtype, count, position) in header["arrays"].items():
+        dtype = np.dtype(dtype)
+        arrays[name] = buffer[start + position:start + position + count * dtype.itemsize].view(dtype)
+    return header, arrays
+
+
+class TextIndex:
+    def __init__(self, path=INDEX_FILE):
+        self.header, arrays = read(path)
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def postings(self, term):
+        # (documents, weights) of one query term
+        encoded = term.encode()
+        position = np.searchsorted(self.terms, encoded)
+        if position == len(self.terms) or self.terms[position] != encoded:
+            return None
+        start, stop = self.term_offsets[position], self.term_offsets[position + 1]
+        return self.posting_docs[start:stop], self.posting_weights[start:stop]
+
+    def search_documents(self, query, limit=10, fields=None):
+        # [(document, score), ...] best first; fields: (table, column) pairs to search
+        matches = [match for match in map(self.postings, set(tokenize(query))) if match is not None]
+        if not matches:
+            return []
+        if len(matches) == 1:
+            docs, scores = matches[0][0], matches[0][1].astype(np.float64)
+        else:
+            docs, inverse = np.unique(np.concatenate([docs for docs, _ in matches]), return_inverse=True)
+            scores = np.bincount(inverse, weights=np.concatenate([weights for _, weights in matches]))
+        if fields is not None:
+            keep = np.isin(self.doc_fields[docs], [FIELDS.index(tuple(field)) for field in fields])
+            docs, scores = docs[keep], scores[keep]
+        if limit is not None and len(docs) > limit:
+            best = np.argpartition(-scores, limit - 1)[:limit]
+            docs, scores = docs[best], scores[best]
+        order = np.lexsort((docs, -scores))
+        return list(zip(docs[order].tolist(), scores[order].tolist()))
+
+    def rows(self, doc):
+        return self.row_ids[self.row_offsets[doc]:self.row_offsets[doc + 1]]
+
+    def field(self, doc):
+        return FIELDS[self.doc_fields[doc]]
+
+    def search(self, query, limit=10, fields=None):
+        # [(table, row id, score), ...] best first; a row matching in several of
+        # its columns is listed once, with its best score
+        result = self.search_rows(self.search_documents(query, limit, fields), limit)
+        if limit is not None and len(result) < limit:
+            # Every document has a row, so only rows found twice leave the top limit documents short
+            result = self.search_rows(self.search_documents(query, None, fields), limit)
+        return result
+
+    def search_rows(self, documents, limit):
+        result, seen = [], set()
+        for doc, score in documents:
+            table_name = self.field(doc)[0]
+            # Rows seen before are in result, so limit rows of a document are always enough
+            for row_id in self.rows(doc)[:limit].tolist():
+                if (table_name, row_id) not in seen:
+                    seen.add((table_name, row_id))
+                    result.append((table_name, row_id, score))
+                    if limit is not None and len(result) == limit:
+                        return result
+        return result
+
+
+def source_table(connection, table_name):
+    # sop_data is sop in DuckDB files named after the CSV exports
+    return build_compliance.sop_table(connection) if table_name == "sop_data" else table_name
+
+
+def max_ids(connection):
+    cursor = connection.cursor()
+    result = {}
+    for table_name, (id_column, _) in SOURCES.items():
+        cursor.execute(f"SELECT MAX({id_column}) FROM {source_table(connection, table_name)}")
+        result[table_name] = cursor.fetchone()[0]
+    return result
+
+
+def load(path):
+    # (header, arrays) of the index at path, in memory, or None when there is
+    # none or it was built with another configuration
+    try:
+        header, arrays = read(path)
+    except (FileNotFoundError, ValueError):
+        return None
+    if header.get("config") != CONFIG:
+        return None
+    return header, {name: np.array(array) for name, array in arrays.items()}
+
+
+def refresh(connection, path=INDEX_FILE, full=False):
+    # Indexes the rows with ids above the last indexed ones (every row when
+    # full, there is no index yet, or a table has fewer ids than indexed, i.e.
+    # the data was regenerated). Returns {table: (since, rows read)}.
+    latest = max_ids(connection)
+    existing = None if full else load(path)
+    if existing and any(latest[table_name] is None or latest[table_name] < indexed
+                        for table_name, indexed in existing[0]["indexed_until"].items() if indexed is not None):
+        existing = None
+    header, arrays = existing or ({"indexed_until": {}}, empty_arrays())
+
+    batches, summary, indexed_until = [], {}, {}
+    for table_name, (id_column, columns) in SOURCES.items():
+        since = header["indexed_until"].get(table_name)
+        query = f"SELECT {id_column}, {', '.join(columns)} FROM {source_table(connection, table_name)}"
+        if since is not None:
+            query += f" WHERE {id_column} > {since}"
+        data = build_rollups.fetch_columns(connection, query)
+        ids = np.ma.asarray(data[id_column.lower()]).astype(np.int64)
+        for column in columns:
+            texts = np.ma.asarray(data[column.lower()], dtype=object).filled(None)
+            batches.append((FIELDS.index((table_name, column)), np.asarray(ids), texts))
+        indexed_until[table_name] = int(ids.max()) if len(ids) else since
+        summary[table_name] = (since, len(ids))
+
+    arrays = merge(arrays, batches)
+    write(path, {"format_version": FORMAT_VERSION, "config": CONFIG, "fields": FIELDS,
+                 "indexed_until": indexed_until}, arrays)
+    return summary, arrays
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or query the BM25 full-text index of the text columns.")
+    parser.add_argument("--engine", choices=["duckdb", "postgres"], default="duckdb")
+    parser.add_argument("--database", default=build_rollups.DATABASE, help="DuckDB database file")
+    parser.add_argument("--postgres-dsn", help="libpq connection string, defaults to the DB_* variables")
+    parser.add_argument("--index", default=INDEX_FILE, help="index file")
+    parser.add_argument("--full", action="store_true", help="index every row instead of the new ones")
+    parser.add_argument("--search", metavar="QUERY", help="print the best matching rows instead of indexing")
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    if args.search is not None:
+        index = TextIndex(args.index)
+        started = time.perf_counter()
+        hits = index.search(args.search, args.limit)
+        elapsed = time.perf_counter() - started
+        for table_name, row_id, score in hits:
+            print(f"{score:8.3f}  {table_name} {row_id}")
+        print(f"{len(hits)} rows in {elapsed * 1e6:.0f}us.")
+        return
+
+    started = time.perf_counter()
+    connection = build_rollups.connect(args.engine, args.database, args.postgres_dsn)
+    try:
+        summary, arrays = refresh(connection, args.index, args.full)
+    finally:
+        connection.close()
+    for table_name, (since, read_rows) in summary.items():
+        scope = "all rows" if since is None else f"rows after id {since}"
+        print(f"{table_name}: read {read_rows} {scope}.")
+    print(f"{len(arrays['doc_lengths'])} documents, {len(arrays['terms'])} terms, {len(arrays['row_ids'])} rows "
+          f"in {args.index}. Done in {time.perf_counter() - started:.1f}s.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,45 +1,125 @@
+import argparse
 import csv
+import os
+import shutil
+import sqlite3
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 
-# Read the correct batch_number values from processData_expanded.csv
-with open('processData_expanded.csv', 'r', newline='') as csvfile:
-    reader = csv.DictReader(csvfile)
-    data_expanded = list(reader)
-    batch_numbers = [row['batch_number'] for row in data_expanded]
+# Copies the correct batch_number values from processData_expanded.csv into the
+# other expanded CSV files. Rows are joined on their id (record_id, quality_id,
+# production_id) against process_id, not on their position, so filtered or
+# reordered files are reconciled rather than skipped.
+#
+# The process batch numbers go into an on-disk SQLite index, so neither the
+# source nor the targets have to fit in memory. Targets are streamed in chunks,
+# processed in parallel and replaced atomically through a temp file.
 
-# List of other CSV files to update
-other_files = ['NonConformityRecords_expanded.csv', 'QualityData_expanded.csv', 'ProductionData_expanded.csv'] 
+SOURCE_FILE = 'processData_expanded.csv'
+SOURCE_KEY = 'process_id'
 
-for filename in other_files:
-    with open(filename, 'r', newline='') as csvfile:
+# Other CSV files to update and the column that matches process_id
+TARGET_FILES = {
+    'NonConformityRecords_expanded.csv': 'record_id',
+    'QualityData_expanded.csv': 'quality_id',
+    'ProductionData_expanded.csv': 'production_id',
+}
+
+CHUNK_SIZE = 10000
+
+
+def build_index(source_file, source_key, index_file):
+    # process_id -> batch_number, streamed from the source CSV
+    with open(source_file, 'r', newline='') as csvfile, sqlite3.connect(index_file) as connection:
         reader = csv.DictReader(csvfile)
-        data = list(reader)
-        fieldnames = reader.fieldnames
+        for column in (source_key, 'batch_number'):
+            if column not in reader.fieldnames:
+                raise SystemExit(f"'{column}' column not found in {source_file}.")
+        connection.execute("CREATE TABLE batches (key TEXT PRIMARY KEY, batch_number TEXT)")
+        while True:
+            rows = [(row[source_key], row['batch_number']) for row in islice(reader, CHUNK_SIZE)]
+            if not rows:
+                break
+            connection.executemany("INSERT OR REPLACE INTO batches VALUES (?, ?)", rows)
+    connection.close()
 
-    # Check if 'batch_number' column exists
-    if 'batch_number' not in fieldnames:
-        print(f"'batch_number' column not found in {filename}. Skipping this file.")
-        continue
 
-    # Check if the number of rows matches
-    if len(data) != len(batch_numbers):
-        print(f"Row count mismatch in {filename}. Expected {len(batch_numbers)} rows, found {len(data)}. Skipping this file.")
-        continue
+def lookup(connection, keys):
+    found = {}
+    # SQLite limits the number of parameters per statement
+    for start in range(0, len(keys), 500):
+        part = keys[start:start + 500]
+        query = f"SELECT key, batch_number FROM batches WHERE key IN ({', '.join('?' * len(part))})"
+        found.update(connection.execute(query, part).fetchall())
+    return found
+
+
+def reconcile(filename, key, index_file):
+    # Returns (filename, updated, unmatched), or (filename, None, reason) when skipped
+    with open(filename, 'r', newline='') as csvfile:
+        reader = csv.DictReader(csvfile)
+        fieldnames = reader.fieldnames or []
 
-    # Update the 'batch_number' column with correct values
-    for i, row in enumerate(data):
-        row['batch_number'] = batch_numbers[i]
+        # Check if the 'batch_number' and key columns exist
+        for column in ('batch_number', key):
+            if column not in fieldnames:
+                return filename, None, f"'{column}' column not found"
 
-    # Write the updated data back to the CSV file
-    with open(filename, 'w', newline='') as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(data)
+        updated = unmatched = 0
+        directory = os.path.dirname(os.path.abspath(filename))
+        connection = sqlite3.connect(f"file:{index_file}?mode=ro", uri=True)
+        with tempfile.NamedTemporaryFile('w', newline='', dir=directory, suffix='.tmp', delete=False) as temp:
+            try:
+                writer = csv.DictWriter(temp, fieldnames=fieldnames)
+                writer.writeheader()
+                while True:
+                    rows = list(islice(reader, CHUNK_SIZE))
+                    if not rows:
+                        break
+                    batch_numbers = lookup(connection, [row[key] for row in rows])
+                    for row in rows:
+                        batch_number = batch_numbers.get(row[key])
+                        if batch_number is None:
+                            unmatched += 1
+                        elif batch_number != row['batch_number']:
+                            row['batch_number'] = batch_number
+                            updated += 1
+                    writer.writerows(rows)
+            except BaseException:
+                temp.close()
+                os.remove(temp.name)
+                raise
+            finally:
+                connection.close()
+    # Temp files are created private, keep the original file's permissions
+    shutil.copymode(filename, temp.name)
+    os.replace(temp.name, filename)
+    return filename, updated, unmatched
 
-    print(f"Updated 'batch_number' in {filename}.")
 
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Copy process batch numbers into the other expanded CSV files.")
+    parser.add_argument('--source', default=SOURCE_FILE)
+    parser.add_argument('--source-key', default=SOURCE_KEY)
+    parser.add_argument('--target', action='append', metavar='FILE:KEY',
+                        help="file to update and its key column, defaults to the expanded CSV files")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args(argv)
+    targets = dict(target.rsplit(':', 1) for target in args.target) if args.target else TARGET_FILES
 
+    with tempfile.TemporaryDirectory() as index_dir:
+        index_file = os.path.join(index_dir, 'batches.sqlite')
+        build_index(args.source, args.source_key, index_file)
+        with ProcessPoolExecutor(max(1, min(args.workers, len(targets)))) as executor:
+            results = executor.map(reconcile, targets, targets.values(), [index_file] * len(targets))
+            for filename, updated, unmatched in results:
+                if updated is None:
+                    print(f"{unmatched} in {filename}. Skipping this file.")
+                    continue
+                print(f"Updated 'batch_number' in {filename}: {updated} rows changed"
+                      + (f", {unmatched} rows without a matching {args.source_key}." if unmatched else "."))
 
 
-# 1,Skim Milk,B20240324-001,3595.29,Liters,2024-03-24,Cooperative X
-# 2,Skim Milk,B20240527-002,5658.03,Liters,2024-05-27,Farm C
-# 3,Whole Milk,B20240808-003,2418.3,Liters,2024-08-08,Cooperative X
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -9,6 +9,8 @@ import { GraphCypherQAChain } from "@langchain/community/chains/graph_qa/cypher"
 import { SqlDatabaseChain } from "langchain/chains/sql_db";
 import { ChatOpenAI } from "@langchain/openai";
 import { AIMessage } from "@langchain/core/messages";
+import fs from "fs";
+import path from "path";
 
 // Initialize LLMs
 const openAIApiKey = process.env.OPENAI_API_KEY;
@@ -80,6 +82,55 @@ const initializeNeo4jGraph = async () => {
   return neo4jGraph;
 };
 
+// Schema snapshot written by scripts/populateKG.py --snapshot: the described
+// tables with row counts and column statistics. Read once at startup; without
+// it the SQL prompt falls back to introspecting the database.
+const schemaSnapshotFile =
+  process.env.SCHEMA_SNAPSHOT ||
+  path.join(__dirname, "../schema_snapshot/schema_snapshot.txt");
+
+const loadSchemaSnapshot = (): string | null => {
+  try {
+    const snapshot = fs.readFileSync(schemaSnapshotFile, "utf8");
+    console.log(`Schema snapshot loaded from ${schemaSnapshotFile}.`);
+    return snapshot;
+  } catch {
+    console.log("No schema snapshot found, introspecting the database instead.");
+    return null;
+  }
+};
+
+const schemaSnapshot = loadSchemaSnapshot();
+
+// Connections are opened on the first question and reused by the next ones
+interface Connections {
+  dataSource: DataSource;
+  neo4jGraph: Neo4jGraph;
+  sqlDatabase: SqlDatabase;
+}
+
+let connections: Promise<Connections> | null = null;
+
+const getConnections = (): Promise<Connections> => {
+  if (!connections) {
+    connections = (async () => {
+      const dataSource = await initializeDataSource();
+      const neo4jGraph = await initializeNeo4jGraph();
+      // Sample rows are only needed when there is no snapshot to describe the data
+      const sqlDatabase = await SqlDatabase.fromDataSourceParams({
+        appDataSource: dataSource,
+        sampleRowsInTableInfo: schemaSnapshot ? 0 : 3,
+      });
+      return { dataSource, neo4jGraph, sqlDatabase };
+    })();
+    // A failed attempt is retried on the next question
+    connections.catch(() => {
+      connections = null;
+    });
+  }
+  return connections;
+};
+
 // Define a type for chat history entries
 interface ChatHistoryEntry {
   question: string;
@@ -113,9 +164,7 @@ const formatChatHistory = (history: ChatHistoryEntry[]): string => {
 export const handleUserQuestion = async (
   userQuestion: string
 ): Promise<string> => {
-  // Initialize Data Source and Graph
-  const dataSource = await initializeDataSource();
-  const neo4jGraph = await initializeNeo4jGraph();
+  const { dataSource, neo4jGraph, sqlDatabase } = await getConnections();
   console.log("User Question: ", userQuestion);
   console.log("-------------------------------------------------------");
 
@@ -157,11 +206,10 @@ export const handleUserQuestion = async (
     console.log("-------------------------------------------------------");
 
     //SQL Database
-    const sqlDatabase = await SqlDatabase.fromDataSourceParams({
-      appDataSource: dataSource,
-    });
-
-    const tableInfo = await sqlDatabase.getTableInfo();
+    // Braces are escaped since the snapshot becomes part of the prompt template
+    const tableInfo = schemaSnapshot
+      ? schemaSnapshot.replace(/[{}]/g, "$&$&")
+      : "{table_info}";
 
     // const tableInfo = await getDatabaseSchema(dataSource);
 
@@ -183,7 +231,7 @@ export const handleUserQuestion = async (
   {input}
 
   **Only use the following tables:**
-  {table_info}
+  ${tableInfo}
 
   **Knowledge Graph Relationships**:
   - These are the known relationships that can guide you in constructing SQL joins and selecting fields:
@@ -209,7 +257,6 @@ export const handleUserQuestion = async (
     // Generate SQL Query
     const sqlResult = await sqlChain.invoke({
       query: `${chatHistoryContext}\n\nCurrent Question: ${userQuestion}`,
-      table_info: tableInfo,
     });
     let generatedSql = sqlResult.sql_answer;
 
@@ -270,13 +317,6 @@ export const handleUserQuestion = async (
   } catch (error) {
     console.error("Error handling user question:", error);
     throw error;
-  } finally {
-    // Clean up resources
-    //await dataSource.destroy();
-    console.log("PostgreSQL Database connection closed.");
-    // Assuming Neo4jGraph has a close method; if not, adjust accordingly
-    //await neo4jGraph.close();
-    console.log("Neo4j Graph connection closed.");
   }
 };
 